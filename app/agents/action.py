@@ -1,18 +1,39 @@
 # app/agents/action.py
 
-from typing import Dict, Any
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from langgraph.config import get_stream_writer
+from app.core.config import get_settings
+from app.core.llm_cache import get_llm_cache
+from app.core.llm_metrics import LLMMetricsCallback
 from app.tools.email_tool import send_payment_reminder
 
 # ---------------------------
 # LLM for Dynamic Content Generation
 # ---------------------------
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.7, # Higher temperature for creative tone adaptation
-    request_timeout=20
-)
+llm = None  # Built on first use (get_llm); benchmarks assign a stand-in
+_LLM_LOCK = threading.Lock()  # First use can be from the drafting pool (_run_jobs) or the warm-up thread
+
+def get_llm() -> ChatOpenAI:
+    global llm
+    with _LLM_LOCK:
+        if llm is None:
+            llm = ChatOpenAI(
+                model="gpt-4o-mini",
+                temperature=0.7, # Higher temperature for creative tone adaptation
+                request_timeout=20,
+                cache=get_llm_cache(),
+                callbacks=[LLMMetricsCallback("drafting")]
+            )
+        return llm
 
 draft_prompt = ChatPromptTemplate.from_template("""
 You are a professional Action Execution Agent drafting a payment reminder email to collect outstanding payments from clients.
@@ -74,8 +95,176 @@ Instructions:
 Output only the email body text.
 """)
 
-def action_execution_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    # print("\n⚙️ ENTERED ACTION EXECUTION AGENT")
+escalation_prompt = ChatPromptTemplate.from_template("""
+        You are an Action Execution Agent.
+        Draft an URGENT escalation email to the Founder.
+        
+        Context:
+        - Issue: Repeated payment failures or high risk.
+        - Target Entity: {target}
+        - Rationale: {reason}
+        
+        Instructions:
+        - Subject Line: 🚨 ACTION REQUIRED: Escalation for {target}
+        - Body: Summarize the issue briefly and ask for manual intervention.
+        """)
+
+# ---------------------------
+# Template Drafting (FINLY_DRAFTING_MODE=template)
+# ---------------------------
+# Per-recipient fields are left as placeholders in the template and filled in locally
+PLACEHOLDERS = {"client_name": "[[CLIENT_NAME]]", "amount": "[[AMOUNT]]", "deadline_days": "[[DEADLINE_DAYS]]"}
+_PLACEHOLDER = re.compile(r"\[\[[A-Z_]+\]\]")
+
+TEMPLATE_PROMPTS = {"COLLECT_RECEIVABLE": draft_prompt, "DELAY_VENDOR_PAYMENT": deferral_prompt}
+
+template_instructions = """
+IMPORTANT: You are writing a reusable TEMPLATE (variant {variant} of {variants}), not one email.
+- Write {placeholders} literally, exactly as shown, wherever they belong.
+- They are replaced for each recipient. Do not use any other placeholders or brackets.
+"""
+
+# prompt-set hash -> (drafted at, usable templates)
+_TEMPLATES: Dict[str, Tuple[float, List[str]]] = {}
+_TEMPLATES_LOCK = threading.Lock()
+# prompt-set hash -> draft in flight; concurrent misses on one key wait for it instead of drafting again
+_DRAFTING: Dict[str, Future] = {}
+
+def _template_request(strategy: str, tone: str) -> Tuple[str, List[str], List[str]]:
+    """
+    (cache key, one prompt per variant, placeholders every template must contain).
+    The key hashes the prompt text, so editing a prompt retires its cached templates.
+    """
+    base = TEMPLATE_PROMPTS[strategy].format(tone=tone, **PLACEHOLDERS)
+    required = [token for token in PLACEHOLDERS.values() if token in base]
+    variants = max(1, get_settings().drafting_template_variants)
+    prompts = [
+        base + template_instructions.format(variant=i + 1, variants=variants, placeholders=", ".join(required))
+        for i in range(variants)
+    ]
+    key = hashlib.sha256("\x00".join(prompts).encode("utf-8")).hexdigest()
+    return key, prompts, required
+
+def _cached_templates(key: str) -> Optional[List[str]]:
+    ttl = get_settings().drafting_template_ttl_seconds
+    with _TEMPLATES_LOCK:
+        entry = _TEMPLATES.get(key)
+    if entry and (not ttl or time.time() - entry[0] < ttl):
+        return entry[1]
+    return None
+
+def _claim_templates(key: str) -> Tuple[Optional[List[str]], Optional[Future], bool]:
+    """
+    (cached templates, draft future, whether this caller owns the draft).
+    The owner drafts and settles the future with _settle_templates; everyone else waits on it.
+    """
+    templates = _cached_templates(key)
+    if templates is not None:
+        return templates, None, False
+    with _TEMPLATES_LOCK:
+        if key in _DRAFTING:
+            return None, _DRAFTING[key], False
+        future = _DRAFTING[key] = Future()
+    # Stored by a draft that finished between the cache check and the claim
+    templates = _cached_templates(key)
+    if templates is not None:
+        _settle_templates(key, future, templates)
+        return templates, None, False
+    return None, future, True
+
+def _settle_templates(key: str, future: Future, templates: Optional[List[str]]):
+    """None means the draft failed: waiters see a cancelled future and draft themselves."""
+    with _TEMPLATES_LOCK:
+        _DRAFTING.pop(key, None)
+    if templates is None:
+        future.cancel()
+        future.set_running_or_notify_cancel()  # Wakes wait(); cancel() alone only runs the callbacks
+    else:
+        future.set_result(templates)
+
+def _store_templates(key: str, drafts: List[str], required: List[str]) -> List[str]:
+    """Keeps the drafts that use exactly the expected placeholders."""
+    usable = [d for d in drafts if set(_PLACEHOLDER.findall(d)) == set(required)]
+    if usable:
+        with _TEMPLATES_LOCK:
+            _TEMPLATES[key] = (time.time(), usable)
+    return usable
+
+def _fill_template(templates: List[str], job: Dict[str, Any]) -> str:
+    """Same client -> same variant, so repeat reminders read consistently."""
+    body = templates[zlib.crc32(str(job["target"]).encode("utf-8")) % len(templates)]
+    for field, token in PLACEHOLDERS.items():
+        body = body.replace(token, str(job["send_kwargs"][field]))
+    return body
+
+def _template_request_for(strategy: str, jobs: List[Dict[str, Any]]) -> Optional[Tuple[str, List[str], List[str]]]:
+    if get_settings().drafting_mode != "template" or strategy not in TEMPLATE_PROMPTS or not jobs:
+        return None
+    # One decision -> one tone for every job
+    return _template_request(strategy, jobs[0]["send_kwargs"]["tone"])
+
+def _apply_templates(jobs: List[Dict[str, Any]], templates: List[str]):
+    if not templates:
+        print("⚠️ No usable email templates drafted, falling back to one draft per recipient")
+        return
+    for job in jobs:
+        job["draft"] = _fill_template(templates, job)
+
+def _prepare_drafts(strategy: str, jobs: List[Dict[str, Any]]):
+    """Template mode: sets job["draft"] from cached (or freshly drafted) templates."""
+    request = _template_request_for(strategy, jobs)
+    if request is None:
+        return
+    key, prompts, required = request
+    while True:
+        templates, future, owner = _claim_templates(key)
+        if future is None:
+            break
+        if owner:
+            templates = None
+            try:
+                templates = _store_templates(key, [get_llm().invoke(p).content for p in prompts], required)
+            finally:
+                _settle_templates(key, future, templates)
+            break
+        wait([future])
+        if not future.cancelled():
+            templates = future.result()
+            break
+    _apply_templates(jobs, templates)
+
+async def _aprepare_drafts(strategy: str, jobs: List[Dict[str, Any]]):
+    request = _template_request_for(strategy, jobs)
+    if request is None:
+        return
+    key, prompts, required = request
+    while True:
+        templates, future, owner = _claim_templates(key)
+        if future is None:
+            break
+        if owner:
+            templates = None
+            try:
+                responses = await asyncio.gather(*(get_llm().ainvoke(p) for p in prompts))
+                templates = _store_templates(key, [r.content for r in responses], required)
+            finally:
+                _settle_templates(key, future, templates)
+            break
+        # asyncio.wait leaves the shared draft running if this run is cancelled
+        await asyncio.wait([asyncio.wrap_future(future)])
+        if not future.cancelled():
+            templates = future.result()
+            break
+    _apply_templates(jobs, templates)
+
+# ---------------------------
+# Action Planning
+# ---------------------------
+def _plan_action_jobs(state: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Turns the decision into a list of draft+send jobs.
+    Each job carries the prompt to draft with and the kwargs for send_payment_reminder.
+    """
     decision = state.get("decision", {})
     sub_goal = state.get("sub_goal", {})
     strategy = decision.get("strategy")
@@ -86,56 +275,34 @@ def action_execution_node(state: Dict[str, Any]) -> Dict[str, Any]:
     params = decision.get("execution_params", {})
     tone = params.get("tone", "POLITE")
 
-    action_log = {}
+    jobs = []
 
     if strategy == "COLLECT_RECEIVABLE" or strategy == "DELAY_VENDOR_PAYMENT":
         # Handle single vs list target
         targets = target_client if isinstance(target_client, list) else [target_client]
         
-        all_results = []
+        # client -> first matching receivable, built once instead of scanning per target
+        receivable_by_client = {}
+        for r in state.get("receivables", []):
+            receivable_by_client.setdefault(r.get("client"), r)
         
         for t in targets:
             if not t or t == "None": continue
+            receivable = receivable_by_client.get(t, {})
             
             # Determine Prompt & Subject
             if strategy == "COLLECT_RECEIVABLE":
                 prompt = draft_prompt
-                # If multiple targets, split amount evenly or logic? For simplicity, we use total amount for context 
-                # but ideally we should look up specific receivable amount. 
-                # Agent instruction said "Amount: Set amount_goal = Total Receivable Amount".
-                # We will just mention the total required in the email for now or generic.
-                # BETTER: Look up the specific receivable amount for this client from state.
-                
-                specific_amount = amount # Default
-                for r in state.get("receivables", []):
-                    if r.get("client") == t:
-                        specific_amount = r.get("amount")
-                        break
-                
-                current_amount = specific_amount
+                # The specific receivable amount for this client (falls back to the goal amount)
+                current_amount = receivable.get("amount") if receivable else amount
                 deadline_days = sub_goal.get("deadline_days", 7)
             else:
                 prompt = deferral_prompt
                 current_amount = amount
                 deadline_days = 7 # Standard deferral
             
-            # 1. Draft Email via LLM
-            email_body_response = llm.invoke(
-                prompt.format(
-                    client_name=t,
-                    amount=current_amount,
-                    deadline_days=deadline_days,
-                    tone=tone
-                )
-            )
-            email_body = email_body_response.content
-            
-            # Find recipient email from state
-            recipient_email = None
-            for r in state.get("receivables", []):
-                if r.get("client") == t:
-                    recipient_email = r.get("email") 
-                    break
+            # Recipient email from state
+            recipient_email = receivable.get("email")
             
             if not recipient_email:
                 if strategy == "DELAY_VENDOR_PAYMENT":
@@ -143,80 +310,166 @@ def action_execution_node(state: Dict[str, Any]) -> Dict[str, Any]:
                 else:
                     recipient_email = "client_contact@example.com"
 
-            # 2. Execute Action (Send Email)
-            result = send_payment_reminder(
-                to_email=recipient_email,
-                client_name=t,
-                amount=current_amount,
-                deadline_days=deadline_days,
-                body=email_body,
-                tone=tone  # Pass tone for dynamic subject and logging
-            )
-            
-            all_results.append({
+            jobs.append({
                 "target": t,
-                "email": recipient_email,
-                "result": result
+                "ledger_clients": [t],
+                "prompt": prompt.format(
+                    client_name=t,
+                    amount=current_amount,
+                    deadline_days=deadline_days,
+                    tone=tone
+                ),
+                "send_kwargs": {
+                    "to_email": recipient_email,
+                    "client_name": t,
+                    "amount": current_amount,
+                    "deadline_days": deadline_days,
+                    "tone": tone  # Pass tone for dynamic subject and logging
+                }
             })
 
-        # 3. Log Action for 'Contextual Traceability'
-        action_log = {
-            "action_taken": "EMAIL_PAYMENT_REMINDER_MULTI" if strategy == "COLLECT_RECEIVABLE" else "PAYMENT_EXTENSION_REQUEST",
-            "targets_processed": all_results,
-            "tone_used": tone
-        }
-
     elif strategy == "ALERT_FOUNDER":
         # Escalation Logic
         reason = decision.get("rationale", "Escalation requested due to high risk or persistent failures.")
         target_entity = target_client if target_client else "Unknown Entity"
         
-        prompt = ChatPromptTemplate.from_template("""
-        You are an Action Execution Agent.
-        Draft an URGENT escalation email to the Founder.
-        
-        Context:
-        - Issue: Repeated payment failures or high risk.
-        - Target Entity: {target}
-        - Rationale: {reason}
-        
-        Instructions:
-        - Subject Line: 🚨 ACTION REQUIRED: Escalation for {target}
-        - Body: Summarize the issue briefly and ask for manual intervention.
-        """)
-        
-        email_body_response = llm.invoke(prompt.format(target=target_entity, reason=reason))
-        email_body = email_body_response.content
-        
         # In a real app, this would be the founder's email from env
         # recipient_email = os.getenv("ADMIN_EMAIL", "founder@finly.com")
         recipient_email = "founder@finly.app" 
         
-        result = send_payment_reminder(
-            to_email=recipient_email,
-            client_name="Founder",
-            amount=amount,
-            deadline_days=0,
-            body=email_body,
-            subject=f"🚨 ACTION REQUIRED: Escalation for {target_entity}",
-            tone="URGENT"
-        )
-        
-        action_log = {
-            "action_taken": "FOUNDER_ALERTED",
+        escalated = target_entity if isinstance(target_entity, list) else [target_entity]
+        jobs.append({
             "target": target_entity,
-            "recipient_email": recipient_email,
+            "ledger_clients": [t for t in escalated if t and t not in ["None", "Admin", "N/A", "Unknown Entity"]],
+            "prompt": escalation_prompt.format(target=target_entity, reason=reason),
+            "send_kwargs": {
+                "to_email": recipient_email,
+                "client_name": "Founder",
+                "amount": amount,
+                "deadline_days": 0,
+                "subject": f"🚨 ACTION REQUIRED: Escalation for {target_entity}",
+                "tone": "URGENT"
+            }
+        })
+
+    return strategy, jobs
+
+def _build_action_log(state: Dict[str, Any], strategy: str, jobs: List[Dict[str, Any]], outcomes: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Assembles the action log from (email_body, send_result) pairs, in job order."""
+    tone = state.get("decision", {}).get("execution_params", {}).get("tone", "POLITE")
+
+    if strategy == "COLLECT_RECEIVABLE" or strategy == "DELAY_VENDOR_PAYMENT":
+        all_results = [
+            {
+                "target": job["target"],
+                "email": job["send_kwargs"]["to_email"],
+                "result": result
+            }
+            for job, (_, result) in zip(jobs, outcomes)
+        ]
+
+        # Log Action for 'Contextual Traceability'
+        return {
+            "action_taken": "EMAIL_PAYMENT_REMINDER_MULTI" if strategy == "COLLECT_RECEIVABLE" else "PAYMENT_EXTENSION_REQUEST",
+            "targets_processed": all_results,
+            "tone_used": tone
+        }
+
+    if strategy == "ALERT_FOUNDER":
+        job = jobs[0]
+        email_body, result = outcomes[0]
+        return {
+            "action_taken": "FOUNDER_ALERTED",
+            "target": job["target"],
+            "recipient_email": job["send_kwargs"]["to_email"],
             "tone_used": "URGENT",
             "content_draft": email_body,
             "result": result
         }
 
-    else:
-        action_log = {
-            "action_taken": "NO_ACTION",
-            "reason": strategy,
-            "result": {"status": "SKIPPED"}
-        }
+    return {
+        "action_taken": "NO_ACTION",
+        "reason": strategy,
+        "result": {"status": "SKIPPED"}
+    }
+
+# ---------------------------
+# Job Execution
+# ---------------------------
+def _deliver(job: Dict[str, Any], email_body: str) -> Dict[str, Any]:
+    """Sends now (direct) or hands the rendered message to the outbox worker (outbox)."""
+    if get_settings().email_delivery == "outbox":
+        from app.tools.outbox import enqueue_reminder
+        return enqueue_reminder({"body": email_body, **job["send_kwargs"]}, job["ledger_clients"])
+    return send_payment_reminder(body=email_body, **job["send_kwargs"])
+
+def _execute_job(job: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    # 1. Draft Email via LLM (unless filled in from a template)
+    email_body = job.get("draft") or get_llm().invoke(job["prompt"]).content
+    # 2. Execute Action (Send or enqueue Email)
+    result = _deliver(job, email_body)
+    return email_body, result
+
+async def _aexecute_job(job: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    # 1. Draft Email via LLM (unless filled in from a template)
+    email_body = job.get("draft") or (await get_llm().ainvoke(job["prompt"])).content
+    # 2. Execute Action (SMTP / outbox writes are blocking, keep them off the event loop)
+    result = await asyncio.to_thread(_deliver, job, email_body)
+    return email_body, result
+
+def _progress_writer() -> Callable[[Any], None]:
+    """LangGraph's custom stream writer (finly_graph.astream), or a no-op outside a graph run."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda _: None
+
+def _target_event(job: Dict[str, Any], outcome: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {"action_target": {"target": job["target"], "email": job["send_kwargs"]["to_email"], "result": outcome[1]}}
+
+def _run_jobs(jobs: List[Dict[str, Any]], on_done: Callable[[Any], None]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Runs jobs on a bounded thread pool; results come back in job order, on_done fires as each finishes."""
+    limit = max(1, get_settings().action_max_concurrency)
+    if len(jobs) <= 1 or limit == 1:
+        outcomes = []
+        for job in jobs:
+            outcomes.append(_execute_job(job))
+            on_done(_target_event(job, outcomes[-1]))
+        return outcomes
+    with ThreadPoolExecutor(max_workers=min(limit, len(jobs))) as pool:
+        futures = {pool.submit(_execute_job, job): job for job in jobs}
+        # Report from this thread: the stream writer belongs to the node's context
+        for future in as_completed(futures):
+            on_done(_target_event(futures[future], future.result()))
+        return [future.result() for future in futures]
+
+async def _arun_jobs(jobs: List[Dict[str, Any]], on_done: Callable[[Any], None]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Fans jobs out with at most FINLY_ACTION_CONCURRENCY in flight; results come back in job order."""
+    semaphore = asyncio.Semaphore(max(1, get_settings().action_max_concurrency))
+
+    async def bounded(job):
+        async with semaphore:
+            outcome = await _aexecute_job(job)
+        on_done(_target_event(job, outcome))
+        return outcome
+
+    return list(await asyncio.gather(*(bounded(job) for job in jobs)))
+
+# ---------------------------
+# LangGraph Node
+# ---------------------------
+def action_execution_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    # print("\n⚙️ ENTERED ACTION EXECUTION AGENT")
+    strategy, jobs = _plan_action_jobs(state)
+    _prepare_drafts(strategy, jobs)
+    outcomes = _run_jobs(jobs, _progress_writer())
+    state["action_log"] = _build_action_log(state, strategy, jobs, outcomes)
+    return state
 
-    state["action_log"] = action_log
+async def aaction_execution_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async twin of action_execution_node for finly_graph.ainvoke."""
+    strategy, jobs = _plan_action_jobs(state)
+    await _aprepare_drafts(strategy, jobs)
+    outcomes = await _arun_jobs(jobs, _progress_writer())
+    state["action_log"] = _build_action_log(state, strategy, jobs, outcomes)
     return state
@@ -0,0 +1,164 @@
+# app/agents/combined.py
+
+"""
+Combined risk + decision pass (FINLY_ENGINE_MODE=combined).
+
+One LLM call returns both the risk assessment (with its sub_goal) and the strategy decision,
+validated against CombinedAssessment. risk_reasoning_node stores both; decision_agent_node
+only applies the tier rules. If the reply does not validate, a valid risk half is still kept
+and only decision_agent_node falls back to its own prompt; if the risk half is invalid too,
+both nodes fall back (the two-call "llm" path).
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, Dict, List, Literal, Optional, Union
+
+from langchain_openai import ChatOpenAI
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field, ValidationError
+
+from app.agents.decision import AVAILABLE_STRATEGIES, client_history
+from app.core.llm_cache import get_llm_cache
+from app.core.llm_metrics import LLMMetricsCallback
+from app.core.metrics import LLM_INVALID
+
+# ---------------------------
+# Schema
+# ---------------------------
+Number = Union[int, float]
+
+class SubGoal(BaseModel):
+    intent: Literal["INCREASE_INFLOW", "DELAY_OUTFLOW", "MAINTAIN_LIQUIDITY", "COVER_DEFICIT"]
+    required_amount: Number
+    deadline_days: int
+    reason: str
+
+class RiskAssessment(BaseModel):
+    risk_score: Number = Field(ge=0, le=100)
+    critical_window: str
+    dominant_risk: str
+    confidence: Literal["HIGH", "MEDIUM", "LOW"] = "HIGH"
+    sub_goal: SubGoal
+
+class ExecutionParams(BaseModel):
+    tone: Literal["FIRM", "POLITE", "URGENT", "NONE"] = "NONE"
+    channel: Literal["EMAIL", "SLACK", "NONE"] = "NONE"
+
+class StrategyDecision(BaseModel):
+    strategy: Literal[tuple(AVAILABLE_STRATEGIES)]
+    target: Union[List[str], str]
+    rationale: str
+    amount_goal: Number
+    execution_params: ExecutionParams = ExecutionParams()
+
+class CombinedAssessment(BaseModel):
+    risk_analysis: RiskAssessment
+    decision: StrategyDecision
+
+_SCHEMA = json.dumps(CombinedAssessment.model_json_schema())
+
+# ---------------------------
+# LLM (JSON forced)
+# ---------------------------
+llm = None  # Built on first use (get_llm); benchmarks assign a stand-in
+_LLM_LOCK = threading.Lock()  # The startup warm-up thread builds it while requests may already arrive
+
+def get_llm() -> ChatOpenAI:
+    global llm
+    with _LLM_LOCK:
+        if llm is None:
+            llm = ChatOpenAI(
+                model="gpt-4o-mini",
+                temperature=0.2,
+                model_kwargs={"response_format": {"type": "json_object"}},
+                request_timeout=30,
+                cache=get_llm_cache(),
+                callbacks=[LLMMetricsCallback("combined")]
+            )
+        return llm
+
+# ---------------------------
+# Prompt
+# ---------------------------
+# The risk and decision prompts' rules, with every input listed once
+combined_prompt = ChatPromptTemplate.from_template("""
+You are a Hyper-Rational Financial Risk Analyst and Strategist.
+In ONE pass: (1) assess the financial risk and set a sub-goal, then (2) select the BEST strategic
+action to achieve that sub-goal, considering ACCOUNT HISTORY. Use ONLY the data below.
+
+INPUT DATA:
+- Financial Metrics (Truth source): {financial_metrics}
+- Cash Balance: {cash_balance}
+- Obligations (Bills + Salaries): {outflow_details}
+- Receivables: {inflow_details}
+- Cash Timeline (precomputed day by day, receivables on time): {cash_timeline}
+- Preferences: {preferences}
+- Client Account History (TIERS):
+{client_history}
+
+PART 1 - RISK (-> "risk_analysis"):
+1. `liquidity_status` = "SURPLUS": risk is LOW, sub_goal.intent MUST be "MAINTAIN_LIQUIDITY".
+   `liquidity_status` = "DEFICIT": risk is HIGH, sub_goal.intent MUST be "COVER_DEFICIT".
+2. Check whether any receivable arrives BEFORE each outflow due date and say so in the reason.
+3. `critical_window`: if the Cash Timeline has a `first_negative_day`, use "<first_negative_day> days"
+   and name its `exposed_obligations`; otherwise use the first obligation's due date.
+4. Only if SURPLUS: `net_position` > 0 means VERY LOW risk, < 0 means MODERATE.
+5. Use the EXACT numbers provided.
+
+PART 2 - DECISION (-> "decision"), for the sub_goal from Part 1:
+1. Tiers: Tier 1 (0 recent failures) -> POLITE, COLLECT_RECEIVABLE. Tier 2 (1 failure) -> FIRM,
+   COLLECT_RECEIVABLE. Tier 3 (2+ failures) -> ALERT_FOUNDER, never email the client directly.
+2. Funding waterfall, obligation by obligation (most urgent first): pool ALL receivables with
+   due_in_days <= the obligation's due_in_days (equal counts as a match).
+   - Receivables >= obligation: COLLECT_RECEIVABLE from all contributing clients, amount_goal = their total.
+   - Receivables + cash >= obligation: COLLECT_RECEIVABLE (or MAINTAIN_STATUS_QUO if cash alone covers it).
+   - Otherwise: DELAY_VENDOR_PAYMENT for that vendor, amount_goal = the deficit.
+3. A client contacted within the last 24 hours (Last Contact) must not be reminded again: MAINTAIN_STATUS_QUO.
+4. NEVER delay salaries (preferences.dont_delay_salaries). Only delay bills with due_in_days > 2.
+5. Put your step-by-step reasoning in "rationale".
+
+AVAILABLE STRATEGIES:
+{strategies}
+
+Return ONLY one JSON object matching this JSON Schema:
+{schema}
+""")
+
+def _combined_inputs(state: Dict[str, Any], risk_inputs: Dict[str, Any]) -> Dict[str, Any]:
+    history, _ = client_history(state, risk_inputs["listed_clients"])
+    return {
+        **{k: risk_inputs[k] for k in ("financial_metrics", "cash_balance", "outflow_details", "inflow_details", "cash_timeline")},
+        "preferences": json.dumps(state.get("preferences", {})),
+        "client_history": history,
+        "strategies": json.dumps(AVAILABLE_STRATEGIES),
+        "schema": _SCHEMA,
+    }
+
+def _parse_combined(content: str) -> Dict[str, Optional[Dict[str, Any]]]:
+    try:
+        return CombinedAssessment.model_validate_json(content).model_dump()
+    except ValidationError:
+        pass
+    # Salvage the risk half: then only the decision needs its own call
+    risk_analysis = None
+    try:
+        data = json.loads(content)
+        if isinstance(data, dict):
+            risk_analysis = RiskAssessment.model_validate(data.get("risk_analysis")).model_dump()
+    except (ValueError, ValidationError):
+        pass
+    LLM_INVALID.inc(agent="combined", fallback="decision" if risk_analysis else "both")
+    return {"risk_analysis": risk_analysis, "decision": None}
+
+def combined_assessment(state: Dict[str, Any], risk_inputs: Dict[str, Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """{"risk_analysis": ..., "decision": ...} from one LLM call; a half that does not validate is None."""
+    messages = combined_prompt.format_messages(**_combined_inputs(state, risk_inputs))
+    return _parse_combined(get_llm().invoke(messages).content)
+
+async def acombined_assessment(state: Dict[str, Any], risk_inputs: Dict[str, Any]) -> Dict[str, Optional[Dict[str, Any]]]:
+    # Client history only touches the ledger when run outside the graph (no snapshot yet)
+    inputs = await asyncio.to_thread(_combined_inputs, state, risk_inputs)
+    messages = combined_prompt.format_messages(**inputs)
+    return _parse_combined((await get_llm().ainvoke(messages)).content)
@@ -1,19 +1,37 @@
 # app/agents/decision.py
 
+import asyncio
 import json
-from typing import Dict, Any, List
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from app.core.llm_cache import get_llm_cache
+from app.core.llm_metrics import LLMMetricsCallback
+from app.agents.engine import select_strategy
+from app.core.config import get_settings
+from app.core.prompt_context import budget_sections
 
 # ---------------------------
 # LLM (JSON forced)
 # ---------------------------
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.2,
-    model_kwargs={"response_format": {"type": "json_object"}},
-    request_timeout=20
-)
+llm = None  # Built on first use (get_llm); benchmarks assign a stand-in
+_LLM_LOCK = threading.Lock()  # The startup warm-up thread builds it while requests may already arrive
+
+def get_llm() -> ChatOpenAI:
+    global llm
+    with _LLM_LOCK:
+        if llm is None:
+            llm = ChatOpenAI(
+                model="gpt-4o-mini",
+                temperature=0.2,
+                model_kwargs={"response_format": {"type": "json_object"}},
+                request_timeout=20,
+                cache=get_llm_cache(),
+                callbacks=[LLMMetricsCallback("decision")]
+            )
+        return llm
 
 # ---------------------------
 # Available Strategy Space
@@ -118,9 +136,42 @@ Financial Metrics: {financial_metrics}
 """)
 
 # ---------------------------
-# LangGraph Node
+# Node Helpers
 # ---------------------------
-def decision_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
+def client_history(state: Dict[str, Any], listed_clients: Optional[Set[str]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Tier lines for the prompt + the profiles of all receivable clients (for tier enforcement).
+    With `listed_clients`, only those get a line; the others are counted per tier.
+    """
+    # Client History from the per-run snapshot (same tiers the risk node saw)
+    from app.agents.memory import resolve_client_profiles
+    
+    profiles = resolve_client_profiles(state)
+    history_lines = []
+    enriched_profiles = {}
+    unlisted_tiers = {}
+    
+    for r in state.get("receivables", []):
+        c_id = r.get("client")
+        if c_id and c_id not in enriched_profiles:
+            ctx = profiles.get(c_id, {})
+            enriched_profiles[c_id] = ctx
+            tier = ctx.get("tier", 1)
+            fails = ctx.get("consecutive_failures", 0)
+            if listed_clients is not None and c_id not in listed_clients:
+                unlisted_tiers[c_id] = tier
+                continue
+            history_lines.append(f"- {c_id}: Tier {tier} ({fails} failures). Last Contact: {ctx.get('last_contacted_at')}")
+
+    if unlisted_tiers:
+        counts = Counter(unlisted_tiers.values())
+        per_tier = ", ".join(f"{counts[t]} at Tier {t}" for t in sorted(counts))
+        history_lines.append(f"- (+{len(unlisted_tiers)} clients not listed: {per_tier})")
+            
+    return "\n".join(history_lines), enriched_profiles
+
+def _prepare_decision_messages(state: Dict[str, Any]) -> Tuple[List[Any], Dict[str, Any]]:
+    """Builds the prompt messages and the client profiles used for tier enforcement."""
     # Extract inputs
     sub_goal = state.get("sub_goal", {})
     receivables = state.get("receivables", [])
@@ -133,45 +184,33 @@ def decision_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
     preferences = state.get("preferences", {})
     cash_balance = state.get("cash_balance", 0)
     
-    # 1. Fetch Client History from Memory (The "Truth")
-    # We ignore state['client_profiles'] if it's stale, and fetch fresh from memory.py
-    from app.agents.memory import get_client_context
-    
-    history_lines = []
-    enriched_profiles = {}
+    # Large books: top-K line items + due-date totals, within the prompt token budget
+    book, listed = budget_sections({"receivables": receivables, "obligations": obligations})
     
-    for r in receivables:
-        c_id = r.get("client")
-        if c_id:
-            ctx = get_client_context(c_id)
-            enriched_profiles[c_id] = ctx
-            tier = ctx.get("tier", 1)
-            fails = ctx.get("consecutive_failures", 0)
-            history_lines.append(f"- {c_id}: Tier {tier} ({fails} failures). Last Contact: {ctx.get('last_contacted_at')}")
-            
-    client_history_str = "\n".join(history_lines)
+    # 1. Client History
+    client_history_str, enriched_profiles = client_history(state, {r.get("client") for r in listed["receivables"]})
     
-    # Invoke LLM
     metrics = state.get("financial_metrics", {})
-    response = llm.invoke(
-        decision_prompt.format_messages(
-            strategies=json.dumps(AVAILABLE_STRATEGIES),
-            sub_goal=json.dumps(sub_goal),
-            receivables=json.dumps(receivables),
-            obligations=json.dumps(obligations),
-            client_history=client_history_str, # Injected Here
-            preferences=json.dumps(preferences),
-            financial_metrics=json.dumps(metrics),
-            cash_balance=cash_balance
-        )
+    messages = decision_prompt.format_messages(
+        strategies=json.dumps(AVAILABLE_STRATEGIES),
+        sub_goal=json.dumps(sub_goal),
+        receivables=book["receivables"],
+        obligations=book["obligations"],
+        client_history=client_history_str, # Injected Here
+        preferences=json.dumps(preferences),
+        financial_metrics=json.dumps(metrics),
+        cash_balance=cash_balance
     )
-    
+    return messages, enriched_profiles
+
+def _parse_decision(state: Dict[str, Any], content: str) -> Dict[str, Any]:
+    bills = state.get("fixed_bills", [])
     try:
-        decision = json.loads(response.content)
+        return json.loads(content)
     except json.JSONDecodeError:
         # Fallback
         fallback_amt = bills[0]["amount"] if bills else 0
-        decision = {
+        return {
             "strategy": "ALERT_FOUNDER",
             "target": "Admin",
             "rationale": "LLM failed to output valid JSON",
@@ -179,7 +218,8 @@ def decision_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
             "execution_params": {"tone": "URGENT"}
         }
 
-    # ENFORCEMENT: Apply tier-based rules (Don't trust LLM blindly)
+def enforce_tier_rules(decision: Dict[str, Any], client_profiles: Dict[str, Any]) -> Dict[str, Any]:
+    """ENFORCEMENT: Apply tier-based rules (Don't trust the LLM - or any engine - blindly)."""
     target = decision.get("target")
     targets = target if isinstance(target, list) else [target] if target else []
     
@@ -187,7 +227,7 @@ def decision_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
     max_tier = 1
     for t in targets:
         if t and t not in ["None", "Admin", "N/A"]:
-            ctx = enriched_profiles.get(t, {})
+            ctx = client_profiles.get(t, {})
             tier = ctx.get("tier", 1)
             max_tier = max(max_tier, tier)
     
@@ -201,7 +241,54 @@ def decision_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
     elif max_tier == 1:
         if decision.get("strategy") == "COLLECT_RECEIVABLE":
             decision["execution_params"] = {"tone": "POLITE", "channel": "EMAIL"}
+    return decision
+
+def _deterministic_decision(state: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    from app.agents.memory import resolve_client_profiles
+    
+    profiles = resolve_client_profiles(state)
+    return select_strategy(state, profiles), profiles
+
+# ---------------------------
+# LangGraph Node
+# ---------------------------
+def decision_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    if get_settings().engine_mode == "deterministic":
+        decision, profiles = _deterministic_decision(state)
+        state["decision"] = enforce_tier_rules(decision, profiles)
+        return state
+
+    if get_settings().engine_mode == "combined" and state.get("decision"):
+        # Already decided by the combined risk+decision call: only enforce the tiers
+        state["decision"] = enforce_tier_rules(state["decision"], client_history(state)[1])
+        return state
 
+    messages, enriched_profiles = _prepare_decision_messages(state)
+    
+    # Invoke LLM
+    response = get_llm().invoke(messages)
+    
+    # Update state
+    state["decision"] = enforce_tier_rules(_parse_decision(state, response.content), enriched_profiles)
+    return state
+
+async def adecision_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async twin of decision_agent_node for finly_graph.ainvoke."""
+    if get_settings().engine_mode == "deterministic":
+        decision, profiles = await asyncio.to_thread(_deterministic_decision, state)
+        state["decision"] = enforce_tier_rules(decision, profiles)
+        return state
+
+    if get_settings().engine_mode == "combined" and state.get("decision"):
+        _, profiles = await asyncio.to_thread(client_history, state)
+        state["decision"] = enforce_tier_rules(state["decision"], profiles)
+        return state
+
+    messages, enriched_profiles = await asyncio.to_thread(_prepare_decision_messages, state)
+    
+    # Invoke LLM
+    response = await get_llm().ainvoke(messages)
+    
     # Update state
-    state["decision"] = decision
+    state["decision"] = enforce_tier_rules(_parse_decision(state, response.content), enriched_profiles)
     return state
@@ -0,0 +1,206 @@
+# app/agents/engine.py
+
+"""
+Deterministic analysis engine (FINLY_ENGINE_MODE=deterministic).
+
+Computes the same `risk_analysis` / `sub_goal` / `decision` shapes the LLM prompts ask for,
+directly from financial_metrics, line items and client tiers. Same input -> same output.
+"""
+
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from app.core.timeline import obligations as _obligations, resolve_cash_timeline
+
+GRACE_PERIOD_HOURS = 24
+MIN_DELAY_NOTICE_DAYS = 2  # Only delay Bills if due_in_days > 2
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def _in_grace_period(profile: Dict[str, Any], as_of: datetime) -> bool:
+    last = _parse_ts(profile.get("last_contacted_at"))
+    if last is None:
+        return False
+    try:
+        return (as_of - last).total_seconds() / 3600 < GRACE_PERIOD_HOURS
+    except TypeError:
+        # Naive vs aware timestamps: can't compare, don't block the client
+        return False
+
+# ---------------------------
+# Stage 1: Risk Assessment
+# ---------------------------
+def assess_risk(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Deterministic equivalent of risk_prompt: liquidity, timing and solvency checks."""
+    metrics = state.get("financial_metrics", {})
+    cash = state.get("cash_balance", 0)
+    receivables = state.get("receivables", [])
+    obligations = _obligations(state)
+
+    total_outflow = metrics.get("total_outflow", sum(o["amount"] for o in obligations))
+    projected_balance = metrics.get("projected_balance", cash - total_outflow)
+    net_position = metrics.get("net_position", projected_balance + sum(r.get("amount", 0) for r in receivables))
+    liquidity_status = metrics.get("liquidity_status", "SURPLUS" if projected_balance >= 0 else "DEFICIT")
+
+    first_due = obligations[0]["due_in_days"] if obligations else 0
+
+    # Critical window: the first day the dated balance goes negative, else the first obligation
+    timeline = resolve_cash_timeline(state)
+    first_negative = timeline["first_negative_day"]
+    critical_day = first_negative if first_negative is not None else first_due
+
+    # Timing: does any receivable land on or before the first obligation?
+    if not obligations:
+        timing = "No upcoming obligations."
+        in_time = True
+    elif not receivables:
+        timing = "No receivables expected. Must rely on Cash."
+        in_time = False
+    else:
+        earliest_rec = min(r.get("due_in_days", 0) for r in receivables)
+        in_time = earliest_rec <= first_due
+        if in_time:
+            timing = "Receivable available to cover Bill."
+        else:
+            timing = (
+                f"Receivables ({earliest_rec}d) arrive too late for "
+                f"{obligations[0]['name']} ({first_due}d). Must rely on Cash."
+            )
+
+    if liquidity_status == "DEFICIT":
+        shortfall = -projected_balance
+        severity = min(1.0, shortfall / total_outflow) if total_outflow else 1.0
+        risk_score = min(100, 70 + round(20 * severity) + (0 if in_time else 10))
+        dominant_risk = f"Outflows ({total_outflow}) exceed cash balance ({cash})"
+        if timeline["exposed_obligations"]:
+            names = [o["name"] for o in timeline["exposed_obligations"]]
+            exposed = ", ".join(names[:3]) + (f" +{len(names) - 3} more" if len(names) > 3 else "")
+            dominant_risk += f"; balance goes negative on day {first_negative} ({exposed} exposed)"
+        sub_goal = {
+            "intent": "COVER_DEFICIT",
+            "required_amount": shortfall,
+            "deadline_days": critical_day,
+            "reason": f"Cash is insufficient. Projected Balance: {projected_balance}. {timing}"
+        }
+    else:
+        if net_position < 0:
+            risk_score = 45
+            dominant_risk = "Burning cash: receivables do not cover outflows long-term"
+        else:
+            risk_score = 15
+            dominant_risk = "None: cash covers all upcoming obligations"
+        sub_goal = {
+            "intent": "MAINTAIN_LIQUIDITY",
+            "required_amount": 0,
+            "deadline_days": first_due,
+            "reason": f"Cash {cash} covers Outflows. Projected Balance: {projected_balance}. {timing}"
+        }
+
+    return {
+        "risk_score": risk_score,
+        "critical_window": f"{critical_day} days",
+        "dominant_risk": dominant_risk,
+        "confidence": "HIGH",
+        "engine": "deterministic",
+        "sub_goal": sub_goal
+    }
+
+# ---------------------------
+# Stage 2: Strategy Selection (Funding Waterfall)
+# ---------------------------
+def select_strategy(state: Dict[str, Any], client_profiles: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Deterministic equivalent of decision_prompt's funding waterfall.
+
+    Obligations are walked in due order with a running total. For each one, all receivables
+    due on or before it are pooled and checked against the running total:
+      A. receivables alone cover it        -> collect
+      B. receivables + cash cover it       -> collect (or status quo if nothing to collect)
+      C. deficit                           -> delay the bill if due > 2 days, else alert founder
+    Tier enforcement is applied afterwards by decision_agent_node, same as for LLM decisions.
+    """
+    cash = state.get("cash_balance", 0)
+    receivables = state.get("receivables", [])
+    preferences = state.get("preferences") or {}
+    as_of = _parse_ts(state.get("client_profiles_as_of")) or datetime.now()
+
+    steps = []
+    contributing: Dict[str, int] = {}  # client -> pooled amount, in pooling order
+    running_total = 0
+
+    # Sweep receivables in due order: the pool for each obligation only ever grows
+    by_due = sorted(receivables, key=lambda r: r.get("due_in_days", 0))
+    next_rec = 0
+    total_rec = 0
+
+    for ob in _obligations(state):
+        running_total += ob["amount"]
+        while next_rec < len(by_due) and by_due[next_rec].get("due_in_days", 0) <= ob["due_in_days"]:
+            r = by_due[next_rec]
+            total_rec += r.get("amount", 0)
+            if r.get("client"):
+                contributing[r["client"]] = contributing.get(r["client"], 0) + r.get("amount", 0)
+            next_rec += 1
+
+        if total_rec >= running_total:
+            steps.append(f"{ob['name']} ({ob['amount']}, {ob['due_in_days']}d): Pooled receivables ({total_rec}) fully cover obligations to date ({running_total}). Preserving Cash.")
+        elif total_rec + cash >= running_total:
+            steps.append(f"{ob['name']} ({ob['amount']}, {ob['due_in_days']}d): Pooled receivables ({total_rec}) + Cash Balance ({cash}) covers obligations to date ({running_total}).")
+        else:
+            deficit = running_total - (total_rec + cash)
+            steps.append(f"{ob['name']} ({ob['amount']}, {ob['due_in_days']}d): Insufficient funds (Cash + Recs = {total_rec + cash}) to cover obligations to date ({running_total}). Deficit {deficit}.")
+            # NEVER delay Salaries unless preferences allow it; only delay if due > 2 days
+            can_delay = ob["due_in_days"] > MIN_DELAY_NOTICE_DAYS and (
+                ob["kind"] == "bill" or not preferences.get("dont_delay_salaries", True)
+            )
+            if can_delay:
+                return {
+                    "strategy": "DELAY_VENDOR_PAYMENT",
+                    "target": ob["name"],
+                    "rationale": " ".join(steps),
+                    "amount_goal": deficit,
+                    "execution_params": {"tone": "POLITE", "channel": "EMAIL"}
+                }
+            steps.append(f"{ob['name']} cannot be delayed (salary or due within {MIN_DELAY_NOTICE_DAYS} days).")
+            return {
+                "strategy": "ALERT_FOUNDER",
+                "target": "Admin",
+                "rationale": " ".join(steps),
+                "amount_goal": deficit,
+                "execution_params": {"tone": "URGENT", "channel": "EMAIL"}
+            }
+
+    # Grace period: don't chase anyone contacted in the last 24 hours
+    waiting = [c for c in contributing if _in_grace_period(client_profiles.get(c, {}), as_of)]
+    waiting_set = set(waiting)
+    targets = [c for c in contributing if c not in waiting_set]
+    if waiting:
+        steps.append(f"Contacted within {GRACE_PERIOD_HOURS}h, waiting for response: {', '.join(waiting)}.")
+
+    if not targets:
+        if not contributing:
+            steps.append("No receivables needed before obligations fall due.")
+        return {
+            "strategy": "MAINTAIN_STATUS_QUO",
+            "target": "None",
+            "rationale": " ".join(steps),
+            "amount_goal": 0,
+            "execution_params": {"tone": "NONE", "channel": "NONE"}
+        }
+
+    amount_goal = sum(contributing[c] for c in targets)
+    return {
+        "strategy": "COLLECT_RECEIVABLE",
+        "target": targets,
+        "rationale": " ".join(steps),
+        "amount_goal": amount_goal,
+        "execution_params": {"tone": "POLITE", "channel": "EMAIL"}
+    }
@@ -1,73 +1,393 @@
 # app/agents/memory.py
 
+import asyncio
+import heapq
 import json
 import os
-from datetime import datetime
-from typing import Dict, Any, List
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from app.core.metrics import LEDGER_SECONDS, timed
 
-# Define the path for the persistent memory store
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Define the path for the persistent memory store.
+# LEDGER_FILE is the live, append-only JSONL ledger (one record per line).
+# MEMORY_FILE is the legacy JSON array; it is migrated into LEDGER_FILE once and then left untouched.
+LEDGER_FILE = os.path.join(os.path.dirname(__file__), "../data/client_memory.jsonl")
 MEMORY_FILE = os.path.join(os.path.dirname(__file__), "../data/client_memory.json")
 
-def load_memory() -> List[Dict[str, Any]]:
-    """Load the persistent memory ledger from JSON file."""
-    if not os.path.exists(MEMORY_FILE):
-        return []
+# Guards the in-memory client index
+_LEDGER_LOCK = threading.Lock()
+# Serializes ledger writes in this process; _ledger_write_lock() adds the cross-process file lock
+_WRITE_LOCK = threading.Lock()
+
+# action_taken of records written by the outbox worker once a queued email is actually
+# delivered (result "SENT") or dead-lettered (result "FAILED"). They carry the real outcome
+# for the client but are not a new contact attempt; the original "QUEUED" record was.
+DELIVERY_REPORT = "DELIVERY_REPORT"
+
+# A SENT record becomes a failure once this long has passed without a PAID / OPTIMAL
+SENT_GRACE_PERIOD = timedelta(hours=24)
+# Lookups may be pinned slightly in the past (the per-run snapshot time, concurrent runs), so
+# overdue SENT records are only folded into a client's summary this long after they expired
+PROMOTION_LAG = timedelta(hours=1)
+
+# ---------------------------
+# Ledger Storage (append-only JSONL)
+# ---------------------------
+# Safe with several processes (uvicorn --workers N) on one data directory:
+# - every write (append, rewrite, migration) holds an advisory lock on LEDGER_FILE + ".lock";
+# - readers take no file lock. Appends only add complete lines at the end (a torn tail is never
+#   parsed) and rewrites swap the file atomically, so any read sees a consistent prefix.
+@contextmanager
+def _ledger_write_lock() -> Iterator[None]:
+    """Thread lock + advisory file lock shared by every process writing this ledger."""
+    os.makedirs(os.path.dirname(LEDGER_FILE), exist_ok=True)
+    with _WRITE_LOCK:
+        with open(LEDGER_FILE + ".lock", "a+b") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _encode_record(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, default=str) + "\n").encode("utf-8")
+
+def _parse_lines(chunk: bytes) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Parses complete lines from a chunk of the ledger.
+    Returns (records, consumed_bytes). A trailing fragment without a newline is a torn
+    write and is not consumed; complete lines that fail to parse are skipped with a warning.
+    """
+    end = chunk.rfind(b"\n") + 1
+    records = []
+    for line in chunk[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            print(f"⚠️ Skipping corrupt ledger line: {line[:80]!r}")
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records, end
+
+def _write_ledger_atomically(memory: List[Dict[str, Any]]):
+    os.makedirs(os.path.dirname(LEDGER_FILE), exist_ok=True)
+    tmp_path = LEDGER_FILE + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for record in memory:
+            f.write(_encode_record(record))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, LEDGER_FILE)
+
+def _migrate_legacy_ledger():
+    """One-time migration: legacy JSON array -> JSONL. Caller holds _ledger_write_lock()."""
+    if os.path.exists(LEDGER_FILE) or not os.path.exists(MEMORY_FILE):
+        return
     try:
         with open(MEMORY_FILE, "r") as f:
             data = json.load(f)
-            # Migration support: if data is a dict (old format), return empty list or convert?
-            # For safety, if it's not a list, start fresh to avoid crashes.
-            if isinstance(data, list):
-                return data
-            return []
-    except json.JSONDecodeError:
+    except json.JSONDecodeError as e:
+        # Never start from an empty ledger silently: that would reset every client's tier.
+        print(f"⚠️ Legacy ledger {MEMORY_FILE} is corrupt ({e}); not migrating.")
+        return
+    if not isinstance(data, list):
+        return
+    _write_ledger_atomically(data)
+    print(f"🧠 Migrated {len(data)} ledger records to {LEDGER_FILE}")
+
+def _repair_torn_tail(f):
+    """
+    Truncates a torn last line (left by a crash mid-append) so the next append starts clean.
+    Only safe under _ledger_write_lock(): otherwise it could cut another writer's line short.
+    """
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+        return
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        return
+    # Walk back to the last complete line
+    pos = size
+    while pos > 0:
+        step = min(4096, pos)
+        f.seek(pos - step)
+        nl = f.read(step).rfind(b"\n")
+        if nl != -1:
+            pos = pos - step + nl + 1
+            break
+        pos -= step
+    print(f"⚠️ Truncating torn ledger tail ({size - pos} bytes)")
+    f.truncate(pos)
+
+@timed(LEDGER_SECONDS, operation="load")
+def load_memory() -> List[Dict[str, Any]]:
+    """Load the persistent memory ledger (all records, in append order)."""
+    if not os.path.exists(LEDGER_FILE) and os.path.exists(MEMORY_FILE):
+        with _ledger_write_lock():
+            _migrate_legacy_ledger()
+    if not os.path.exists(LEDGER_FILE):
         return []
+    with open(LEDGER_FILE, "rb") as f:
+        records, _ = _parse_lines(f.read())
+    return records
 
+@timed(LEDGER_SECONDS, operation="save")
 def save_memory(memory: List[Dict[str, Any]]):
-    """Save the memory ledger to the JSON file."""
-    os.makedirs(os.path.dirname(MEMORY_FILE), exist_ok=True)
-    with open(MEMORY_FILE, "w") as f:
-        json.dump(memory, f, indent=4, default=str)
+    """
+    Replace the whole ledger (atomic rewrite). Prefer append_memory() for new records:
+    anything another process appends between your load_memory() and this call is dropped.
+    """
+    with _ledger_write_lock():
+        _write_ledger_atomically(memory)
+
+def _append_to_ledger(record: Dict[str, Any]):
+    """O(1) durable append: a single write in append mode, then fsync. Caller holds _ledger_write_lock()."""
+    with open(LEDGER_FILE, "a+b") as f:
+        _repair_torn_tail(f)
+        f.write(_encode_record(record))
+        f.flush()
+        os.fsync(f.fileno())
+
+# ---------------------------
+# Client Index (loaded once, appended to incrementally)
+# ---------------------------
+def _resolve_status(record: Dict[str, Any], client_id: str) -> Any:
+    """Returns the outcome of a ledger record for one specific client."""
+    status = record.get("result", "UNKNOWN")
+    
+    # Handle BATCH_PROCESSED (Multi-target logic)
+    if status == "BATCH_PROCESSED":
+        details = record.get("details", {})
+        targets_proc = details.get("targets_processed", [])
+        # Find specific status for this client
+        for t_res in targets_proc:
+            if t_res.get("target") == client_id:
+                # Found our client in the batch
+                s_res = t_res.get("result", {})
+                if isinstance(s_res, dict):
+                    status = s_res.get("status", "UNKNOWN")
+                else:
+                    status = s_res
+                break
+    
+    # Normalize status (if it was a simple dict output)
+    if isinstance(status, dict):
+        status = status.get("status", "UNKNOWN")
+    return status
+
+def _sent_grace_end(timestamp: Any) -> Optional[datetime]:
+    """When a SENT record stops being in grace; None if its timestamp can't be compared (always a failure)."""
+    if not timestamp:
+        return None
+    try:
+        sent_at = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    # Lookups run on naive local time, which can't be compared with an aware timestamp
+    return sent_at + SENT_GRACE_PERIOD if sent_at.tzinfo is None else None
+
+class _ClientSummary:
+    """
+    One client's stats, updated as each ledger record is added (see _stats_from_entries for the rules).
+    SENT records still in their grace period wait in `pending`, a heap of
+    (grace end, reset epoch): one that expires counts as a failure, and as a consecutive one if no
+    PAID / OPTIMAL came after it (same epoch). A lookup only looks at those pending records.
+    """
+
+    __slots__ = ("entries", "attempts", "last_contacted_at", "failures", "consecutive_failures", "epoch", "pending")
+
+    def __init__(self):
+        # Raw entries, only read by lookups pinned before the promotion horizon
+        self.entries: List[Tuple[Any, Any, bool]] = []
+        self.attempts = 0
+        self.last_contacted_at = None
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.epoch = 0  # Bumped by every PAID / OPTIMAL
+        self.pending: List[Tuple[datetime, int]] = []
+
+    def add(self, timestamp: Any, status: Any, is_attempt: bool):
+        self.entries.append((timestamp, status, is_attempt))
+        if is_attempt:
+            self.attempts += 1
+            self.last_contacted_at = timestamp
+        if status in ["PAID", "OPTIMAL"]:
+            self.consecutive_failures = 0
+            self.epoch += 1
+        elif status in ["IGNORED", "FAILED"]:
+            self._fail(self.epoch)
+        elif status == "SENT":
+            grace_end = _sent_grace_end(timestamp)
+            if grace_end is None:
+                self._fail(self.epoch)
+            else:
+                heapq.heappush(self.pending, (grace_end, self.epoch))
+
+    def _fail(self, epoch: int):
+        self.failures += 1
+        if epoch == self.epoch:
+            self.consecutive_failures += 1
+
+    def promote(self, horizon: datetime):
+        """Folds SENT records whose grace period ended before `horizon` into the counts."""
+        while self.pending and self.pending[0][0] < horizon:
+            _, epoch = heapq.heappop(self.pending)
+            self._fail(epoch)
+
+    def stats(self, now: datetime) -> Dict[str, Any]:
+        overdue = [epoch for grace_end, epoch in self.pending if grace_end < now]
+        return {
+            "attempts": self.attempts,
+            "failures": self.failures + len(overdue),
+            "consecutive_failures": self.consecutive_failures + sum(1 for e in overdue if e == self.epoch),
+            "last_contacted_at": self.last_contacted_at,
+        }
 
-def get_client_stats(client_id: str) -> Dict[str, Any]:
+class _ClientLedgerIndex:
     """
-    Analyzes the ledger to calculate current stats for a client.
+    Per-client view of the ledger: client_id -> _ClientSummary.
+    Built from the file once, then kept current by tailing only the bytes appended since
+    the last sync. A stats lookup costs the same however long the client's history is.
     """
-    memory = load_memory()
+
+    def __init__(self):
+        self.by_client: Dict[str, _ClientSummary] = {}
+        self.inode = None
+        self.offset = 0  # Bytes of LEDGER_FILE already folded into the index
+        # Lookups at or after this time are answered from the summaries (see PROMOTION_LAG)
+        self.promoted_until = datetime.min
+
+    def reset(self):
+        self.by_client = {}
+        self.inode = None
+        self.offset = 0
+        self.promoted_until = datetime.min
+
+    def add(self, record: Dict[str, Any]):
+        clients = record.get("clients", [])
+        if isinstance(clients, list):
+            ids = {c for c in clients if isinstance(c, str)}
+        elif isinstance(clients, str):
+            ids = {clients}
+        else:
+            # Hand-edited or legacy record (e.g. a dict): skipped, like a corrupt line
+            print(f"⚠️ Skipping ledger record with unusable clients: {str(clients)[:80]!r}")
+            return
+        if record.get("target") is not None:
+            ids.add(record.get("target"))
+        is_attempt = record.get("action_taken") != DELIVERY_REPORT
+        for client_id in ids:
+            if not isinstance(client_id, str):
+                continue
+            if client_id not in self.by_client:
+                self.by_client[client_id] = _ClientSummary()
+            self.by_client[client_id].add(record.get("timestamp"), _resolve_status(record, client_id), is_attempt)
+
+    def stats(self, client_id: str, now: datetime) -> Dict[str, Any]:
+        summary = self.by_client.get(client_id)
+        if summary is None:
+            return _stats_from_entries([], now)
+        if now.tzinfo is not None or now < self.promoted_until:
+            # Pinned before the horizon (or aware): rare, recompute from the raw entries
+            return _stats_from_entries(summary.entries, now)
+        self.promoted_until = max(self.promoted_until, now - PROMOTION_LAG)
+        summary.promote(self.promoted_until)
+        return summary.stats(now)
+
+_INDEX = _ClientLedgerIndex()
+_MIGRATION_CHECKED = False
+
+def _sync_index() -> _ClientLedgerIndex:
+    """
+    Folds ledger lines appended since the last sync (by any process) into the index.
+    Caller holds _LEDGER_LOCK; writers in other processes are never blocked by it.
+    """
+    global _MIGRATION_CHECKED
+    if not _MIGRATION_CHECKED:
+        if not os.path.exists(LEDGER_FILE) and os.path.exists(MEMORY_FILE):
+            with _ledger_write_lock():
+                _migrate_legacy_ledger()
+        _MIGRATION_CHECKED = True
+
+    try:
+        f = open(LEDGER_FILE, "rb")
+    except FileNotFoundError:
+        _INDEX.reset()
+        return _INDEX
+
+    with f:
+        # fstat the open file, not the path: a concurrent rewrite can't mix two files into one read
+        st = os.fstat(f.fileno())
+
+        # Rewritten (save_memory) or truncated: start over
+        if st.st_ino != _INDEX.inode or st.st_size < _INDEX.offset:
+            _INDEX.reset()
+            _INDEX.inode = st.st_ino
+
+        if st.st_size > _INDEX.offset:
+            f.seek(_INDEX.offset)
+            records, consumed = _parse_lines(f.read(st.st_size - _INDEX.offset))
+            for record in records:
+                _INDEX.add(record)
+            _INDEX.offset += consumed
+    return _INDEX
+
+@timed(LEDGER_SECONDS, operation="append")
+def append_memory(record: Dict[str, Any]):
+    """Appends one record to the ledger in O(1), safely across processes, then updates the client index."""
+    with _ledger_write_lock():
+        _migrate_legacy_ledger()
+        _append_to_ledger(record)
+    with _LEDGER_LOCK:
+        _sync_index()
+
+def _client_stats(client_ids: List[str], now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """One ledger sync, then each client's stats at `now` (consistent with each other)."""
+    now = now or datetime.now()
+    with _LEDGER_LOCK:
+        index = _sync_index()
+        return {c_id: index.stats(c_id, now) for c_id in client_ids}
+
+def get_client_stats(client_id: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Current stats for a client, from its incrementally maintained summary.
+    `now` pins the 24h grace-period check to a snapshot time (defaults to the current time).
+    """
+    return _client_stats([client_id], now)[client_id]
+
+def _stats_from_entries(client_records: List[Tuple[Any, Any, bool]], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Stats from scratch over a client's raw entries. _ClientSummary keeps the same numbers incrementally."""
+    now = now or datetime.now()
     
     attempts = 0
     failures = 0
     consecutive_failures = 0
     last_contacted = None
     
-    # Sort by timestamp ascending just in case, though append-only should be sorted
-    # We filter for this client first
-    client_records = [r for r in memory if client_id in r.get("clients", []) or r.get("target") == client_id]
-    
-    for record in client_records:
-        attempts += 1
-        last_contacted = record.get("timestamp")
-        
-        status = record.get("result", "UNKNOWN")
-        
-        # Handle BATCH_PROCESSED (Multi-target logic)
-        if status == "BATCH_PROCESSED":
-            details = record.get("details", {})
-            targets_proc = details.get("targets_processed", [])
-            # Find specific status for this client
-            for t_res in targets_proc:
-                if t_res.get("target") == client_id:
-                    # Found our client in the batch
-                    s_res = t_res.get("result", {})
-                    if isinstance(s_res, dict):
-                        status = s_res.get("status", "UNKNOWN")
-                    else:
-                        status = s_res
-                    break
-        
-        # Normalize status (if it was a simple dict output)
-        if isinstance(status, dict):
-            status = status.get("status", "UNKNOWN")
+    # Records are kept in ledger (append) order
+    for timestamp, status, is_attempt in client_records:
+        if is_attempt:
+            attempts += 1
+            last_contacted = timestamp
             
         if status in ["PAID", "OPTIMAL"]:
             consecutive_failures = 0 # Reset on success
@@ -77,10 +397,10 @@ def get_client_stats(client_id: str) -> Dict[str, Any]:
         elif status == "SENT":
             # Only count 'SENT' as a consecutive failure if 24 hours have passed
             # without a follow-up 'PAID' or 'OPTIMAL' status.
-            if record.get("timestamp"):
+            if timestamp:
                 try:
-                    sent_at = datetime.fromisoformat(record.get("timestamp"))
-                    hours_passed = (datetime.now() - sent_at).total_seconds() / 3600
+                    sent_at = datetime.fromisoformat(timestamp)
+                    hours_passed = (now - sent_at).total_seconds() / 3600
                     if hours_passed > 24:
                         consecutive_failures += 1
                         failures += 1
@@ -99,12 +419,10 @@ def get_client_stats(client_id: str) -> Dict[str, Any]:
         "last_contacted_at": last_contacted
     }
 
-def get_client_context(client_id: str) -> Dict[str, Any]:
+def _context_from_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Retrieves past behavior for a specific client.
     Adapts Ledger stats to the old 'risk_score_modifier' format for compatibility.
     """
-    stats = get_client_stats(client_id)
     cf = stats["consecutive_failures"]
     
     # Map consecutive failures to Tier/Risk
@@ -119,10 +437,54 @@ def get_client_context(client_id: str) -> Dict[str, Any]:
     return {
         "risk_score_modifier": risk_mod,
         "consecutive_failures": cf,
+        "attempts": stats["attempts"],
+        "failures": stats["failures"],
         "last_contacted_at": stats["last_contacted_at"],
         "tier": 3 if cf >= 2 else (2 if cf == 1 else 1)
     }
 
+def get_client_context(client_id: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Retrieves past behavior for a specific client.
+    """
+    return _context_from_stats(get_client_stats(client_id, now))
+
+def get_client_contexts(client_ids: List[str], now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Batched get_client_context: one ledger pass and one snapshot time for every client.
+    """
+    stats = _client_stats(list(dict.fromkeys(client_ids)), now)
+    return {c_id: _context_from_stats(client_stats) for c_id, client_stats in stats.items()}
+
+def resolve_client_profiles(state: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the per-run client snapshot taken by client_context_node.
+    Falls back to a fresh batched lookup when a node is run outside the graph.
+    """
+    profiles = state.get("client_profiles")
+    if profiles is not None:
+        return profiles
+    client_ids = [r.get("client") for r in state.get("receivables", []) if r.get("client")]
+    return get_client_contexts(client_ids)
+
+# ---------------------------
+# LangGraph Nodes
+# ---------------------------
+def client_context_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    LangGraph Node (graph entry): resolves every client's context once, at one timestamp.
+    Downstream nodes read state["client_profiles"] instead of hitting the ledger again,
+    so risk and decision always agree on tiers even if a record lands mid-run.
+    """
+    snapshot_at = datetime.now()
+    client_ids = [r.get("client") for r in state.get("receivables", []) if r.get("client")]
+    state["client_profiles"] = get_client_contexts(client_ids, snapshot_at)
+    state["client_profiles_as_of"] = snapshot_at.isoformat()
+    return state
+
+async def aclient_context_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    return await asyncio.to_thread(client_context_node, state)
+
 def memory_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     LangGraph Node: Memory & Learning Agent (The Historian).
@@ -146,8 +508,6 @@ def memory_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
     if not valid_targets:
         return state
 
-    memory = load_memory()
-    
     # Extract result status
     result_data = action_log.get("result", {})
     status = "UNKNOWN"
@@ -166,10 +526,13 @@ def memory_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
         "details": action_log
     }
     
-    memory.append(record)
-    save_memory(memory)
+    append_memory(record)
     
-    # Update state with latest profile for visibility (optional)
-    state["memory_updates"] = {t: get_client_context(t) for t in valid_targets}
+    # Update state with the post-write profile for visibility (one batched lookup)
+    state["memory_updates"] = get_client_contexts(valid_targets)
 
     return state
+
+async def amemory_agent_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async twin of memory_agent_node. Ledger I/O is file-bound, so it runs in a worker thread."""
+    return await asyncio.to_thread(memory_agent_node, state)
@@ -1,13 +1,20 @@
 # app/agents/risk_reasoning.py
 
+import asyncio
 import json
-from typing import Dict, Any, List
+import threading
+from typing import Dict, Any, List, Optional
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from app.agents.memory import get_client_context
-from dotenv import load_dotenv
-
-load_dotenv()
+from app.core.llm_cache import get_llm_cache
+from app.core.llm_metrics import LLMMetricsCallback
+from app.agents.memory import resolve_client_profiles
+from app.agents.engine import assess_risk
+from app.agents.combined import combined_assessment, acombined_assessment
+from app.agents.simulation import monte_carlo_cash_flow
+from app.core.config import get_settings
+from app.core.timeline import obligations, resolve_cash_timeline
+from app.core.prompt_context import budget_sections
 
 # ---------------------------
 # Utility: Safe JSON Parsing
@@ -23,12 +30,20 @@ def safe_json_parse(text: str) -> Dict[str, Any]:
 # Step 1: Scenario Simulation (Enhanced)
 # ---------------------------
 def simulate_scenarios(state: Dict[str, Any], client_profiles: Dict[str, Any]) -> List[Dict[str, Any]]:
+    settings = get_settings()
+    mc = monte_carlo_cash_flow(
+        state["cash_balance"],
+        state["receivables"],
+        obligations(state),
+        client_profiles,
+        paths=settings.mc_paths,
+        seed=settings.mc_seed,
+    )
     total_salaries = sum(s["amount"] for s in state["salaries"])
     total_bills = sum(b["amount"] for b in state["fixed_bills"])
-    
-    # Calculate probability-adjusted cashflows based on risk modifiers
-    # (Simplified logic for simulation)
-    
+
+    # best/expected/worst keep their deterministic meaning; the simulated distribution
+    # (percentiles, shortfall probability) is in the monte_carlo entry
     return [
         {
             "name": "best_case",
@@ -46,7 +61,7 @@ def simulate_scenarios(state: Dict[str, Any], client_profiles: Dict[str, Any]) -
             "net_cash": (
                 state["cash_balance"]
                 + sum(
-                    r["amount"] / client_profiles.get(r["client"], {}).get("risk_score_modifier", 1.0) 
+                    r["amount"] / client_profiles.get(r["client"], {}).get("risk_score_modifier", 1.0)
                     for r in state["receivables"]
                 )
                 - total_salaries
@@ -61,18 +76,34 @@ def simulate_scenarios(state: Dict[str, Any], client_profiles: Dict[str, Any]) -
                 - total_salaries
                 - total_bills
             )
+        },
+        {
+            "name": "monte_carlo",
+            "description": f"{mc['paths']} simulated paths over {mc['horizon_days']} days; net_cash is the median end balance",
+            "net_cash": mc["final_balance_percentiles"]["p50"],
+            **mc
         }
     ]
 
 # ---------------------------
 # LLM Configuration
 # ---------------------------
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.3,
-    model_kwargs={"response_format": {"type": "json_object"}},
-    request_timeout=20
-)
+llm = None  # Built on first use (get_llm); benchmarks assign a stand-in
+_LLM_LOCK = threading.Lock()  # The startup warm-up thread builds it while requests may already arrive
+
+def get_llm() -> ChatOpenAI:
+    global llm
+    with _LLM_LOCK:
+        if llm is None:
+            llm = ChatOpenAI(
+                model="gpt-4o-mini",
+                temperature=0.3,
+                model_kwargs={"response_format": {"type": "json_object"}},
+                request_timeout=20,
+                cache=get_llm_cache(),
+                callbacks=[LLMMetricsCallback("risk")]
+            )
+        return llm
 
 # ---------------------------
 # Prompt: Risk Reasoning
@@ -90,6 +121,7 @@ INPUT DATA:
 - Cash Balance: {cash_balance}
 - Upcoming Outflows: {outflow_details}
 - Expected Inflows: {inflow_details}
+- Cash Timeline (precomputed day by day, receivables on time): {cash_timeline}
 
 STRICT RULES:
 1. **CHECK LIQUIDITY STATUS (Can we pay NOW?)**:
@@ -107,6 +139,8 @@ STRICT RULES:
    - Check if any Receivable arrives BEFORE the outflow due date.
    - If YES -> Mention it in reasoning: "Receivable available to cover Bill."
    - If NO -> Mention it: "Receivables (20d) arrive too late for Bill (10d). Must rely on Cash."
+   - `critical_window`: if Cash Timeline has a `first_negative_day`, use "<first_negative_day> days"
+     and name its `exposed_obligations`; otherwise use the first obligation's due date.
 
 3. **ASSESS SOLVENCY (Long-term)**:
    - Only relevant if Liquidity is SURPLUS.
@@ -154,45 +188,69 @@ Risk analysis:
 {risk_analysis}
 """)
 
+# ---------------------------
+# Prompt: Narrative (deterministic engine mode)
+# ---------------------------
+narrative_prompt = ChatPromptTemplate.from_template("""
+You are a financial analyst. The risk assessment below was computed exactly; do not change any number.
+Write a 2-3 sentence plain-English summary of it for the founder.
+
+Return JSON: {{"narrative": string}}
+
+Assessment:
+{analysis}
+""")
+
 # ---------------------------
 # LangGraph Node: Risk Reasoning Agent
 # ---------------------------
 
-def risk_reasoning_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    # 1. Fetch Client Context from Memory Agent
-    receivables = state.get("receivables", [])
-    client_profiles = {}
-    for r in receivables:
-        c_id = r.get("client")
-        if c_id:
-            client_profiles[c_id] = get_client_context(c_id)
+def _risk_scenarios(state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # 1. Client Context (snapshot taken at graph entry)
+    client_profiles = resolve_client_profiles(state)
             
     # 2. Simulate Scenarios
-    scenarios = simulate_scenarios(state, client_profiles)
-    
+    return simulate_scenarios(state, client_profiles)
+
+def _risk_prompt_inputs(state: Dict[str, Any]) -> Dict[str, Any]:
     # 3. Extract Metrics (Zero-Hallucination Source)
+    receivables = state.get("receivables", [])
     metrics = state.get("financial_metrics", {})
     cash = state.get("cash_balance")
     outflows = state.get("salaries", []) + state.get("fixed_bills", [])
     total_outflow = metrics.get("total_outflow", 0)
     projected_balance = metrics.get("projected_balance", 0)
     liquidity_status = metrics.get("liquidity_status", "UNKNOWN")
+    # The summary only: the daily series is for the API/UI, not the prompt
+    timeline = {k: v for k, v in resolve_cash_timeline(state).items() if k != "daily_balance"}
+    top_k = get_settings().prompt_top_k
+    exposed = timeline.get("exposed_obligations", [])
+    if len(exposed) > top_k:
+        timeline["exposed_obligations"] = exposed[:top_k]
+        timeline["exposed_obligations_not_listed"] = len(exposed) - top_k
+
+    # Large books: top-K line items + due-date totals, within the prompt token budget
+    book, listed = budget_sections({"outflows": outflows, "inflows": receivables})
     
-    # 4. Reason (LLM)
-    inputs = {
-        "financial_metrics": json.dumps(metrics, indent=2),
+    return {
+        "financial_metrics": json.dumps(metrics),
         "cash_balance": cash,
-        "outflow_details": json.dumps(outflows, default=str),
+        "outflow_details": book["outflows"],
         "outflow_total": total_outflow,
         "projected_balance": projected_balance,
         "liquidity_status": liquidity_status,
-        "inflow_details": json.dumps(receivables, default=str)
+        "inflow_details": book["inflows"],
+        "cash_timeline": json.dumps(timeline, default=str),
+        "listed_clients": {r.get("client") for r in listed["inflows"]}
     }
-    
-    response = llm.invoke(risk_prompt.format(**inputs))
 
-    risk_analysis_output = safe_json_parse(response.content)
-    
+def _narrative_text(content: str) -> Optional[str]:
+    try:
+        return safe_json_parse(content).get("narrative")
+    except ValueError:
+        return None
+
+def _store_risk_analysis(state: Dict[str, Any], scenarios: List[Dict[str, Any]], risk_analysis_output: Dict[str, Any]) -> Dict[str, Any]:
     # 5. Extract Sub-Goal directly
     sub_goal = risk_analysis_output.get("sub_goal", {})
 
@@ -201,3 +259,60 @@ def risk_reasoning_node(state: Dict[str, Any]) -> Dict[str, Any]:
     state["sub_goal"] = sub_goal
     
     return state
+
+def risk_reasoning_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    scenarios = _risk_scenarios(state)
+    settings = get_settings()
+
+    if settings.engine_mode == "deterministic":
+        # 4. Reason (Python) - LLM only narrates, if asked to
+        risk_analysis_output = assess_risk(state)
+        if settings.engine_narrative:
+            response = get_llm().invoke(narrative_prompt.format(analysis=json.dumps(risk_analysis_output)))
+            risk_analysis_output["narrative"] = _narrative_text(response.content)
+        return _store_risk_analysis(state, scenarios, risk_analysis_output)
+
+    if settings.engine_mode == "combined":
+        # 4. Reason + decide in one LLM call; decision_agent_node applies the tier rules
+        combined = combined_assessment(state, _risk_prompt_inputs(state))
+        if combined["decision"]:
+            state["decision"] = combined["decision"]
+        if combined["risk_analysis"]:
+            # Without a decision, decision_agent_node asks its own prompt for one
+            return _store_risk_analysis(state, scenarios, combined["risk_analysis"])
+    
+    # 4. Reason (LLM)
+    response = get_llm().invoke(risk_prompt.format(**_risk_prompt_inputs(state)))
+
+    return _store_risk_analysis(state, scenarios, safe_json_parse(response.content))
+
+async def arisk_reasoning_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Async twin of risk_reasoning_node: ledger reads run in a worker thread, the LLM call is awaited."""
+    # Only touches the ledger when run outside the graph (no snapshot yet)
+    scenarios = await asyncio.to_thread(_risk_scenarios, state)
+    settings = get_settings()
+
+    if settings.engine_mode == "deterministic":
+        # 4. Reason (Python) - LLM only narrates, if asked to
+        risk_analysis_output = assess_risk(state)
+        if settings.engine_narrative:
+            response = await get_llm().ainvoke(narrative_prompt.format(analysis=json.dumps(risk_analysis_output)))
+            risk_analysis_output["narrative"] = _narrative_text(response.content)
+        return _store_risk_analysis(state, scenarios, risk_analysis_output)
+
+    # Token budgeting (tiktoken over the whole book) runs in a worker thread, like the decision prompt
+    inputs = await asyncio.to_thread(_risk_prompt_inputs, state)
+
+    if settings.engine_mode == "combined":
+        # 4. Reason + decide in one LLM call; decision_agent_node applies the tier rules
+        combined = await acombined_assessment(state, inputs)
+        if combined["decision"]:
+            state["decision"] = combined["decision"]
+        if combined["risk_analysis"]:
+            # Without a decision, decision_agent_node asks its own prompt for one
+            return _store_risk_analysis(state, scenarios, combined["risk_analysis"])
+    
+    # 4. Reason (LLM)
+    response = await get_llm().ainvoke(risk_prompt.format(**inputs))
+
+    return _store_risk_analysis(state, scenarios, safe_json_parse(response.content))
@@ -0,0 +1,142 @@
+# app/core/config.py
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from dotenv import load_dotenv
+
+@lru_cache(maxsize=1)
+def load_env():
+    """Reads .env into os.environ, once per process. Every module that reads os.getenv imports this one."""
+    load_dotenv()
+
+load_env()
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "../data")
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+@dataclass(frozen=True)
+class Settings:
+    """Runtime switches, read from the environment once per process."""
+
+    # "llm": risk + decision are reasoned by the LLM (default)
+    # "deterministic": computed in Python by app.agents.engine; the LLM is only used for narrative
+    # "combined": risk + decision from a single LLM call (app.agents.combined), tiers still enforced in Python
+    engine_mode: str = "llm"
+    # Deterministic mode only: ask the LLM for a short human-readable summary of the result
+    engine_narrative: bool = False
+
+    # LLM response cache (risk, decision and drafting calls)
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: float = 3600
+    llm_cache_max_entries: int = 2000
+    llm_cache_path: str = os.path.join(DATA_DIR, "llm_cache.sqlite3")
+
+    # Line items (receivables, salaries, bills) in the risk/decision prompts: verbatim while they fit
+    # `prompt_token_budget` tokens, else the top-K per list plus due-date totals (0 = no budget)
+    prompt_token_budget: int = 3000
+    prompt_top_k: int = 40
+
+    # Per-node memoization (app.core.node_memo): risk_reasoning / decision_agent results are reused
+    # while the fingerprint of what they read (line items, metrics, client tiers, settings) is
+    # unchanged. Entries live in-process for `node_memo_ttl_seconds`, at most `node_memo_entries`
+    node_memo: bool = True
+    node_memo_entries: int = 256
+    node_memo_ttl_seconds: float = 900
+
+    # Max concurrent draft+send jobs per action_execution_node run
+    action_max_concurrency: int = 5
+
+    # "per_recipient": one drafting LLM call per email
+    # "template": a few placeholder templates per (strategy, tone) are drafted once and cached;
+    # each recipient's email is filled in locally. Templates are redrafted after
+    # `drafting_template_ttl_seconds` or as soon as the prompt text changes
+    drafting_mode: str = "per_recipient"
+    drafting_template_variants: int = 3
+    drafting_template_ttl_seconds: float = 6 * 3600
+
+    # "direct": action_execution_node sends over SMTP inline
+    # "outbox": it enqueues rendered emails and returns; the server's outbox worker delivers them
+    email_delivery: str = "direct"
+    outbox_path: str = os.path.join(DATA_DIR, "outbox.sqlite3")
+    outbox_max_attempts: int = 5
+    outbox_backoff_seconds: float = 30
+    outbox_backoff_max_seconds: float = 1800
+    outbox_poll_seconds: float = 2
+
+    # Max graph runs in flight across all /run-analysis/batch requests on one worker
+    batch_max_concurrency: int = 4
+
+    # Monte Carlo cash-flow simulation (simulate_scenarios); at least one path is always run
+    mc_paths: int = 10000
+    mc_seed: int = 0
+
+    # Local analysis history (MongoDB fallback): rotated JSONL segments
+    history_dir: str = os.path.join(DATA_DIR, "history")
+    history_segment_bytes: int = 8 * 1024 * 1024
+    # Old single-file fallback (relative to the working directory), imported once
+    history_legacy_path: str = "history.json"
+
+    # MongoDB analysis_history writes: buffered and flushed in bulk
+    # when `mongo_batch_size` documents are waiting or `mongo_flush_seconds` have passed
+    mongo_batch_size: int = 100
+    mongo_flush_seconds: float = 1.0
+    mongo_timeout_seconds: float = 5.0
+    # Circuit breaker: after this many consecutive failures, skip Mongo (straight to the local
+    # store) for `mongo_breaker_reset_seconds`, then let one probe through
+    mongo_breaker_failures: int = 3
+    mongo_breaker_reset_seconds: float = 30
+    # How often locally stored analyses are replayed into Mongo once it is reachable
+    mongo_replay_seconds: float = 30
+
+    # Server start: build the graph and LLM clients in the background right after startup,
+    # so the first analysis doesn't pay for it (the health check answers meanwhile)
+    warmup: bool = True
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            engine_mode=os.getenv("FINLY_ENGINE_MODE", cls.engine_mode).strip().lower(),
+            engine_narrative=_env_bool("FINLY_ENGINE_NARRATIVE", cls.engine_narrative),
+            llm_cache_enabled=_env_bool("FINLY_LLM_CACHE", cls.llm_cache_enabled),
+            llm_cache_ttl_seconds=float(os.getenv("FINLY_LLM_CACHE_TTL", cls.llm_cache_ttl_seconds)),
+            llm_cache_max_entries=int(os.getenv("FINLY_LLM_CACHE_MAX_ENTRIES", cls.llm_cache_max_entries)),
+            llm_cache_path=os.getenv("FINLY_LLM_CACHE_PATH", cls.llm_cache_path),
+            prompt_token_budget=int(os.getenv("FINLY_PROMPT_TOKEN_BUDGET", cls.prompt_token_budget)),
+            prompt_top_k=int(os.getenv("FINLY_PROMPT_TOP_K", cls.prompt_top_k)),
+            node_memo=_env_bool("FINLY_NODE_MEMO", cls.node_memo),
+            node_memo_entries=int(os.getenv("FINLY_NODE_MEMO_ENTRIES", cls.node_memo_entries)),
+            node_memo_ttl_seconds=float(os.getenv("FINLY_NODE_MEMO_TTL_SECONDS", cls.node_memo_ttl_seconds)),
+            action_max_concurrency=int(os.getenv("FINLY_ACTION_CONCURRENCY", cls.action_max_concurrency)),
+            email_delivery=os.getenv("FINLY_EMAIL_DELIVERY", cls.email_delivery).strip().lower(),
+            outbox_path=os.getenv("FINLY_OUTBOX_PATH", cls.outbox_path),
+            outbox_max_attempts=int(os.getenv("FINLY_OUTBOX_MAX_ATTEMPTS", cls.outbox_max_attempts)),
+            outbox_backoff_seconds=float(os.getenv("FINLY_OUTBOX_BACKOFF", cls.outbox_backoff_seconds)),
+            outbox_backoff_max_seconds=float(os.getenv("FINLY_OUTBOX_BACKOFF_MAX", cls.outbox_backoff_max_seconds)),
+            outbox_poll_seconds=float(os.getenv("FINLY_OUTBOX_POLL", cls.outbox_poll_seconds)),
+            drafting_mode=os.getenv("FINLY_DRAFTING_MODE", cls.drafting_mode).strip().lower(),
+            drafting_template_variants=int(os.getenv("FINLY_DRAFTING_TEMPLATE_VARIANTS", cls.drafting_template_variants)),
+            drafting_template_ttl_seconds=float(os.getenv("FINLY_DRAFTING_TEMPLATE_TTL_SECONDS", cls.drafting_template_ttl_seconds)),
+            batch_max_concurrency=int(os.getenv("FINLY_BATCH_CONCURRENCY", cls.batch_max_concurrency)),
+            mc_paths=int(os.getenv("FINLY_MC_PATHS", cls.mc_paths)),
+            mc_seed=int(os.getenv("FINLY_MC_SEED", cls.mc_seed)),
+            history_dir=os.getenv("FINLY_HISTORY_DIR", cls.history_dir),
+            history_segment_bytes=int(os.getenv("FINLY_HISTORY_SEGMENT_BYTES", cls.history_segment_bytes)),
+            history_legacy_path=os.getenv("FINLY_HISTORY_LEGACY", cls.history_legacy_path),
+            mongo_batch_size=int(os.getenv("FINLY_MONGO_BATCH_SIZE", cls.mongo_batch_size)),
+            mongo_flush_seconds=float(os.getenv("FINLY_MONGO_FLUSH_SECONDS", cls.mongo_flush_seconds)),
+            mongo_timeout_seconds=float(os.getenv("FINLY_MONGO_TIMEOUT_SECONDS", cls.mongo_timeout_seconds)),
+            mongo_breaker_failures=int(os.getenv("FINLY_MONGO_BREAKER_FAILURES", cls.mongo_breaker_failures)),
+            mongo_breaker_reset_seconds=float(os.getenv("FINLY_MONGO_BREAKER_RESET_SECONDS", cls.mongo_breaker_reset_seconds)),
+            mongo_replay_seconds=float(os.getenv("FINLY_MONGO_REPLAY_SECONDS", cls.mongo_replay_seconds)),
+            warmup=_env_bool("FINLY_WARMUP", cls.warmup),
+        )
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings.from_env()
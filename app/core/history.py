@@ -0,0 +1,316 @@
+# app/core/history.py
+
+"""
+Local analysis history (used when MongoDB is unavailable).
+
+Append-only JSONL segments (history-000001.jsonl, history-000002.jsonl, ...) in one
+directory. A new segment is started once the active one reaches `segment_bytes`, so no write
+ever touches more than one line and no read has to load everything. Writers from several
+threads or worker processes serialize on a lock file.
+"""
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_SEGMENT = re.compile(r"^history-(\d{6})\.jsonl$")
+_IMPORT_MARKER = ".legacy-imported"
+
+MAX_PAGE_SIZE = 500
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """ISO string -> naive UTC datetime (created_at is written as naive UTC)."""
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+class HistoryStore:
+    def __init__(self, directory: str, segment_bytes: int, legacy_path: Optional[str] = None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+        # Closed segments never change: (path, size) -> (min created_at, max created_at)
+        self._bounds: Dict[Tuple[str, int], Tuple[Optional[datetime], Optional[datetime]]] = {}
+        self._legacy_checked = False
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------------------------
+    # Locking & Segments
+    # ---------------------------
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Thread lock + advisory file lock (other uvicorn workers share the directory)."""
+        with self._lock:
+            with open(os.path.join(self.directory, ".lock"), "a+b") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        found = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"history-{number:06d}.jsonl")
+
+    def _write_lines(self, lines: List[bytes]):
+        """Appends encoded lines, rotating as segments fill up. Caller holds the lock."""
+        segments = self._segments()
+        number, path = segments[-1] if segments else (1, self._segment_path(1))
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        pending: List[bytes] = []
+        for line in lines:
+            if size and size + len(line) > self.segment_bytes:
+                self._append_bytes(path, pending)
+                number, path, size, pending = number + 1, self._segment_path(number + 1), 0, []
+            pending.append(line)
+            size += len(line)
+        self._append_bytes(path, pending)
+
+    @staticmethod
+    def _append_bytes(path: str, lines: List[bytes]):
+        if not lines:
+            return
+        with open(path, "a+b") as f:
+            # A crash mid-write can leave a torn last line: terminate it (readers skip it)
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ---------------------------
+    # Legacy Import
+    # ---------------------------
+    def _import_legacy(self):
+        """Copies the old history.json array into the segments once. The old file is left in place."""
+        if self._legacy_checked:
+            return
+        self._legacy_checked = True
+        marker = os.path.join(self.directory, _IMPORT_MARKER)
+        if not self.legacy_path or not os.path.exists(self.legacy_path) or os.path.exists(marker):
+            return
+        try:
+            with open(self.legacy_path, "r") as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Could not import legacy history {self.legacy_path}: {e}")
+            return
+        if not isinstance(entries, list):
+            return
+        self._write_lines([_encode(e) for e in entries if isinstance(e, dict)])
+        with open(marker, "w") as f:
+            f.write(os.path.abspath(self.legacy_path))
+        print(f"📚 Imported {len(entries)} entries from {self.legacy_path}")
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def append(self, record: Dict[str, Any]):
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict[str, Any]]):
+        lines = [_encode(r) for r in records]
+        with self._locked():
+            self._import_legacy()
+            self._write_lines(lines)
+
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Newest-first page of entries with start <= created_at <= end (either bound optional).
+        Pass the returned `next_cursor` back to get the next (older) page; None means no more.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        stop_segment, stop_offset = _parse_cursor(cursor) if cursor else (None, None)
+
+        with self._locked():
+            self._import_legacy()
+            segments = self._segments()
+
+        items: List[Dict[str, Any]] = []
+        active = segments[-1][0] if segments else None
+        for number, path in reversed(segments):
+            if stop_segment is not None and number > stop_segment:
+                continue
+            limit_bytes = stop_offset if number == stop_segment else None
+            if number != active and limit_bytes is None and not self._may_overlap(path, start, end):
+                continue
+            for offset, record in _read_segment_reversed(path, limit_bytes):
+                if start or end:
+                    ts = parse_timestamp(record.get("created_at"))
+                    if ts is None or (start and ts < start) or (end and ts > end):
+                        continue
+                items.append(record)
+                if len(items) == limit:
+                    return {"items": items, "next_cursor": f"{number}:{offset}"}
+        return {"items": items, "next_cursor": None}
+
+    def read_forward(self, position: Optional[str] = None, limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Oldest-first entries after `position` (None: from the beginning), for consumers that
+        work through the store (backlog replay). Returns the entries and the position to resume from.
+        """
+        segment, offset = _parse_cursor(position) if position else (0, 0)
+        with self._locked():
+            self._import_legacy()
+            segments = self._segments()
+
+        items: List[Dict[str, Any]] = []
+        for number, path in segments:
+            if number < segment:
+                continue
+            for _, end, record in _scan_segment(path, offset if number == segment else 0):
+                items.append(record)
+                position = f"{number}:{end}"
+                if len(items) == limit:
+                    return items, position
+        return items, position
+
+    def _may_overlap(self, path: str, start: Optional[datetime], end: Optional[datetime]) -> bool:
+        if not start and not end:
+            return True
+        key = (path, os.path.getsize(path))
+        if key not in self._bounds:
+            stamps = [ts for ts in (parse_timestamp(r.get("created_at")) for _, r in _read_segment(path)) if ts]
+            self._bounds[key] = (min(stamps), max(stamps)) if stamps else (None, None)
+        low, high = self._bounds[key]
+        if low is None:
+            return False
+        return not ((start and high < start) or (end and low > end))
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, default=str) + "\n").encode("utf-8")
+
+def _parse_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        segment, offset = cursor.split(":", 1)
+        return int(segment), int(offset)
+    except ValueError:
+        raise ValueError(f"Invalid history cursor: {cursor!r}")
+
+def _scan_segment(path: str, start_bytes: int = 0,
+                  limit_bytes: Optional[int] = None) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """(start offset, end offset, record) for each complete, parseable line in [start_bytes, limit_bytes)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(start_bytes)
+            data = f.read() if limit_bytes is None else f.read(max(0, limit_bytes - start_bytes))
+    except FileNotFoundError:
+        return
+    offset = start_bytes
+    for line in data.splitlines(keepends=True):
+        start, offset = offset, offset + len(line)
+        if not line.endswith(b"\n") or not line.strip():
+            continue  # Torn or blank
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(record, dict):
+            yield start, offset, record
+
+def _read_segment(path: str, limit_bytes: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """(byte offset, record) for each complete, parseable line before `limit_bytes`."""
+    for start, _, record in _scan_segment(path, 0, limit_bytes):
+        yield start, record
+
+def _read_segment_reversed(path: str, limit_bytes: Optional[int] = None,
+                           block_size: int = 64 * 1024) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Same as _read_segment, last line first, reading backwards in blocks so a page stops early."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END) if limit_bytes is None else limit_bytes
+        # Skip a torn tail: only lines terminated by a newline count
+        f.seek(max(0, end - 1))
+        if end and f.read(1) != b"\n":
+            while end > 0:
+                step = min(block_size, end)
+                f.seek(end - step)
+                cut = f.read(step).rfind(b"\n")
+                if cut >= 0:
+                    end = end - step + cut + 1
+                    break
+                end -= step
+
+        position, pending = end, b""
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            pending = f.read(step) + pending
+            # Unless at the file start, bytes before the first newline belong to an earlier line
+            cut = pending.find(b"\n") + 1 if position > 0 else 0
+            if position > 0 and cut == 0:
+                continue
+            complete, pending = pending[cut:], pending[:cut]
+
+            offset, found = position + cut, []
+            for line in complete.splitlines(keepends=True):
+                found.append((offset, line))
+                offset += len(line)
+            for offset, line in reversed(found):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    yield offset, record
+
+_STORE: Optional[HistoryStore] = None
+_STORE_LOCK = threading.Lock()
+
+def get_history_store() -> HistoryStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            settings = get_settings()
+            _STORE = HistoryStore(settings.history_dir, settings.history_segment_bytes, settings.history_legacy_path)
+        return _STORE
+
+def configure_history_store(store: Optional[HistoryStore]):
+    """Replaces the process history store (e.g. a temp directory in benchmarks). None re-reads settings."""
+    global _STORE
+    with _STORE_LOCK:
+        _STORE = store
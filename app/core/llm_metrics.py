@@ -0,0 +1,67 @@
+# app/core/llm_metrics.py
+
+"""
+LangChain callback feeding the finly_llm_* metrics. Kept out of app.core.metrics so the
+server can import the registry without loading langchain.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.core.metrics import LLM_COST, LLM_ERRORS, LLM_SECONDS, LLM_TOKENS
+
+# USD per 1M tokens (input, output); unknown models are counted as 0
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Attach to a chat model (callbacks=[...]) to record latency, tokens and cost under `agent`."""
+
+    # Cheap and thread-safe: no need for langchain to hop to an executor in async runs
+    run_inline = True
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._started: Dict[UUID, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or "unknown"
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), model)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            start, model = self._started.pop(run_id, (None, "unknown"))
+
+        cached = False
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                # langchain marks replayed cache entries with total_cost=0
+                cached = cached or usage.get("total_cost") == 0
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+
+        if start is not None:
+            LLM_SECONDS.observe(time.perf_counter() - start, agent=self.agent, model=model, cached=str(cached).lower())
+        if cached:
+            return
+        LLM_TOKENS.inc(input_tokens, agent=self.agent, model=model, type="input")
+        LLM_TOKENS.inc(output_tokens, agent=self.agent, model=model, type="output")
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        LLM_COST.inc((input_tokens * input_price + output_tokens * output_price) / 1_000_000, agent=self.agent, model=model)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            self._started.pop(run_id, None)
+        LLM_ERRORS.inc(agent=self.agent)
@@ -0,0 +1,151 @@
+# app/core/metrics.py
+
+"""
+In-process Prometheus metrics, exposed by GET /metrics (text exposition format 0.0.4).
+
+Per-process: with several uvicorn workers, each worker reports its own numbers.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# ---------------------------
+# Metric Types
+# ---------------------------
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> [per-bucket counts, sum, count]
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = f'le="{_format_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_number(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+# ---------------------------
+# Registry
+# ---------------------------
+NODE_SECONDS = Histogram("finly_node_duration_seconds", "Graph node latency.", ["node"])
+LLM_SECONDS = Histogram("finly_llm_request_duration_seconds", "LLM call latency (cache hits included).", ["agent", "model", "cached"])
+LLM_TOKENS = Counter("finly_llm_tokens_total", "LLM tokens, cache hits excluded.", ["agent", "model", "type"])
+LLM_COST = Counter("finly_llm_cost_usd_total", "Estimated LLM spend in USD (see MODEL_PRICES).", ["agent", "model"])
+LLM_ERRORS = Counter("finly_llm_errors_total", "Failed LLM calls.", ["agent"])
+LLM_INVALID = Counter("finly_llm_invalid_replies_total", "LLM replies that failed validation, by what falls back.", ["agent", "fallback"])
+EMAIL_SECONDS = Histogram("finly_email_send_duration_seconds", "send_payment_reminder latency.")
+EMAILS = Counter("finly_emails_total", "Emails by delivery result.", ["status"])
+LEDGER_SECONDS = Histogram("finly_ledger_duration_seconds", "Client ledger I/O latency.", ["operation"])
+RUN_SECONDS = Histogram("finly_run_duration_seconds", "Full analysis run latency.", ["endpoint"])
+RUNS = Counter("finly_runs_total", "Analysis runs by outcome and chosen strategy.", ["endpoint", "outcome", "strategy"])
+NODE_MEMO = Counter("finly_node_memo_total", "Memoized node lookups by result (hit, miss).", ["node", "result"])
+
+REGISTRY = [
+    NODE_SECONDS, LLM_SECONDS, LLM_TOKENS, LLM_COST, LLM_ERRORS, LLM_INVALID,
+    EMAIL_SECONDS, EMAILS, LEDGER_SECONDS, RUN_SECONDS, RUNS, NODE_MEMO,
+]
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def timed(histogram: Histogram, **labels: Any):
+    """Decorator: observe the wall time of a sync or async function, failures included."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, **labels)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+def record_run(endpoint: str, seconds: float, response: Optional[Dict[str, Any]] = None):
+    """Counts one finished run. `response` is None when the run failed."""
+    RUN_SECONDS.observe(seconds, endpoint=endpoint)
+    if response is None:
+        RUNS.inc(endpoint=endpoint, outcome="error", strategy="NONE")
+        return
+    from app.agents.decision import AVAILABLE_STRATEGIES
+
+    # The strategy is LLM output: anything off the list shares one series
+    strategy = (response.get("decision") or {}).get("strategy")
+    RUNS.inc(endpoint=endpoint, outcome="ok", strategy=strategy if strategy in AVAILABLE_STRATEGIES else "other")
@@ -0,0 +1,180 @@
+# app/core/node_memo.py
+
+"""
+Per-node memoization for incremental re-analysis (FINLY_NODE_MEMO).
+
+The dashboard re-sends the whole book on every refresh. Each memoized node is keyed by a
+content hash (fingerprint) of what it reads: line items, financial_metrics, the cash timeline,
+the tiers and contact state of the receivable clients, and the settings that shape its output.
+While that fingerprint is unchanged, the node's stored outputs are restored instead of
+recomputed (Monte Carlo, LLM calls). Book and client fingerprints are hashed once per run and
+shared by both nodes.
+
+Only side-effect-free nodes are memoized (MEMO_NODES). client_context (the ledger snapshot the
+client fingerprint comes from), action_execution (emails) and memory_agent (ledger writes) run
+on every invocation, so whatever decision reaches them is acted on as before.
+"""
+
+import asyncio
+import copy
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import NODE_MEMO
+
+# Node -> state keys it reads on top of the book and client fingerprints
+MEMO_NODES: Dict[str, Tuple[str, ...]] = {
+    "risk_reasoning": (),
+    "decision_agent": ("sub_goal", "decision"),
+}
+
+# State keys each node writes (risk_reasoning also writes `decision` in combined mode)
+NODE_OUTPUTS: Dict[str, Tuple[str, ...]] = {
+    "risk_reasoning": ("scenarios", "risk_analysis", "sub_goal"),
+    "decision_agent": ("decision",),
+}
+
+BOOK_KEYS = ("cash_balance", "salaries", "fixed_bills", "receivables", "preferences", "financial_metrics", "cash_timeline")
+
+# Settings that change what the memoized nodes return
+SETTINGS_KEYS = ("engine_mode", "engine_narrative", "mc_paths", "mc_seed", "prompt_token_budget", "prompt_top_k")
+
+# Profile fields the nodes read (Monte Carlo behaviour, tiers, 24h grace period)
+PROFILE_KEYS = ("tier", "consecutive_failures", "attempts", "failures", "last_contacted_at")
+
+# ---------------------------
+# Fingerprints
+# ---------------------------
+def fingerprint(value: Any) -> str:
+    """Content hash of a JSON-like value (key order does not matter)."""
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def _client_inputs(state: Dict[str, Any]) -> Dict[str, Any]:
+    from app.agents.engine import _in_grace_period, _parse_ts
+    from app.agents.memory import resolve_client_profiles
+
+    profiles = resolve_client_profiles(state)
+    as_of = _parse_ts(state.get("client_profiles_as_of"))
+    clients = {}
+    for r in state.get("receivables", []):
+        c_id = r.get("client")
+        if c_id and c_id not in clients:
+            profile = profiles.get(c_id, {})
+            clients[c_id] = {k: profile.get(k) for k in PROFILE_KEYS}
+            # Crossing the 24h mark changes the decision even though the profile did not
+            clients[c_id]["in_grace_period"] = bool(as_of) and _in_grace_period(profile, as_of)
+    return clients
+
+def run_fingerprints(state: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Book + client fingerprints for this run, stored in state["fingerprints"].
+    Reused by later nodes of the same run (same client snapshot); recomputed otherwise.
+    """
+    run = state.get("client_profiles_as_of")
+    cached = state.get("fingerprints") or {}
+    if run and cached.get("run") == run:
+        return cached
+    settings = get_settings()
+    fingerprints = {
+        "run": run or "",
+        "book": fingerprint({k: state.get(k) for k in BOOK_KEYS}),
+        "clients": fingerprint(_client_inputs(state)),
+        "settings": fingerprint({k: getattr(settings, k) for k in SETTINGS_KEYS}),
+    }
+    state["fingerprints"] = fingerprints
+    return fingerprints
+
+def node_fingerprint(name: str, state: Dict[str, Any]) -> str:
+    shared = run_fingerprints(state)
+    reads = {k: state.get(k) for k in MEMO_NODES[name]}
+    return fingerprint([name, shared["book"], shared["clients"], shared["settings"], reads])
+
+# ---------------------------
+# Store (in-process, TTL + LRU)
+# ---------------------------
+_MEMO: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+def _lookup(key: str) -> Optional[Dict[str, Any]]:
+    ttl = get_settings().node_memo_ttl_seconds
+    with _MEMO_LOCK:
+        entry = _MEMO.get(key)
+        if entry is None:
+            return None
+        if ttl and time.time() - entry[0] >= ttl:
+            del _MEMO[key]
+            return None
+        _MEMO.move_to_end(key)
+        return entry[1]
+
+def _store(key: str, outputs: Dict[str, Any]):
+    max_entries = get_settings().node_memo_entries
+    with _MEMO_LOCK:
+        _MEMO[key] = (time.time(), outputs)
+        _MEMO.move_to_end(key)
+        while len(_MEMO) > max_entries:
+            _MEMO.popitem(last=False)
+
+def clear_node_memo():
+    with _MEMO_LOCK:
+        _MEMO.clear()
+
+def _outputs(name: str) -> Tuple[str, ...]:
+    if name == "risk_reasoning" and get_settings().engine_mode == "combined":
+        return NODE_OUTPUTS[name] + ("decision",)
+    return NODE_OUTPUTS[name]
+
+def _restore(name: str, key: str, state: Dict[str, Any]) -> bool:
+    outputs = _lookup(key)
+    NODE_MEMO.inc(node=name, result="hit" if outputs is not None else "miss")
+    if outputs is None:
+        return False
+    # Copies: downstream nodes mutate their inputs (e.g. enforce_tier_rules on the decision)
+    for k, value in outputs.items():
+        state[k] = copy.deepcopy(value)
+    print(f"♻️ {name}: inputs unchanged, reusing the stored result")
+    return True
+
+def _remember(name: str, key: str, state: Dict[str, Any]):
+    _store(key, {k: copy.deepcopy(state[k]) for k in _outputs(name) if k in state})
+
+# ---------------------------
+# Node Wrapper
+# ---------------------------
+def memoized(name: str, func: Callable, afunc: Callable) -> Tuple[Callable, Callable]:
+    """Wraps a node's sync and async bodies. Only nodes listed in MEMO_NODES can be memoized."""
+    if name not in MEMO_NODES:
+        raise ValueError(f"{name} is not side-effect free; it must run on every invocation")
+
+    @functools.wraps(func)
+    def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+        if not get_settings().node_memo:
+            return func(state)
+        # Fingerprint the inputs before the node mutates the state
+        key = node_fingerprint(name, state)
+        if _restore(name, key, state):
+            return state
+        state = func(state)
+        _remember(name, key, state)
+        return state
+
+    @functools.wraps(afunc)
+    async def async_wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+        if not get_settings().node_memo:
+            return await afunc(state)
+        # Hashing a large book (and a ledger lookup outside the graph) stays off the event loop
+        key = await asyncio.to_thread(node_fingerprint, name, state)
+        if _restore(name, key, state):
+            return state
+        state = await afunc(state)
+        _remember(name, key, state)
+        return state
+
+    return wrapper, async_wrapper
@@ -0,0 +1,124 @@
+# app/core/prompt_context.py
+
+"""
+Token-bounded serialization of line items (receivables, salaries, bills) for the LLM prompts.
+
+Small books go into the prompt verbatim. Once the serialized items exceed the token budget,
+each list keeps its top-K items verbatim (earliest due and largest amounts) and the rest is
+summed into due-date buckets; K is halved until the budget holds. The bucket table has a
+fixed size, so the prompt stays bounded however many items the book has.
+"""
+
+import bisect
+import heapq
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+# Due-date buckets for summarized items: (first day, last day); None = open-ended
+DUE_BUCKETS = [(0, 7), (8, 14), (15, 30), (31, 60), (61, 90), (91, None)]
+
+# ---------------------------
+# Token Counting
+# ---------------------------
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception as e:
+        # tiktoken fetches its BPE files on first use; without network, estimate instead
+        print(f"⚠️ Tokenizer unavailable ({type(e).__name__}); estimating prompt tokens from length")
+        return None
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 3 + 1  # JSON runs ~3-4 characters per token: err on the large side
+    return len(encoding.encode(text, disallowed_special=()))
+
+# ---------------------------
+# Compaction
+# ---------------------------
+def _due(item: Dict[str, Any]) -> int:
+    return int(item.get("due_in_days", 0) or 0)
+
+def _amount(item: Dict[str, Any]) -> float:
+    return item.get("amount", 0) or 0
+
+def _top_k(items: List[Dict[str, Any]], k: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(kept, rest): alternately the most urgent and the largest remaining item, until k are kept."""
+    if k >= len(items):
+        return list(items), []
+    indices = range(len(items))
+    by_due = heapq.nsmallest(k, indices, key=lambda i: (_due(items[i]), -_amount(items[i])))
+    by_amount = heapq.nsmallest(k, indices, key=lambda i: (-_amount(items[i]), _due(items[i])))
+    kept = set()
+    for a, b in zip(by_due, by_amount):
+        for i in (a, b):
+            if len(kept) < k:
+                kept.add(i)
+        if len(kept) >= k:
+            break
+    # Original order, so the listed items read like the book
+    return [items[i] for i in sorted(kept)], [item for i, item in enumerate(items) if i not in kept]
+
+_BUCKET_STARTS = [first for first, _ in DUE_BUCKETS]
+
+def summarize_by_due_date(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    counts = [0] * len(DUE_BUCKETS)
+    amounts = [0.0] * len(DUE_BUCKETS)
+    for item in items:
+        b = max(0, bisect.bisect_right(_BUCKET_STARTS, _due(item)) - 1)
+        counts[b] += 1
+        amounts[b] += _amount(item)
+    return [
+        {
+            "due_in_days": f"{first}-{last}" if last is not None else f"{first}+",
+            "count": count,
+            "amount": round(amount, 2),
+        }
+        for (first, last), count, amount in zip(DUE_BUCKETS, counts, amounts)
+        if count
+    ]
+
+def compact_items(items: List[Dict[str, Any]], top_k: int) -> Any:
+    """The list itself if it has at most top_k items, else the top-K plus a due-date summary of the rest."""
+    kept, rest = _top_k(items, top_k)
+    if not rest:
+        return kept
+    return {
+        "listed": kept,
+        "not_listed": {
+            "count": len(rest),
+            "amount": round(sum(_amount(i) for i in rest), 2),
+            "by_due_date": summarize_by_due_date(rest),
+        },
+    }
+
+def budget_sections(sections: Dict[str, List[Dict[str, Any]]],
+                    budget_tokens: Optional[int] = None,
+                    top_k: Optional[int] = None) -> Tuple[Dict[str, str], Dict[str, List[Dict[str, Any]]]]:
+    """
+    JSON for each named list of line items, together within `budget_tokens` (FINLY_PROMPT_TOKEN_BUDGET).
+    Returns (serialized sections, the items listed verbatim per section).
+    """
+    settings = get_settings()
+    budget = settings.prompt_token_budget if budget_tokens is None else budget_tokens
+    k = settings.prompt_top_k if top_k is None else top_k
+
+    serialized = {name: json.dumps(items, default=str) for name, items in sections.items()}
+    if not budget or sum(count_tokens(s) for s in serialized.values()) <= budget:
+        return serialized, {name: list(items) for name, items in sections.items()}
+
+    while True:
+        compacted = {name: compact_items(items, k) for name, items in sections.items()}
+        serialized = {name: json.dumps(c, default=str) for name, c in compacted.items()}
+        if k == 0 or sum(count_tokens(s) for s in serialized.values()) <= budget:
+            listed = {name: c["listed"] if isinstance(c, dict) else c for name, c in compacted.items()}
+            return serialized, listed
+        k //= 2
@@ -9,6 +9,8 @@ class FinanceState(TypedDict):
     
     # 🧮 Pre-calculated Metrics (Zero-Error)
     financial_metrics: Dict[str, int]
+    # 📅 Daily cash position (see app.core.timeline)
+    cash_timeline: Dict[str, Any]
 
     # Agent-1 outputs
     scenarios: List[Dict[str, Any]]
@@ -24,4 +26,8 @@ class FinanceState(TypedDict):
     # Memory update
     memory_updates: Dict[str, Any]
     client_profiles: Dict[str, Any]
+    client_profiles_as_of: str
+
+    # Input fingerprints for per-node memoization (see app.core.node_memo)
+    fingerprints: Dict[str, str]
 
@@ -0,0 +1,73 @@
+# app/core/timeline.py
+
+"""
+Day-by-day cash position, computed once per request next to financial_metrics.
+
+Day 0 is today. Every salary, bill and receivable lands on its due_in_days, receivables
+assumed paid on time. Amounts due the same day are netted before the balance is checked.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+def _days(items: List[Dict[str, Any]]) -> np.ndarray:
+    return np.array([max(0, int(i.get("due_in_days", 0) or 0)) for i in items], dtype=np.int64)
+
+def _amounts(items: List[Dict[str, Any]]) -> np.ndarray:
+    return np.array([i.get("amount", 0) or 0 for i in items], dtype=np.float64)
+
+def obligations(state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Bills + Salaries as one list, sorted by urgency (stable for equal due dates)."""
+    items = [
+        {"name": b.get("type", "Vendor"), "kind": "bill", "amount": b.get("amount", 0), "due_in_days": b.get("due_in_days", 0)}
+        for b in state.get("fixed_bills", [])
+    ] + [
+        {"name": s.get("employee", "Payroll"), "kind": "salary", "amount": s.get("amount", 0), "due_in_days": s.get("due_in_days", 0)}
+        for s in state.get("salaries", [])
+    ]
+    return sorted(items, key=lambda o: o["due_in_days"])
+
+def build_cash_timeline(state: Dict[str, Any], horizon_days: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Closing balance for every day up to the horizon (default: the last due date), plus
+    the first day it goes negative, the minimum, and the obligations due on negative days.
+    """
+    cash = state.get("cash_balance", 0) or 0
+    receivables = state.get("receivables", [])
+    outflows = obligations(state)
+
+    in_days, out_days = _days(receivables), _days(outflows)
+    if horizon_days is None:
+        horizon_days = int(max(in_days.max(initial=0), out_days.max(initial=0)))
+
+    # Items due after the horizon are left out
+    in_mask, out_mask = in_days <= horizon_days, out_days <= horizon_days
+    net = (
+        np.bincount(in_days[in_mask], weights=_amounts(receivables)[in_mask], minlength=horizon_days + 1)
+        - np.bincount(out_days[out_mask], weights=_amounts(outflows)[out_mask], minlength=horizon_days + 1)
+    )
+    balance = cash + np.cumsum(net, dtype=np.float64)
+
+    negative_days = np.flatnonzero(balance < 0)
+    min_day = int(balance.argmin())
+
+    # Already in due order
+    exposed = [
+        {**o, "balance_after": round(float(balance[day]), 2)}
+        for o, day in zip(outflows, out_days)
+        if day <= horizon_days and balance[day] < 0
+    ]
+
+    return {
+        "horizon_days": horizon_days,
+        "daily_balance": balance.round(2).tolist(),
+        "first_negative_day": int(negative_days[0]) if len(negative_days) else None,
+        "min_balance": round(float(balance[min_day]), 2),
+        "min_balance_day": min_day,
+        "exposed_obligations": exposed
+    }
+
+def resolve_cash_timeline(state: Dict[str, Any]) -> Dict[str, Any]:
+    """The timeline attached at request time, or a freshly computed one (graph run directly)."""
+    return state.get("cash_timeline") or build_cash_timeline(state)
@@ -1,13 +1,21 @@
 # app/database.py
 
+import asyncio
+import hashlib
+import json
 import os
+import time
+import uuid
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime
-from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional
 
-load_dotenv()
+from app.core.config import get_settings
 
 MONGO_URI = os.getenv("MONGO_URI")
+COLLECTION = "analysis_history"
 
 client = None
 db = None
@@ -27,55 +35,339 @@ def get_db():
             return None
     return db
 
-async def save_analysis_result(data: dict) -> bool:
+async def _save_locally(docs: List[Dict[str, Any]]) -> bool:
+    """Local history store (append-only, rotated segments; see app.core.history)."""
+    try:
+        from app.core.history import get_history_store
+        store = get_history_store()
+        await asyncio.to_thread(store.append_many, docs)
+        print(f"💾 {len(docs)} analysis result(s) saved locally to {store.directory}")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to save locally: {e}")
+        return False
+
+# ---------------------------
+# Circuit Breaker
+# ---------------------------
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitBreaker:
     """
-    Saves analysis result to MongoDB, falling back to local JSON if DB is unavailable.
+    closed: calls go through. After `failure_threshold` consecutive failures -> open: calls are
+    refused (callers go straight to the local store) for `reset_seconds` -> half_open: one probe
+    goes through; success closes the breaker, failure opens it again. A probe that never reports
+    back (e.g. its task was cancelled) lapses after another `reset_seconds`, and the next call probes.
     """
-    database = get_db()
-    
-    # Add timestamp
-    data["created_at"] = datetime.utcnow().isoformat()
 
-    # Strategy 1: MongoDB
-    if database is not None:
-        try:
-            import asyncio
-            # Wrap the DB operation in a strict timeout to prevent DNS hangs
-            result = await asyncio.wait_for(
-                database["analysis_history"].insert_one(data),
-                timeout=5.0
-            )
-            if "_id" in data:
-                data["_id"] = str(data["_id"]) # Convert ObjectId to string for JSON safety
-            print(f"💾 Analysis saved to MongoDB with ID: {result.inserted_id}")
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0  # When the breaker opened, or when the current probe started
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
             return True
-        except Exception as e:
-            # Remove _id if it was added but insertion failed (to stay JSON serializable)
-            if "_id" in data:
-                del data["_id"]
-            print(f"⚠️ MongoDB save failed: {e}. Switching to local backup...")
+        # Open long enough, or the in-flight probe lapsed: let this call probe
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.begin_probe()
+            return True
+        return False  # Open, or a probe is already in flight
+
+    def begin_probe(self):
+        """Marks a probe as in flight (e.g. the startup ping): other calls are refused until it reports."""
+        self.state = HALF_OPEN
+        self.opened_at = time.monotonic()
+
+    def record_success(self):
+        if self.state != CLOSED:
+            print("✅ MongoDB reachable again, circuit closed")
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                print(f"⚡ MongoDB circuit open for {self.reset_seconds:g}s after {self.failures} failure(s)")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
 
-    # Strategy 2: Local JSON Fallback
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+_breaker: Optional[CircuitBreaker] = None
+
+def get_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        settings = get_settings()
+        _breaker = CircuitBreaker(settings.mongo_breaker_failures, settings.mongo_breaker_reset_seconds)
+    return _breaker
+
+# ---------------------------
+# Mongo Writes (idempotent)
+# ---------------------------
+def _analysis_id(doc: Dict[str, Any]) -> str:
+    """Dedup key. New results get a random one; records saved before it existed get a content hash."""
+    if not doc.get("analysis_id"):
+        payload = json.dumps({k: v for k, v in doc.items() if k != "_id"}, sort_keys=True, default=str)
+        doc["analysis_id"] = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    return doc["analysis_id"]
+
+async def _upsert_many(database, docs: List[Dict[str, Any]], timeout: float) -> Optional[List[Dict[str, Any]]]:
+    """
+    Stores `docs` keyed by analysis_id with $setOnInsert, so writing a document twice keeps the first copy.
+    Returns the documents Mongo rejected, or None if Mongo was unavailable (nothing can be assumed written).
+    """
+    breaker = get_breaker()
+    if not breaker.allow():
+        return None
+    ops = [
+        UpdateOne(
+            {"analysis_id": _analysis_id(doc)},
+            {"$setOnInsert": {k: v for k, v in doc.items() if k not in ("_id", "analysis_id")}},
+            upsert=True
+        )
+        for doc in docs
+    ]
     try:
-        import json
-        file_path = "history.json"
-        
-        # Read existing
-        history = []
-        if os.path.exists(file_path):
-            with open(file_path, "r") as f:
-                try:
-                    history = json.load(f)
-                except json.JSONDecodeError:
-                    pass # Start fresh if corrupt
-        
-        # Append & Save
-        history.append(data)
-        with open(file_path, "w") as f:
-            json.dump(history, f, indent=2, default=str)
-        
-        print(f"💾 Analysis saved locally to {file_path}")
-        return True
+        await asyncio.wait_for(database[COLLECTION].bulk_write(ops, ordered=False), timeout=timeout)
+    except BulkWriteError as e:
+        # The server answered: only the reported documents failed (ordered=False)
+        breaker.record_success()
+        rejected = [docs[err["index"]] for err in e.details.get("writeErrors", [])]
+        print(f"⚠️ MongoDB rejected {len(rejected)} of {len(docs)} analysis result(s)")
+        return rejected
     except Exception as e:
-        print(f"❌ Failed to save locally: {e}")
+        breaker.record_failure()
+        print(f"⚠️ MongoDB bulk save failed: {e!r}")
+        return None
+    breaker.record_success()
+    return []
+
+# ---------------------------
+# Write-Behind Buffer
+# ---------------------------
+class AnalysisWriter:
+    """
+    Collects analysis documents and writes them with one bulk_write per batch: as soon as
+    `batch_size` are waiting, otherwise every `flush_seconds`. Documents that don't make it
+    (rejected, timed out, circuit open) go to the local history store instead.
+    """
+
+    def __init__(self, database, batch_size: int, flush_seconds: float, timeout_seconds: float):
+        self.database = database
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.timeout_seconds = timeout_seconds
+        self._buffer: List[Dict[str, Any]] = []
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, doc: Dict[str, Any]):
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._buffer:
+            batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        # No client yet (still being created at startup): straight to the local store
+        failed = await _upsert_many(self.database, batch, self.timeout_seconds) if self.database is not None else None
+        if failed is None:
+            failed = batch
+        if len(failed) < len(batch):
+            print(f"💾 {len(batch) - len(failed)} analysis result(s) saved to MongoDB")
+        if failed:
+            # Replayed into Mongo by run_replay_worker once it is reachable again
+            await _save_locally(failed)
+
+    async def stop(self):
+        """Stops the timer loop and writes whatever is still buffered."""
+        self._stopping = True
+        self._wake.set()
+        if self._task:
+            await self._task
+        await self.flush()
+
+# ---------------------------
+# Backlog Replay
+# ---------------------------
+# Everything in the local history store missed Mongo. This file (in the store's directory) holds
+# the store position up to which it has been copied over.
+REPLAY_POSITION_FILE = ".mongo-replayed"
+
+def _load_replay_position(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, REPLAY_POSITION_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _save_replay_position(directory: str, position: str):
+    path = os.path.join(directory, REPLAY_POSITION_FILE)
+    with open(path + ".tmp", "w") as f:
+        f.write(position)
+    os.replace(path + ".tmp", path)
+
+async def replay_backlog(database, batch_size: int, timeout: float) -> int:
+    """Copies locally stored analyses into Mongo, oldest first, from where the last replay stopped."""
+    from app.core.history import get_history_store
+    store = get_history_store()
+    position = await asyncio.to_thread(_load_replay_position, store.directory)
+    replayed = 0
+    while True:
+        docs, next_position = await asyncio.to_thread(store.read_forward, position, batch_size)
+        if not docs:
+            break
+        rejected = await _upsert_many(database, docs, timeout)
+        if rejected is None:
+            break  # Unavailable again: the batch is retried next round (upserts make repeats harmless)
+        await asyncio.to_thread(_save_replay_position, store.directory, next_position)
+        position = next_position
+        replayed += len(docs) - len(rejected)
+    if replayed:
+        print(f"🔁 Replayed {replayed} locally stored analysis result(s) into MongoDB")
+    return replayed
+
+_index_ready = False
+
+async def _probe(database) -> bool:
+    """Pings Mongo and, until that has worked once, ensures the analysis_id index. Reports to the breaker."""
+    global _index_ready
+    timeout = get_settings().mongo_timeout_seconds
+    breaker = get_breaker()
+    try:
+        await asyncio.wait_for(database.command("ping"), timeout=timeout)
+        if not _index_ready:
+            # Backs the upsert de-duplication across workers (older documents have no analysis_id)
+            await asyncio.wait_for(database[COLLECTION].create_index("analysis_id", unique=True, sparse=True), timeout=timeout)
+            _index_ready = True
+    except Exception:
+        breaker.record_failure()
         return False
+    breaker.record_success()
+    return True
+
+async def run_replay_worker(database, stop: asyncio.Event):
+    """Background loop: probe Mongo while the circuit is open, replay the local backlog while it is closed."""
+    settings = get_settings()
+    breaker = get_breaker()
+    while not stop.is_set():
+        try:
+            if breaker.state != CLOSED and breaker.allow():
+                await _probe(database)
+            if breaker.state == CLOSED:
+                await replay_backlog(database, settings.mongo_batch_size, settings.mongo_timeout_seconds)
+        except Exception as e:
+            print(f"⚠️ Backlog replay failed: {e!r}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.mongo_replay_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+_writer: Optional[AnalysisWriter] = None
+_replay: Optional[asyncio.Task] = None
+_stop_replay: Optional[asyncio.Event] = None
+
+# ---------------------------
+# Lifecycle (FastAPI lifespan)
+# ---------------------------
+async def _connect(stop: asyncio.Event):
+    """
+    Background half of open_database: creates the client (an SRV lookup blocks, so in a thread),
+    probes it, then runs the backlog replay loop. Startup never waits on Mongo or DNS.
+    """
+    database = await asyncio.to_thread(get_db)
+    if database is None:
+        get_breaker().record_failure()
+        return
+    _writer.database = database
+    if await _probe(database):
+        print("✅ MongoDB reachable")
+    else:
+        print("⚠️ MongoDB ping failed at startup; analyses go to the local store until it answers")
+    await run_replay_worker(database, stop)
+
+async def open_database():
+    """
+    Startup: start the write-behind buffer and, in the background, connect to Mongo, ensure the
+    analysis_id index and start the backlog replay loop (_connect). Returns without any network
+    call: until the startup probe closes the circuit, analyses go to the local store.
+    """
+    global _writer, _replay, _stop_replay
+    if not MONGO_URI:
+        print("⚠️ MONGO_URI not set. Database disabled.")
+        return
+    settings = get_settings()
+    get_breaker().begin_probe()
+    # The client is attached by _connect once created
+    _writer = AnalysisWriter(None, settings.mongo_batch_size, settings.mongo_flush_seconds, settings.mongo_timeout_seconds)
+    _writer.start()
+    _stop_replay = asyncio.Event()
+    _replay = asyncio.create_task(_connect(_stop_replay))
+
+async def close_database():
+    """Shutdown: stop the connect/replay task, flush buffered analyses, then close the client."""
+    global _writer, _replay, _stop_replay, client, db
+    if _replay is not None:
+        _stop_replay.set()
+        await _replay
+        _replay = _stop_replay = None
+    if _writer is not None:
+        await _writer.stop()
+        _writer = None
+    if client is not None:
+        client.close()
+    client = db = None
+
+def database_stats() -> Dict[str, Any]:
+    from app.core.history import get_history_store
+    return {
+        "enabled": db is not None or _writer is not None,
+        "circuit": get_breaker().snapshot(),
+        "buffered": len(_writer._buffer) if _writer else 0,
+        "replay_position": _load_replay_position(get_history_store().directory),
+    }
+
+async def save_analysis_result(data: dict) -> bool:
+    """
+    Saves analysis result to MongoDB, falling back to the local history store if DB is unavailable.
+    In the server the document is only buffered here; AnalysisWriter stores it in bulk.
+    """
+    # Add timestamp + dedup key
+    data["created_at"] = datetime.utcnow().isoformat()
+    data.setdefault("analysis_id", uuid.uuid4().hex)
+
+    if _writer is not None:
+        _writer.submit(dict(data))
+        return True
+
+    # No lifespan (scripts, benchmarks): write straight through
+    database = get_db()
+    if database is not None:
+        failed = await _upsert_many(database, [data], get_settings().mongo_timeout_seconds)
+        if failed == []:
+            print(f"💾 Analysis saved to MongoDB with ID: {data['analysis_id']}")
+            return True
+
+    return await _save_locally([data])
@@ -1,22 +1,65 @@
-from langgraph.graph import StateGraph, END
-from app.core.state import FinanceState
+# app/graph/finly_graph.py
 
-from app.agents.risk_reasoning import risk_reasoning_node
-from app.agents.decision import decision_agent_node
-from app.agents.action import action_execution_node
-from app.agents.memory import memory_agent_node
+"""
+The agent graph, compiled on first use (get_finly_graph). Importing this module is cheap:
+langgraph, langchain and the agents load only when the graph is built.
+"""
 
-graph = StateGraph(FinanceState)
+import threading
 
-graph.add_node("risk_reasoning", risk_reasoning_node)
-graph.add_node("decision_agent", decision_agent_node)
-graph.add_node("action_execution", action_execution_node)
-graph.add_node("memory_agent", memory_agent_node)
+_graph = None
+_graph_lock = threading.Lock()
 
-graph.set_entry_point("risk_reasoning")
-graph.add_edge("risk_reasoning", "decision_agent")
-graph.add_edge("decision_agent", "action_execution")
-graph.add_edge("action_execution", "memory_agent")
-graph.add_edge("memory_agent", END)
+def _node(name, func, afunc):
+    """
+    Sync body (finly_graph.invoke) + async body (finly_graph.ainvoke), both timed under `name`.
+    Side-effect-free nodes are memoized on their input fingerprints (app.core.node_memo).
+    """
+    from langchain_core.runnables import RunnableLambda
+    from app.core.metrics import NODE_SECONDS, timed
+    from app.core.node_memo import MEMO_NODES, memoized
+    if name in MEMO_NODES:
+        func, afunc = memoized(name, func, afunc)
+    return RunnableLambda(timed(NODE_SECONDS, node=name)(func), afunc=timed(NODE_SECONDS, node=name)(afunc))
 
-finly_graph = graph.compile()
+def build_finly_graph():
+    from langgraph.graph import StateGraph, END
+    from app.core.state import FinanceState
+
+    from app.agents.risk_reasoning import risk_reasoning_node, arisk_reasoning_node
+    from app.agents.decision import decision_agent_node, adecision_agent_node
+    from app.agents.action import action_execution_node, aaction_execution_node
+    from app.agents.memory import client_context_node, aclient_context_node, memory_agent_node, amemory_agent_node
+
+    graph = StateGraph(FinanceState)
+
+    graph.add_node("client_context", _node("client_context", client_context_node, aclient_context_node))
+    graph.add_node("risk_reasoning", _node("risk_reasoning", risk_reasoning_node, arisk_reasoning_node))
+    graph.add_node("decision_agent", _node("decision_agent", decision_agent_node, adecision_agent_node))
+    graph.add_node("action_execution", _node("action_execution", action_execution_node, aaction_execution_node))
+    graph.add_node("memory_agent", _node("memory_agent", memory_agent_node, amemory_agent_node))
+
+    graph.set_entry_point("client_context")
+    graph.add_edge("client_context", "risk_reasoning")
+    graph.add_edge("risk_reasoning", "decision_agent")
+    graph.add_edge("decision_agent", "action_execution")
+    graph.add_edge("action_execution", "memory_agent")
+    graph.add_edge("memory_agent", END)
+
+    return graph.compile()
+
+def get_finly_graph():
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = build_finly_graph()
+    return _graph
+
+def graph_loaded() -> bool:
+    return _graph is not None
+
+def __getattr__(name):
+    # `from app.graph.finly_graph import finly_graph` still works; it compiles on first access
+    if name == "finly_graph":
+        return get_finly_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
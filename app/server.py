@@ -1,17 +1,80 @@
 # app/server.py
 
-from dotenv import load_dotenv
-load_dotenv()
-
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Body
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
-from app.graph.finly_graph import finly_graph
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import List, Dict, Any, Optional, Set
+from app.core.config import get_settings  # Loads .env before anything reads the environment
+from app.graph.finly_graph import get_finly_graph, graph_loaded
+from app.core.metrics import record_run, render as render_metrics
+from app.core.timeline import build_cash_timeline
 import uvicorn
 import json
 
-app = FastAPI(title="FinLy Autonomous Agent API")
+def _warm_up():
+    """Imports and compiles the agent graph and builds the LLM clients (runs in a thread)."""
+    start = time.perf_counter()
+    try:
+        get_finly_graph()
+        from app.core.prompt_context import count_tokens
+        count_tokens("")  # Loads the tokenizer (fetched over the network on first use)
+        from app.agents import action, combined, decision, risk_reasoning
+        for agent in (risk_reasoning, decision, action, combined):
+            agent.get_llm()
+        print(f"🔥 Agent graph warmed up in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        # Not fatal: the first request builds whatever is missing (and reports the error)
+        print(f"⚠️ Warm-up failed: {e}")
+
+async def _graph():
+    """The compiled graph. Off the event loop if it still has to be built."""
+    return get_finly_graph() if graph_loaded() else await asyncio.to_thread(get_finly_graph)
+
+# Graph runs that must finish even if the client goes away: once reminders are out, only
+# memory_agent's ledger record keeps the next run from emailing the same clients again
+_DETACHED: Set[asyncio.Task] = set()
+
+def _detach(coro) -> asyncio.Task:
+    """Runs `coro` as a task the request doesn't own: cancelling the request leaves it running."""
+    task = asyncio.create_task(coro)
+    _DETACHED.add(task)
+    task.add_done_callback(_DETACHED.discard)
+    return task
+
+def _report_orphaned(task: asyncio.Task):
+    """Done callback for a detached run nobody is waiting for any more."""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ Analysis run failed after the client disconnected: {task.exception()}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 🔥 Heavy imports happen after startup, in the background: the health check answers meanwhile
+    warm_up = asyncio.create_task(asyncio.to_thread(_warm_up)) if get_settings().warmup else None
+    # 📮 Outbox worker: delivers queued emails outside the request path
+    stop = asyncio.Event()
+    worker = None
+    if get_settings().email_delivery == "outbox":
+        from app.tools.outbox import run_outbox_worker
+        worker = asyncio.create_task(run_outbox_worker(stop))
+    # 🗄️ MongoDB client + buffered analysis_history writes
+    from app.database import close_database, open_database
+    await open_database()
+    yield
+    # Runs whose client disconnected still write their ledger records and history
+    if _DETACHED:
+        await asyncio.gather(*_DETACHED, return_exceptions=True)
+    stop.set()
+    if worker:
+        await worker
+    await close_database()
+    if warm_up:
+        await warm_up
+
+app = FastAPI(title="FinLy Autonomous Agent API", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -52,7 +115,119 @@ class FinanceStateRequest(BaseModel):
 
 @app.get("/")
 def health_check():
-    return {"status": "active", "system": "FinLy Agentic Core"}
+    return {"status": "active", "system": "FinLy Agentic Core", "graph_ready": graph_loaded()}
+
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    from app.core.llm_cache import get_llm_cache
+    cache = get_llm_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+@app.get("/outbox/stats")
+def outbox_stats():
+    if get_settings().email_delivery != "outbox":
+        return {"enabled": False}
+    from app.tools.outbox import get_outbox
+    outbox = get_outbox()
+    return {"enabled": True, "counts": outbox.stats(), "dead_letters": outbox.dead_letters()}
+
+@app.get("/database/stats")
+def database_stats():
+    """MongoDB circuit state, buffered writes and how far the local backlog has been replayed."""
+    from app.database import database_stats
+    return database_stats()
+
+@app.get("/history")
+async def analysis_history(start: Optional[str] = None, end: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None):
+    """
+    Locally stored analyses (MongoDB fallback), newest first.
+    start/end: ISO timestamps bounding created_at (UTC). Pass `next_cursor` back as `cursor` for the next page.
+    """
+    from app.core.history import MAX_PAGE_SIZE, get_history_store, parse_timestamp
+
+    bounds = {}
+    for name, value in (("start", start), ("end", end)):
+        if value:
+            bounds[name] = parse_timestamp(value)
+            if bounds[name] is None:
+                raise HTTPException(status_code=400, detail=f"Invalid {name} timestamp: {value}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    try:
+        return await asyncio.to_thread(get_history_store().query, limit=limit, cursor=cursor, **bounds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus scrape endpoint (this worker's counters only)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ---------------------------
+# Shared Analysis Pipeline (single + batch endpoints)
+# ---------------------------
+def build_initial_state(request: FinanceStateRequest) -> Dict[str, Any]:
+    """Validated request -> LangGraph state with zero-error pre-computed metrics."""
+    # Convert Pydantic model to Dict for LangGraph
+    initial_state = request.model_dump()
+    
+    if not initial_state.get("preferences"):
+        initial_state["preferences"] = {
+            "dont_delay_salaries": True,
+            "avoid_vendor_damage": True
+        }
+
+    # 🧮 Zero-Error Arithmetic Pre-processing
+    total_inflow = sum(r.get("amount", 0) for r in initial_state.get("receivables", []))
+    total_outflow = sum(s.get("amount", 0) for s in initial_state.get("salaries", [])) + \
+                    sum(b.get("amount", 0) for b in initial_state.get("fixed_bills", []))
+    current_cash = initial_state.get("cash_balance", 0)
+    
+    # 🟢 LIQUIDITY (Can we pay bills NOW?)
+    projected_balance = current_cash - total_outflow
+    liquidity_status = "SURPLUS" if projected_balance >= 0 else "DEFICIT"
+    
+    # 🔵 SOLVENCY (Are we profitable long-term?)
+    net_position = current_cash + total_inflow - total_outflow
+    
+    initial_state["financial_metrics"] = {
+        "total_inflow": total_inflow,
+        "total_outflow": total_outflow,
+        "projected_balance": projected_balance,
+        "liquidity_status": liquidity_status,
+        "net_position": net_position,
+        "burn_rate_coverage": round(current_cash / total_outflow, 2) if total_outflow > 0 else 999
+    }
+
+    # 📅 WHEN does the cash run out? (receivables assumed on time)
+    initial_state["cash_timeline"] = build_cash_timeline(initial_state)
+    return initial_state
+
+def _analysis_response(initial_state: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Extracts only the relevant agent outputs to return."""
+    return {
+        "risk_analysis": result.get("risk_analysis"),
+        "sub_goal": result.get("sub_goal"),
+        "decision": result.get("decision"),
+        "action_log": result.get("action_log"),
+        "memory_updates": result.get("memory_updates"),
+        "financial_metrics": initial_state.get("financial_metrics"),
+        "cash_timeline": initial_state.get("cash_timeline")
+    }
+
+async def execute_analysis(initial_state: Dict[str, Any], endpoint: str = "run-analysis") -> Dict[str, Any]:
+    """Runs the graph and extracts only the relevant agent outputs to return."""
+    start = time.perf_counter()
+    try:
+        # Invoke the LangGraph (async path: LLM waits and SMTP sends don't block the event loop)
+        result = await (await _graph()).ainvoke(initial_state)
+    except Exception:
+        record_run(endpoint, time.perf_counter() - start)
+        raise
+    response = _analysis_response(initial_state, result)
+    record_run(endpoint, time.perf_counter() - start, response)
+    return response
 
 @app.post("/run-analysis")
 async def run_analysis(request: FinanceStateRequest, background_tasks: BackgroundTasks):
@@ -60,55 +235,15 @@ async def run_analysis(request: FinanceStateRequest, background_tasks: Backgroun
     Triggers the Multi-Agent Finance Loop.
     """
     try:
-        # Convert Pydantic model to Dict for LangGraph
-        initial_state = request.model_dump()
-        print(f"DEBUG: Python received state: {json.dumps(initial_state, indent=2)}")
-        
-        if not initial_state.get("preferences"):
-            initial_state["preferences"] = {
-                "dont_delay_salaries": True,
-                "avoid_vendor_damage": True
-            }
-
-        # 🧮 Zero-Error Arithmetic Pre-processing
-        total_inflow = sum(r.get("amount", 0) for r in initial_state.get("receivables", []))
-        total_outflow = sum(s.get("amount", 0) for s in initial_state.get("salaries", [])) + \
-                        sum(b.get("amount", 0) for b in initial_state.get("fixed_bills", []))
-        current_cash = initial_state.get("cash_balance", 0)
+        initial_state = build_initial_state(request)
         
-        # 🟢 LIQUIDITY (Can we pay bills NOW?)
-        projected_balance = current_cash - total_outflow
-        liquidity_status = "SURPLUS" if projected_balance >= 0 else "DEFICIT"
-        
-        # 🔵 SOLVENCY (Are we profitable long-term?)
-        net_position = current_cash + total_inflow - total_outflow
-        
-        initial_state["financial_metrics"] = {
-            "total_inflow": total_inflow,
-            "total_outflow": total_outflow,
-            "projected_balance": projected_balance,
-            "liquidity_status": liquidity_status,
-            "net_position": net_position,
-            "burn_rate_coverage": round(current_cash / total_outflow, 2) if total_outflow > 0 else 999
-        }
-            
-        print(f"🚀 Analysis Request. Funds: {current_cash} | Net: {net_position}")
+        metrics = initial_state["financial_metrics"]
+        print(f"🚀 Analysis Request. Funds: {initial_state['cash_balance']} | Net: {metrics['net_position']}")
         print("DEBUG: Invoking Graph...")
         
-        # Invoke the LangGraph
-        result = finly_graph.invoke(initial_state)
+        response = await execute_analysis(initial_state)
         print("DEBUG: Graph Invoked.")
 
-        # Extract only the relevant agent outputs to return
-        response = {
-            "risk_analysis": result.get("risk_analysis"),
-            "sub_goal": result.get("sub_goal"),
-            "decision": result.get("decision"),
-            "action_log": result.get("action_log"),
-            "memory_updates": result.get("memory_updates"),
-            "financial_metrics": initial_state.get("financial_metrics")
-        }
-
         # 💾 Setup Async DB Save via Background Tasks
         # This prevents the DB connection (which might have DNS timeouts) from blocking the response
         from app.database import save_analysis_result
@@ -120,5 +255,146 @@ async def run_analysis(request: FinanceStateRequest, background_tasks: Backgroun
         print(f"❌ Error running agent loop: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Graph node -> (SSE event, state keys it publishes), in graph order
+_STREAM_EVENTS = {
+    "risk_reasoning": ("risk_analysis", ["risk_analysis", "sub_goal"]),
+    "decision_agent": ("decision", ["decision"]),
+    "action_execution": ("action_log", ["action_log"]),
+    "memory_agent": ("memory_updates", ["memory_updates"]),
+}
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _stream_run(initial_state: Dict[str, Any], events: asyncio.Queue, sending: asyncio.Event):
+    """
+    One streamed graph run: puts (event, data) pairs on `events`, ending with `result` or `error`
+    and then None. Sets `sending` once action_execution may be emailing. Saves its own result,
+    so a run the client stopped listening to is still recorded.
+    """
+    final_state = dict(initial_state)
+    start = time.perf_counter()
+    try:
+        graph = await _graph()
+        async for mode, chunk in graph.astream(initial_state, stream_mode=["updates", "custom"]):
+            if mode == "custom":
+                if "action_target" in chunk:
+                    events.put_nowait(("action_target", chunk["action_target"]))
+                continue
+            for node, update in chunk.items():
+                final_state.update(update or {})
+                if node == "decision_agent":
+                    sending.set()  # action_execution runs next
+                if node in _STREAM_EVENTS:
+                    event, keys = _STREAM_EVENTS[node]
+                    events.put_nowait((event, {key: final_state.get(key) for key in keys}))
+    except Exception as e:
+        print(f"❌ Error running agent loop: {str(e)}")
+        record_run("run-analysis/stream", time.perf_counter() - start)
+        events.put_nowait(("error", {"detail": str(e)}))
+        events.put_nowait(None)
+        return
+
+    response = _analysis_response(initial_state, final_state)
+    record_run("run-analysis/stream", time.perf_counter() - start, response)
+    events.put_nowait(("result", response))
+    events.put_nowait(None)
+    from app.database import save_analysis_result
+    await save_analysis_result(response)
+
+@app.post("/run-analysis/stream")
+async def run_analysis_stream(request: FinanceStateRequest):
+    """
+    Same as /run-analysis, as Server-Sent Events:
+    risk_analysis -> decision -> action_target (one per email, as each is sent) -> action_log
+    -> memory_updates -> result (the exact /run-analysis response). Failures end with an `error` event.
+    If the client disconnects before the decision, the run stops; after it, the run finishes
+    (ledger records, history) and only the events stop.
+    """
+    initial_state = build_initial_state(request)
+    metrics = initial_state["financial_metrics"]
+    print(f"🚀 Streaming Analysis Request. Funds: {initial_state['cash_balance']} | Net: {metrics['net_position']}")
+
+    async def stream():
+        events: asyncio.Queue = asyncio.Queue()
+        sending = asyncio.Event()
+        run = _detach(_stream_run(initial_state, events, sending))
+        try:
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            # Client went away: nothing sent yet -> stop the run; otherwise let it reach memory_agent
+            if not sending.is_set():
+                run.cancel()
+
+    # no-cache / X-Accel-Buffering: keep proxies from holding events back
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Global cap on graph runs in flight from batch requests (shared across requests on this worker)
+_BATCH_SLOTS = asyncio.Semaphore(get_settings().batch_max_concurrency)
+
+async def _batch_run(request: FinanceStateRequest) -> Dict[str, Any]:
+    """A started batch run (holds a _BATCH_SLOTS slot): runs the graph, then saves the result."""
+    try:
+        response = await execute_analysis(build_initial_state(request), endpoint="run-analysis/batch")
+    finally:
+        _BATCH_SLOTS.release()
+    from app.database import save_analysis_result
+    await save_analysis_result(response)
+    return response
+
+async def _run_batch_item(index: int, payload: Any) -> Dict[str, Any]:
+    """One company of a batch. Never raises: failures are reported in the item itself."""
+    company_id = payload.get("company_id") if isinstance(payload, dict) else None
+    item = {"index": index, "company_id": company_id}
+    try:
+        request = FinanceStateRequest.model_validate(payload)
+    except ValidationError as e:
+        return {**item, "status": "invalid", "error": e.errors(include_url=False)}
+
+    # Cancelled while waiting for a slot: this company never started
+    await _BATCH_SLOTS.acquire()
+    # Shielded: a started run may already have sent reminders, so it finishes either way
+    run = _detach(_batch_run(request))
+    try:
+        response = await asyncio.shield(run)
+    except asyncio.CancelledError:
+        run.add_done_callback(_report_orphaned)
+        raise
+    except Exception as e:
+        print(f"❌ Batch item {index} failed: {str(e)}")
+        return {**item, "status": "error", "error": str(e)}
+    return {**item, "status": "ok", "result": response}
+
+@app.post("/run-analysis/batch")
+async def run_analysis_batch(payloads: List[Any] = Body(...)):
+    """
+    Runs the Finance Loop for many companies at once.
+    Body: a JSON list of /run-analysis payloads (an optional "company_id" per item is echoed back).
+    Response: NDJSON, one line per company in completion order, each with its input `index`.
+    A bad payload or failed run only affects its own line. If the client disconnects, companies
+    that haven't started are dropped; started ones finish and are saved.
+    """
+    print(f"🚀 Batch Analysis Request: {len(payloads)} companies")
+    tasks = [asyncio.create_task(_run_batch_item(i, p)) for i, p in enumerate(payloads)]
+
+    async def stream():
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done, default=str) + "\n"
+        finally:
+            # Client went away: drop the companies still waiting for a slot (started runs are shielded)
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     uvicorn.run("app.server:app", host="0.0.0.0", port=8001, reload=True)
@@ -2,50 +2,223 @@
 
 import smtplib
 import os
+import threading
+import time
+from dataclasses import dataclass
 from email.message import EmailMessage
 from datetime import datetime
-from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import load_env
+from app.core.metrics import EMAIL_SECONDS, EMAILS, timed
 
-load_dotenv()
 
+# ---------------------------
+# SMTP Configuration (resolved once per process)
+# ---------------------------
+def _env_flag(name: str, default: bool = True) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off")
 
-def send_payment_reminder(
-    to_email: str,
-    client_name: str,
-    amount: int,
-    deadline_days: int,
-    body: str = None,
-    subject: str = None,  # NEW: Allow custom subject
-    tone: str = "POLITE"  # NEW: Track tone for logging
-) -> dict:
+@dataclass(frozen=True)
+class SMTPConfig:
+    email: Optional[str]
+    password: Optional[str]
+    host: Optional[str]
+    port: int = 587
+    starttls: bool = True
+    auth: bool = True  # False for unauthenticated relays / local test servers (e.g. aiosmtpd)
+    timeout: float = 10
+    pool_size: int = 5
+    idle_check_seconds: float = 30  # NOOP a pooled connection before reuse if idle this long
+
+    @property
+    def configured(self) -> bool:
+        return all([self.email, self.host]) and (bool(self.password) or not self.auth)
+
+    @classmethod
+    def from_env(cls) -> "SMTPConfig":
+        port = os.getenv("SMTP_PORT") or "587"
+        try:
+            port = int(port)
+        except ValueError:
+            print(f"⚠️ Invalid SMTP_PORT {port!r}, using 587")
+            port = 587
+        return cls(
+            email=os.getenv("SMTP_EMAIL"),
+            password=os.getenv("SMTP_PASSWORD"),
+            host=os.getenv("SMTP_HOST"),
+            port=port,
+            starttls=_env_flag("SMTP_STARTTLS"),
+            auth=_env_flag("SMTP_AUTH"),
+            pool_size=int(os.getenv("SMTP_POOL_SIZE", "5")),
+        )
+
+# ---------------------------
+# SMTP Session Pool
+# ---------------------------
+class _PooledSMTP(smtplib.SMTP):
+    """smtplib.SMTP that records whether the current message got as far as DATA."""
+
+    submitted = False
+
+    def data(self, msg):
+        self.submitted = True
+        return super().data(msg)
+
+class SMTPConnectionPool:
     """
-    Sends a real payment reminder email using SMTP (Gmail).
-    Supports custom subject, body, and tone-based formatting.
+    Keeps authenticated SMTP sessions open between sends.
+    At most `pool_size` sessions exist at once; a session that has been idle for a while is
+    probed with NOOP before reuse, and a send that hits a dropped connection before DATA is
+    retried once on a fresh session.
     """
 
-    sender_email = os.getenv("SMTP_EMAIL")
-    sender_password = os.getenv("SMTP_PASSWORD")
-    smtp_host = os.getenv("SMTP_HOST")
-    smtp_port = int(os.getenv("SMTP_PORT"))
+    def __init__(self, config: SMTPConfig):
+        self.config = config
+        self._idle: List[Tuple[_PooledSMTP, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, config.pool_size))
 
-    # ---------------------------
-    # SIMULATION MODE (Default if no credentials)
-    # ---------------------------
-    if not all([sender_email, sender_password, smtp_host]):
-        print(f"\n📧 [SIMULATION] EMAIL TOOL INVOKED")
-        print(f"➡️ To: {to_email}")
-        print(f"📧 Subject: {subject if subject else 'Payment Reminder'}")
-        print(f"💰 Amount: ₹{amount}")
-        print(f"📄 Body Preview: {body[:80] if body else 'Default template'}...")
-        return {
-            "status": "SENT (SIMULATED)",
-            "to": to_email,
-            "amount": amount,
-            "timestamp": datetime.utcnow().isoformat(),
-            "note": "Credentials missing - switched to simulation"
-        }
+    def _connect(self) -> _PooledSMTP:
+        cfg = self.config
+        server = _PooledSMTP(cfg.host, cfg.port, timeout=cfg.timeout)
+        try:
+            server.ehlo()
+            if cfg.starttls:
+                server.starttls()
+                server.ehlo()
+            if cfg.auth:
+                server.login(cfg.email, cfg.password)
+        except Exception:
+            _quietly_close(server)
+            raise
+        return server
+
+    def _checkout(self) -> _PooledSMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, idle_since = self._idle.pop()
+            if time.monotonic() - idle_since < self.config.idle_check_seconds:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            _quietly_close(server)
+        return self._connect()
+
+    def _checkin(self, server: _PooledSMTP):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    def send_many(self, messages: List[EmailMessage]) -> List[Optional[Exception]]:
+        """
+        Sends messages over one session, in order. Returns one entry per message:
+        None on success, or the exception that made that message fail.
+        """
+        errors: List[Optional[Exception]] = []
+        with self._slots:
+            server = None
+            for msg in messages:
+                for attempt in (1, 2):
+                    try:
+                        if server is None:
+                            server = self._checkout()
+                        server.submitted = False
+                        server.send_message(msg)
+                        errors.append(None)
+                        break
+                    except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as e:
+                        error = e
+                    except smtplib.SMTPException as e:
+                        # Message-level rejection: the session is still usable
+                        errors.append(e)
+                        break
+                    except OSError as e:
+                        # Socket errors and timeouts (SMTPException is an OSError too, hence the order)
+                        error = e
+                    # Connection-level failure: drop the session
+                    submitted = server is not None and server.submitted
+                    if server is not None:
+                        _quietly_close(server)
+                        server = None
+                    # Retry once on a new session, unless the message reached DATA: the server
+                    # may already have accepted it, and a retry would send it twice
+                    if attempt == 2 or submitted:
+                        errors.append(error)
+                        break
+            if server is not None:
+                self._checkin(server)
+        return errors
+
+    def send(self, msg: EmailMessage):
+        error = self.send_many([msg])[0]
+        if error is not None:
+            raise error
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            _quietly_close(server)
+
+def _quietly_close(server: smtplib.SMTP):
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+_CONFIG: Optional[SMTPConfig] = None
+_POOL: Optional[SMTPConnectionPool] = None
+_POOL_LOCK = threading.Lock()
 
-    # Prepare email message
+def get_smtp_config() -> SMTPConfig:
+    global _CONFIG
+    with _POOL_LOCK:
+        if _CONFIG is None:
+            load_env()  # No-op after the first call
+            _CONFIG = SMTPConfig.from_env()
+        return _CONFIG
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    global _POOL
+    config = get_smtp_config()
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = SMTPConnectionPool(config)
+        return _POOL
+
+def configure_smtp(config: Optional[SMTPConfig]):
+    """Replaces the process SMTP config (e.g. to point at a local test server). None re-reads the env."""
+    global _CONFIG, _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+        _CONFIG, _POOL = config, None
+
+# ---------------------------
+# Message Building
+# ---------------------------
+def _build_message(
+    sender_email: str,
+    to_email: str,
+    client_name: str,
+    amount: int,
+    deadline_days: int,
+    body: str = None,
+    subject: str = None,
+    tone: str = "POLITE"
+) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = sender_email
     msg["To"] = to_email
@@ -69,39 +242,114 @@ def send_payment_reminder(
         msg.set_content(
             f"Dear {client_name},\n\nThis is a gentle reminder regarding an outstanding payment of ₹{amount}.\n\nTo avoid any disruptions, we kindly request the payment within {deadline_days} days.\n\nThank you for your cooperation.\n\nBest regards,\nFinLy – Autonomous Finance Assistant"
         )
+    return msg
 
-    try:
-        # Send email via SMTP
-        with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
+def _simulated_result(to_email: str, amount: int, subject: str, body: str) -> dict:
+    print(f"\n📧 [SIMULATION] EMAIL TOOL INVOKED")
+    print(f"➡️ To: {to_email}")
+    print(f"📧 Subject: {subject if subject else 'Payment Reminder'}")
+    print(f"💰 Amount: ₹{amount}")
+    print(f"📄 Body Preview: {body[:80] if body else 'Default template'}...")
+    return {
+        "status": "SENT (SIMULATED)",
+        "to": to_email,
+        "amount": amount,
+        "timestamp": datetime.utcnow().isoformat(),
+        "note": "Credentials missing - switched to simulation"
+    }
 
+def _delivery_result(msg: EmailMessage, amount: int, tone: str, error: Optional[Exception], mask_failures: bool = True) -> dict:
+    if error is None:
         print("\n📧 REAL EMAIL SENT SUCCESSFULLY")
-        print(f"➡️ To: {to_email}")
+        print(f"➡️ To: {msg['To']}")
         print(f"📧 Subject: {msg['Subject']}")
         print(f"🎯 Tone: {tone}")
         print(f"💰 Amount: ₹{amount}")
 
         return {
             "status": "SENT",
-            "to": to_email,
+            "to": msg["To"],
             "subject": msg["Subject"],
             "amount": amount,
             "tone": tone,
             "timestamp": datetime.utcnow().isoformat()
         }
 
-    except Exception as e:
-        print("\n❌ EMAIL SEND FAILED")
-        print(f"Error: {str(e)}")
-        print(f"Attempted to: {to_email}")
+    print("\n❌ EMAIL SEND FAILED")
+    print(f"Error: {str(error)}")
+    print(f"Attempted to: {msg['To']}")
 
-        # Fallback to simulation success so agent graph continues
+    if not mask_failures:
         return {
-            "status": "SENT (FALLBACK)",
-            "to": to_email,
+            "status": "FAILED",
+            "to": msg["To"],
             "amount": amount,
             "timestamp": datetime.utcnow().isoformat(),
-            "error_masked": str(e)
+            "error": str(error)
         }
+
+    # Fallback to simulation success so agent graph continues
+    return {
+        "status": "SENT (FALLBACK)",
+        "to": msg["To"],
+        "amount": amount,
+        "timestamp": datetime.utcnow().isoformat(),
+        "error_masked": str(error)
+    }
+
+# ---------------------------
+# Public API
+# ---------------------------
+@timed(EMAIL_SECONDS)
+def send_payment_reminder(
+    to_email: str,
+    client_name: str,
+    amount: int,
+    deadline_days: int,
+    body: str = None,
+    subject: str = None,  # NEW: Allow custom subject
+    tone: str = "POLITE"  # NEW: Track tone for logging
+) -> dict:
+    """
+    Sends a real payment reminder email using SMTP (Gmail).
+    Supports custom subject, body, and tone-based formatting.
+    Reuses a pooled, authenticated SMTP session instead of connecting per email.
+    """
+    return send_payment_reminders([{
+        "to_email": to_email,
+        "client_name": client_name,
+        "amount": amount,
+        "deadline_days": deadline_days,
+        "body": body,
+        "subject": subject,
+        "tone": tone
+    }])[0]
+
+def send_payment_reminders(reminders: List[Dict[str, Any]], mask_failures: bool = True) -> List[dict]:
+    """
+    Batch variant of send_payment_reminder: each item takes the same keyword arguments.
+    All messages go out over one authenticated session. Results are returned in input order.
+    With mask_failures=False a failed send is reported as status "FAILED" instead of
+    "SENT (FALLBACK)" (used by the outbox worker, which retries).
+    """
+    config = get_smtp_config()
+
+    # ---------------------------
+    # SIMULATION MODE (Default if no credentials)
+    # ---------------------------
+    if not config.configured:
+        results = [
+            _simulated_result(r["to_email"], r["amount"], r.get("subject"), r.get("body"))
+            for r in reminders
+        ]
+    else:
+        messages = [_build_message(config.email, **r) for r in reminders]
+        errors = get_smtp_pool().send_many(messages)
+        results = [
+            _delivery_result(msg, r["amount"], r.get("tone", "POLITE"), error, mask_failures)
+            for msg, r, error in zip(messages, reminders, errors)
+        ]
+
+    for result in results:
+        EMAILS.inc(status=result.get("status"))
+    return results
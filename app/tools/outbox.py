@@ -0,0 +1,250 @@
+# app/tools/outbox.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.tools.email_tool import get_smtp_config, send_payment_reminders
+
+# Outbox row lifecycle: PENDING -> SENDING -> SENT
+#                                        \-> PENDING (retry with backoff) -> ... -> DEAD (dead-letter)
+PENDING, SENDING, SENT, DEAD = "PENDING", "SENDING", "SENT", "DEAD"
+
+# A claimed row whose worker died is picked up again after this long
+LEASE_SECONDS = 120
+
+def lease_batch_limit(timeout: float) -> int:
+    """
+    Most rows one worker may claim at a time. A batch must finish inside the lease, or another
+    worker re-claims its rows and sends them again; the worst case per message is a timed-out
+    send plus one retry (2 x the SMTP timeout).
+    """
+    return max(1, int(LEASE_SECONDS // (2 * timeout)))
+
+# ---------------------------
+# Persistent Queue (SQLite)
+# ---------------------------
+class Outbox:
+    """Durable email queue. Rows hold fully rendered send_payment_reminder kwargs."""
+
+    def __init__(self, path: str, max_attempts: int, backoff_seconds: float, backoff_max_seconds: float):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " clients TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " last_error TEXT,"
+            " result TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
+    def enqueue(self, reminder: Dict[str, Any], clients: List[str]) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO outbox (created_at, clients, payload, status, next_attempt_at) VALUES (?, ?, ?, ?, ?)",
+                (now, json.dumps(clients), json.dumps(reminder, default=str), PENDING, now),
+            )
+            return cur.lastrowid
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Leases up to `limit` due rows to this worker (safe with several workers/processes)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, clients, payload, attempts FROM outbox"
+                    " WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND next_attempt_at <= ?)"
+                    " ORDER BY id LIMIT ?",
+                    (PENDING, now, SENDING, now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET status = ?, next_attempt_at = ? WHERE id = ?",
+                    [(SENDING, now + LEASE_SECONDS, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [
+            {"id": r[0], "clients": json.loads(r[1]), "reminder": json.loads(r[2]), "attempts": r[3]}
+            for r in rows
+        ]
+
+    def mark_sent(self, row_id: int, result: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, result = ?, last_error = NULL WHERE id = ?",
+                (SENT, json.dumps(result, default=str), row_id),
+            )
+
+    def mark_failed(self, row_id: int, attempts_so_far: int, error: str) -> bool:
+        """Schedules a retry with exponential backoff. Returns True if the row was dead-lettered."""
+        attempts = attempts_so_far + 1
+        with self._lock:
+            if attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, last_error = ? WHERE id = ?",
+                    (DEAD, attempts, error, row_id),
+                )
+                return True
+            delay = min(self.backoff_max_seconds, self.backoff_seconds * (2 ** (attempts - 1)))
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (PENDING, attempts, error, time.time() + delay, row_id),
+            )
+            return False
+
+    def dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, clients, payload, attempts, last_error FROM outbox"
+                " WHERE status = ? ORDER BY id DESC LIMIT ?",
+                (DEAD, limit),
+            ).fetchall()
+        return [
+            {
+                "id": r[0],
+                "created_at": datetime.fromtimestamp(r[1]).isoformat(),
+                "clients": json.loads(r[2]),
+                "to": json.loads(r[3]).get("to_email"),
+                "attempts": r[4],
+                "last_error": r[5],
+            }
+            for r in rows
+        ]
+
+    def requeue(self, row_id: int) -> bool:
+        """Moves a dead-lettered row back to the queue with a fresh attempt budget."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE id = ? AND status = ?",
+                (PENDING, time.time(), row_id, DEAD),
+            )
+            return cur.rowcount == 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        counts = {PENDING: 0, SENDING: 0, SENT: 0, DEAD: 0}
+        counts.update(dict(rows))
+        return counts
+
+_OUTBOX: Optional[Outbox] = None
+_OUTBOX_LOCK = threading.Lock()
+
+def get_outbox() -> Outbox:
+    global _OUTBOX
+    with _OUTBOX_LOCK:
+        if _OUTBOX is None:
+            settings = get_settings()
+            _OUTBOX = Outbox(
+                settings.outbox_path,
+                max_attempts=settings.outbox_max_attempts,
+                backoff_seconds=settings.outbox_backoff_seconds,
+                backoff_max_seconds=settings.outbox_backoff_max_seconds,
+            )
+        return _OUTBOX
+
+# ---------------------------
+# Producer API (called from action_execution_node)
+# ---------------------------
+def enqueue_reminder(reminder: Dict[str, Any], clients: List[str]) -> Dict[str, Any]:
+    """
+    Queues a fully rendered reminder and returns immediately.
+    The returned dict replaces send_payment_reminder's result in the action log.
+    """
+    outbox_id = get_outbox().enqueue(reminder, clients)
+    return {
+        "status": "QUEUED",
+        "outbox_id": outbox_id,
+        "to": reminder.get("to_email"),
+        "amount": reminder.get("amount"),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# ---------------------------
+# Worker
+# ---------------------------
+def _report_deliveries(outcomes: List[Dict[str, Any]]):
+    """
+    Writes the real delivery outcomes of one batch into the client ledger as a single
+    BATCH_PROCESSED record (see memory.DELIVERY_REPORT), one entry per client and message.
+    """
+    targets = [
+        {"target": client, "result": {"status": outcome["status"]}, **outcome["detail"]}
+        for outcome in outcomes
+        for client in outcome["clients"]
+    ]
+    if not targets:
+        return
+    from app.agents.memory import DELIVERY_REPORT, append_memory
+
+    append_memory({
+        "timestamp": datetime.now().isoformat(),
+        "clients": list(dict.fromkeys(t["target"] for t in targets)),
+        "strategy": "OUTBOX_DELIVERY",
+        "action_taken": DELIVERY_REPORT,
+        "result": "BATCH_PROCESSED",
+        "details": {"targets_processed": targets}
+    })
+
+def drain_once(batch_size: int = 20) -> int:
+    """Sends one batch of due messages over one SMTP session. Returns how many rows were processed."""
+    outbox = get_outbox()
+    rows = outbox.claim(min(batch_size, lease_batch_limit(get_smtp_config().timeout)))
+    if not rows:
+        return 0
+
+    results = send_payment_reminders([row["reminder"] for row in rows], mask_failures=False)
+    outcomes = []  # Final outcomes only; rows scheduled for a retry are reported when they settle
+    for row, result in zip(rows, results):
+        detail = {"outbox_id": row["id"], "to": row["reminder"].get("to_email"), "attempts": row["attempts"] + 1}
+        if result.get("status") == "FAILED":
+            dead = outbox.mark_failed(row["id"], row["attempts"], result.get("error", "unknown error"))
+            if dead:
+                print(f"☠️ Outbox message {row['id']} dead-lettered after {row['attempts'] + 1} attempts")
+                outcomes.append({"clients": row["clients"], "status": "FAILED", "detail": {**detail, "error": result.get("error")}})
+        else:
+            outbox.mark_sent(row["id"], result)
+            outcomes.append({"clients": row["clients"], "status": result.get("status"), "detail": detail})
+    _report_deliveries(outcomes)
+    return len(rows)
+
+async def run_outbox_worker(stop: asyncio.Event):
+    """Background loop: drain the outbox until `stop` is set. SMTP work runs in a thread."""
+    poll = get_settings().outbox_poll_seconds
+    print("📮 Outbox worker started")
+    while not stop.is_set():
+        try:
+            processed = await asyncio.to_thread(drain_once)
+        except Exception as e:
+            print(f"⚠️ Outbox worker error: {e}")
+            processed = 0
+        if processed:
+            continue  # More may be waiting
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=poll)
+        except asyncio.TimeoutError:
+            pass
+    print("📮 Outbox worker stopped")
@@ -0,0 +1,147 @@
+# benchmarks/fakes.py
+
+"""
+Offline stand-ins for the benchmark suite: a deterministic chat model for ChatOpenAI and a
+local SMTP sink for Gmail. Nothing here touches the network beyond 127.0.0.1.
+"""
+
+import asyncio
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Iterable, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# ---------------------------
+# Fake Chat Model
+# ---------------------------
+class FakeChatModel(BaseChatModel):
+    """Always answers `reply`, after `latency` seconds (sleep, so concurrency behaves like the real API)."""
+
+    reply: str
+    latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "finly-benchmark-fake"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        self.calls += 1
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        message = AIMessage(
+            content=self.reply,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": len(self.reply) // 4,
+                "total_tokens": prompt_tokens + len(self.reply) // 4,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+# ---------------------------
+# SMTP Sink
+# ---------------------------
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib without STARTTLS/AUTH: accepts and discards every message."""
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        sink = self.server
+        with sink.lock:
+            sink.sessions += 1
+            sink.open_connections.add(self.connection)
+        try:
+            self._converse(sink)
+        finally:
+            with sink.lock:
+                sink.open_connections.discard(self.connection)
+
+    def _converse(self, sink: "SMTPSink"):
+        self.reply("220 finly-benchmark-sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].upper()
+            with sink.lock:
+                sink.commands.append(verb.decode("ascii", "replace").strip())
+            if verb == b"EHLO":
+                self.reply("250-finly-benchmark-sink")
+                self.reply("250 8BITMIME")
+            elif verb == b"RCPT" and line.split(b":", 1)[-1].strip(b" <>\r\n").decode() in sink.reject:
+                self.reply("550 No such user")
+            elif verb == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with sink.lock:
+                    sink.messages += 1
+                    hang_up = sink.drop_after_data > 0
+                    sink.drop_after_data -= hang_up
+                if hang_up:
+                    return  # Accepted, but the reply never reaches the client
+                self.reply("250 OK")
+            elif verb == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply("250 OK")
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Local SMTP server on a free port. Counts sessions and accepted messages and records the
+    verbs it received. `reject` recipients get 550 on RCPT; `drop_after_data` hangs up after
+    accepting that many messages without replying; drop_connections() cuts every open session.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, reject: Iterable[str] = ()):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.messages = 0
+        self.sessions = 0
+        self.commands: List[str] = []
+        self.reject = set(reject)
+        self.drop_after_data = 0
+        self.open_connections: set = set()
+        self.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def drop_connections(self):
+        with self.lock:
+            connections = list(self.open_connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self) -> "SMTPSink":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,75 @@
+# benchmarks/import_budget.py
+
+"""
+Cold-start check for the server: how long `import app.server` takes in a fresh interpreter,
+and that it does not pull in the LLM stack (that is deferred to the background warm-up).
+
+    python -m benchmarks.import_budget                   # exit 1 if over budget or the LLM stack loaded
+    python -m benchmarks.import_budget --budget-ms 600 --runs 7
+
+Also reports what the deferred part (compiling the agent graph) costs, for comparison.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# Must not be imported by `import app.server` (loaded lazily by get_finly_graph / warm-up)
+LLM_STACK = ["langgraph", "langchain_core", "langchain_openai", "openai"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.server
+server_ms = (time.perf_counter() - start) * 1000
+loaded = [m for m in {modules!r} if m in sys.modules]
+start = time.perf_counter()
+from app.graph.finly_graph import get_finly_graph
+get_finly_graph()
+graph_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"server_ms": server_ms, "graph_ms": graph_ms, "loaded": loaded}}))
+"""
+
+def probe() -> Dict[str, Any]:
+    """One fresh interpreter (nothing cached in sys.modules; .pyc files are)."""
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "import-budget-offline")
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(modules=LLM_STACK)],
+        capture_output=True, text=True, check=True, env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="max median time for `import app.server`")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    probe()  # Warm the .pyc cache so every measured run sees the same disk state
+    runs = [probe() for _ in range(args.runs)]
+    server_ms = statistics.median(r["server_ms"] for r in runs)
+    graph_ms = statistics.median(r["graph_ms"] for r in runs)
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+
+    print(f"⏱️  import app.server        median {server_ms:8.1f} ms  (budget {args.budget_ms:g} ms, {args.runs} runs)")
+    print(f"⏱️  get_finly_graph() after  median {graph_ms:8.1f} ms  (deferred to warm-up / first request)")
+
+    failed = False
+    if server_ms > args.budget_ms:
+        print(f"❌ Over budget by {server_ms - args.budget_ms:.1f} ms")
+        failed = True
+    if loaded:
+        print(f"❌ import app.server loaded the LLM stack: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("✅ Within budget")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# benchmarks/ledger_stress.py
+
+"""
+Multi-process stress test for the client ledger (app/agents/memory.py), as with
+`uvicorn --workers N`: writer processes run memory_agent_node concurrently on one ledger
+while reader processes take client snapshots.
+
+    python -m benchmarks.ledger_stress                          # exit 1 on any lost/corrupt record
+    python -m benchmarks.ledger_stress --writers 16 --writes 500 --readers 4
+
+Checks afterwards: every line parses, every (writer, seq) record is there exactly once, and each
+client's attempt count in a fresh index matches what the writers wrote. Readers check that
+snapshots never go backwards (record count and per-client attempts only grow).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+STATUSES = ("SENT", "PAID", "IGNORED")
+
+def _client(i: int) -> str:
+    return f"Client {i:03d}"
+
+def _use_ledger(path: str):
+    from app.agents import memory
+    memory.LEDGER_FILE = path
+    memory.MEMORY_FILE = path + ".legacy.json"
+    memory._INDEX.reset()
+    memory._MIGRATION_CHECKED = False
+
+def writer(path: str, writer_id: int, writes: int, clients: int, start: Any) -> Dict[str, int]:
+    """Runs memory_agent_node `writes` times; returns how many records each client got."""
+    import contextlib, io
+    from app.agents.memory import memory_agent_node
+
+    _use_ledger(path)
+    rng = random.Random(writer_id)
+    written: Counter = Counter()
+    start.wait()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seq in range(writes):
+            targets = sorted({_client(rng.randrange(clients)) for _ in range(rng.choice((1, 1, 2, 3)))})
+            memory_agent_node({
+                "decision": {"strategy": "COLLECT_RECEIVABLE", "target": targets},
+                "action_log": {
+                    "action_taken": "EMAIL_PAYMENT_REMINDER",
+                    "result": {"status": rng.choice(STATUSES)},
+                    "writer": writer_id,
+                    "seq": seq,
+                },
+            })
+            written.update(targets)
+    return dict(written)
+
+def reader(path: str, clients: int, start: Any, stop: Any) -> Dict[str, Any]:
+    """Snapshots until told to stop; counts snapshots that went backwards."""
+    from app.agents.memory import get_client_contexts, load_memory
+
+    _use_ledger(path)
+    names = [_client(i) for i in range(clients)]
+    last_attempts = {c: 0 for c in names}
+    last_records = 0
+    snapshots = regressions = 0
+    start.wait()
+    while not stop.is_set():
+        contexts = get_client_contexts(names)
+        for c in names:
+            if contexts[c]["attempts"] < last_attempts[c]:
+                regressions += 1
+            last_attempts[c] = contexts[c]["attempts"]
+        records = len(load_memory())
+        if records < last_records:
+            regressions += 1
+        last_records = records
+        snapshots += 1
+    return {"snapshots": snapshots, "regressions": regressions}
+
+def verify(path: str, writers: int, writes: int, expected: Counter) -> List[str]:
+    from app.agents.memory import get_client_contexts
+
+    problems = []
+    seen: Counter = Counter()
+    with open(path, "rb") as f:
+        data = f.read()
+    if data and not data.endswith(b"\n"):
+        problems.append("ledger ends with a torn line")
+    for n, line in enumerate(data.splitlines(), 1):
+        try:
+            record = json.loads(line)
+            seen[(record["details"]["writer"], record["details"]["seq"])] += 1
+        except (ValueError, KeyError, TypeError):
+            problems.append(f"line {n} is corrupt: {line[:80]!r}")
+
+    missing = [(w, s) for w in range(writers) for s in range(writes) if seen[(w, s)] == 0]
+    duplicated = [key for key, count in seen.items() if count > 1]
+    if missing:
+        problems.append(f"{len(missing)} records lost, e.g. writer {missing[0][0]} seq {missing[0][1]}")
+    if duplicated:
+        problems.append(f"{len(duplicated)} records written twice")
+
+    _use_ledger(path)
+    contexts = get_client_contexts(list(expected))
+    wrong = [c for c, count in expected.items() if contexts[c]["attempts"] != count]
+    if wrong:
+        c = wrong[0]
+        problems.append(f"{len(wrong)} clients with wrong attempt counts, e.g. {c}: {contexts[c]['attempts']} != {expected[c]}")
+    return problems
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8, help="writer processes")
+    parser.add_argument("--writes", type=int, default=200, help="memory_agent_node runs per writer")
+    parser.add_argument("--readers", type=int, default=2, help="reader processes")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--dir", default=None, help="where to put the ledger (default: a temp dir)")
+    args = parser.parse_args(argv)
+
+    workdir = args.dir or tempfile.mkdtemp(prefix="finly-ledger-stress-")
+    path = os.path.join(workdir, "client_memory.jsonl")
+    if os.path.exists(path):
+        os.remove(path)
+
+    # spawn: every worker is a fresh interpreter, like separate uvicorn workers
+    ctx = multiprocessing.get_context("spawn")
+    manager = ctx.Manager()
+    start, stop = manager.Event(), manager.Event()
+    with ctx.Pool(args.writers + args.readers) as pool:
+        readers = [pool.apply_async(reader, (path, args.clients, start, stop)) for _ in range(args.readers)]
+        writers = [pool.apply_async(writer, (path, w, args.writes, args.clients, start)) for w in range(args.writers)]
+        time.sleep(0.5)  # Let the workers import and reach the start line
+        began = time.perf_counter()
+        start.set()
+        written = [w.get() for w in writers]
+        elapsed = time.perf_counter() - began
+        stop.set()
+        read = [r.get() for r in readers]
+
+    expected: Counter = Counter()
+    for counts in written:
+        expected.update(counts)
+    total = args.writers * args.writes
+    print(f"✍️  {total} memory_agent_node runs from {args.writers} processes in {elapsed:.2f} s "
+          f"({total / elapsed:.0f}/s)")
+    print(f"👀 {sum(r['snapshots'] for r in read)} snapshots from {args.readers} reader processes meanwhile")
+
+    problems = verify(path, args.writers, args.writes, expected)
+    regressions = sum(r["regressions"] for r in read)
+    if regressions:
+        problems.append(f"{regressions} reader snapshots went backwards")
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print(f"✅ All {total} records present exactly once; client tiers consistent ({path})")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+# benchmarks/run.py
+
+"""
+Component benchmarks, fully offline (fake chat model + local SMTP sink, see fakes.py).
+
+    python -m benchmarks.run                          # full suite, ledger sizes 100 .. 1M
+    python -m benchmarks.run --quick                  # ledger sizes up to 10k
+    python -m benchmarks.run --baseline old.json      # also compare; exit 1 on a regression
+    python -m benchmarks.run --only ledger graph      # some groups only
+
+Cases listed in BUDGETS also have an absolute ceiling on their median; any run exits 1 past it.
+
+Each run writes a JSON report (default benchmarks/results/<timestamp>.json). Reports are keyed by
+case id, e.g. "ledger.get_client_stats.cold[records=100000]", so any two reports can be compared.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+# Settings are read once per process: pin them before any app module is imported
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-offline")
+os.environ["FINLY_LLM_CACHE"] = "0"
+os.environ["FINLY_EMAIL_DELIVERY"] = "direct"
+os.environ["FINLY_ENGINE_MODE"] = "llm"
+os.environ["MONGO_URI"] = ""  # Empty (not unset) so load_dotenv() can't bring it back
+
+import numpy
+
+from benchmarks.fakes import FakeChatModel, SMTPSink
+
+LEDGER_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000]
+QUICK_LEDGER_SIZES = [100, 1_000, 10_000]
+SIMULATION_SIZES = [10, 100, 1_000, 2_000, 5_000]
+SIMULATION_DISTINCT_CLIENTS = 2_000  # Worst case: every receivable from a different client
+HISTORY_SIZES = [100, 1_000, 10_000]
+GRAPH_TARGETS = [1, 5, 20]
+REFRESH_SIZES = [10, 1_000, 20_000]
+CLIENTS = 1_000  # Distinct clients in generated ledgers
+
+# Absolute ceilings (median seconds), independent of any baseline
+BUDGETS = {
+    # Monte Carlo target: 10k paths over 2000 receivables from 100 clients well under 100 ms
+    "simulation.simulate_scenarios[receivables=2000]": 0.1,
+}
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# ---------------------------
+# Timing
+# ---------------------------
+def measure(fn: Callable[[], Any], setup: Optional[Callable[[], Any]] = None, budget_s: float = 1.0,
+            min_repeats: int = 3, max_repeats: int = 200) -> Dict[str, Any]:
+    """Runs fn repeatedly (setup untimed before each run) until the time budget is spent."""
+    samples: List[float] = []
+    spent = 0.0
+    while len(samples) < max_repeats and (len(samples) < min_repeats or spent < budget_s):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        spent += elapsed
+        # A single run blew the whole budget: one sample is all we can afford
+        if elapsed > budget_s * 5:
+            break
+    samples.sort()
+    return {
+        "repeats": len(samples),
+        "median_s": statistics.median(samples),
+        "p95_s": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_s": samples[0],
+    }
+
+class Suite:
+    def __init__(self, verbose: bool = True):
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.verbose = verbose
+
+    def record(self, group: str, name: str, params: Dict[str, Any], fn: Callable[[], Any], **kwargs: Any):
+        case_id = f"{group}.{name}[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+        # App code prints a lot (emoji logs); keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = measure(fn, **kwargs)
+        self.results[case_id] = {"group": group, "name": name, "params": params, **result}
+        if self.verbose:
+            print(f"  {case_id:<70} median {result['median_s'] * 1000:10.3f} ms  (n={result['repeats']})")
+
+# ---------------------------
+# Data Generators
+# ---------------------------
+def _client(i: int) -> str:
+    return f"Client {i:04d}"
+
+def _ledger_record(rng: random.Random, ts: datetime, clients: int = CLIENTS) -> Dict[str, Any]:
+    """Shaped like memory_agent_node's records (multi-target batches with per-target results)."""
+    clients = [_client(rng.randrange(clients)) for _ in range(rng.choice((1, 1, 2, 3)))]
+    return {
+        "timestamp": ts.isoformat(),
+        "clients": clients,
+        "strategy": "COLLECT_RECEIVABLE",
+        "action_taken": "EMAIL_PAYMENT_REMINDER_MULTI",
+        "result": "BATCH_PROCESSED",
+        "details": {
+            "action_taken": "EMAIL_PAYMENT_REMINDER_MULTI",
+            "targets_processed": [
+                {"target": c, "email": "client@example.com",
+                 "result": {"status": rng.choice(("SENT", "SENT", "PAID", "IGNORED")), "amount": rng.randrange(1000, 90000)}}
+                for c in clients
+            ],
+            "tone_used": "POLITE"
+        }
+    }
+
+def write_ledger(path: str, records: int, seed: int = 7, clients: int = CLIENTS):
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / max(records, 1)
+    with open(path, "w") as f:
+        for i in range(records):
+            f.write(json.dumps(_ledger_record(rng, start + step * i, clients)) + "\n")
+
+def finance_state(receivables: int, obligations: int, seed: int = 11, clients: Optional[int] = None) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    clients = clients or max(1, receivables // 20)
+    state = {
+        "cash_balance": 250_000,
+        "salaries": [{"employee": f"Employee {i}", "amount": rng.randrange(20_000, 90_000), "due_in_days": rng.randrange(0, 30)}
+                     for i in range(obligations // 2)],
+        "fixed_bills": [{"type": f"Vendor {i}", "amount": rng.randrange(5_000, 60_000), "due_in_days": rng.randrange(0, 60)}
+                        for i in range(obligations - obligations // 2)],
+        "receivables": [{"client": _client(rng.randrange(clients)), "email": "client@example.com",
+                         "amount": rng.randrange(1_000, 90_000), "due_in_days": rng.randrange(0, 90)}
+                        for _ in range(receivables)],
+        "preferences": {"dont_delay_salaries": True, "avoid_vendor_damage": True},
+    }
+    return state
+
+def use_ledger(path: str):
+    """Points the memory module at `path` and drops its in-memory index."""
+    from app.agents import memory
+    memory.LEDGER_FILE = path
+    memory.MEMORY_FILE = path + ".legacy.json"
+    memory._INDEX.reset()
+    memory._MIGRATION_CHECKED = False
+
+# ---------------------------
+# Groups
+# ---------------------------
+def bench_simulation(suite: Suite, quick: bool):
+    from app.agents.memory import _context_from_stats
+    from app.agents.risk_reasoning import simulate_scenarios
+
+    cases = [{"receivables": n} for n in SIMULATION_SIZES if not quick or n <= 2_000]
+    cases.append({"receivables": SIMULATION_DISTINCT_CLIENTS, "clients": SIMULATION_DISTINCT_CLIENTS})
+    for params in cases:
+        n = params["receivables"]
+        state = finance_state(receivables=n, obligations=max(2, n // 10), clients=params.get("clients"))
+        rng = random.Random(3)
+        profiles = {
+            r["client"]: _context_from_stats({"attempts": rng.randrange(6), "failures": rng.randrange(3),
+                                              "consecutive_failures": rng.randrange(3), "last_contacted_at": None})
+            for r in state["receivables"]
+        }
+        suite.record("simulation", "simulate_scenarios", params, lambda: simulate_scenarios(state, profiles))
+
+def bench_ledger(suite: Suite, quick: bool, workdir: str):
+    from app.agents import memory
+
+    for n in QUICK_LEDGER_SIZES if quick else LEDGER_SIZES:
+        path = os.path.join(workdir, f"ledger_{n}.jsonl")
+        write_ledger(path, n)
+        use_ledger(path)
+        client = _client(42)
+        params = {"records": n}
+        budget = 2.0 if n >= 100_000 else 1.0
+
+        suite.record("ledger", "get_client_stats.cold", params, lambda: memory.get_client_stats(client),
+                     setup=memory._INDEX.reset, budget_s=budget)
+        suite.record("ledger", "get_client_stats.warm", params, lambda: memory.get_client_stats(client))
+        suite.record("ledger", "get_client_context.warm", params, lambda: memory.get_client_context(client))
+        suite.record("ledger", "load_memory", params, memory.load_memory, budget_s=budget)
+
+        records = memory.load_memory()
+        suite.record("ledger", "save_memory", params, lambda: memory.save_memory(records), budget_s=budget)
+
+        rng = random.Random(5)
+        suite.record("ledger", "append_memory", params, lambda: memory.append_memory(_ledger_record(rng, datetime.now())))
+        os.remove(path)
+
+        # Worst case for a tier lookup: one client owns the whole ledger
+        write_ledger(path, n, clients=1)
+        use_ledger(path)
+        memory.get_client_stats(_client(0))
+        suite.record("ledger", "get_client_stats.single_client.warm", params, lambda: memory.get_client_stats(_client(0)))
+        os.remove(path)
+
+def bench_history(suite: Suite, quick: bool, workdir: str):
+    from app.core.config import get_settings
+    from app.core.history import HistoryStore, configure_history_store
+    from app.database import save_analysis_result
+
+    for n in HISTORY_SIZES[:2] if quick else HISTORY_SIZES:
+        store = HistoryStore(os.path.join(workdir, f"history_{n}"), get_settings().history_segment_bytes)
+        configure_history_store(store)
+        entry = {"risk_analysis": {"risk_score": 70}, "decision": {"strategy": "COLLECT_RECEIVABLE", "target": [_client(1)]},
+                 "action_log": {"action_taken": "EMAIL_PAYMENT_REMINDER_MULTI"}}
+        start = datetime.utcnow() - timedelta(days=30)
+        store.append_many([{**entry, "created_at": (start + timedelta(minutes=i)).isoformat()} for i in range(n)])
+
+        params = {"entries": n}
+        suite.record("history", "save_analysis_result.local_fallback", params,
+                     lambda: asyncio.run(save_analysis_result(dict(entry))))
+        suite.record("history", "query.latest_page", params, lambda: store.query(limit=50))
+        window = start + timedelta(minutes=n // 2)
+        suite.record("history", "query.time_range", params,
+                     lambda: store.query(start=window, end=window + timedelta(hours=1), limit=50))
+    configure_history_store(None)
+
+def bench_graph(suite: Suite, quick: bool, workdir: str, llm_latency: float):
+    import app.agents.action as action
+    import app.agents.decision as decision
+    import app.agents.risk_reasoning as risk
+    from app.graph.finly_graph import finly_graph
+    from app.tools.email_tool import SMTPConfig, configure_smtp
+
+    risk_reply = json.dumps({
+        "risk_score": 80, "critical_window": "10 days", "dominant_risk": "Outflows exceed cash", "confidence": "HIGH",
+        "sub_goal": {"intent": "COVER_DEFICIT", "required_amount": 50_000, "deadline_days": 10, "reason": "benchmark"}
+    })
+
+    with SMTPSink() as sink:
+        configure_smtp(SMTPConfig(email="finly@example.com", password=None, host="127.0.0.1", port=sink.port,
+                                  starttls=False, auth=False))
+        for targets in GRAPH_TARGETS[:2] if quick else GRAPH_TARGETS:
+            state = finance_state(receivables=0, obligations=4)
+            state["receivables"] = [{"client": _client(i), "email": f"client{i}@example.com", "amount": 10_000, "due_in_days": 5}
+                                    for i in range(targets)]
+            risk.llm = FakeChatModel(reply=risk_reply, latency=llm_latency)
+            decision.llm = FakeChatModel(reply=json.dumps({
+                "strategy": "COLLECT_RECEIVABLE", "target": [r["client"] for r in state["receivables"]],
+                "rationale": "benchmark", "amount_goal": 10_000 * targets,
+                "execution_params": {"tone": "POLITE", "channel": "EMAIL"}
+            }), latency=llm_latency)
+            action.llm = FakeChatModel(reply="Dear client,\n\nThis is a benchmark reminder.\n\nRegards", latency=llm_latency)
+
+            use_ledger(os.path.join(workdir, f"graph_ledger_{targets}.jsonl"))
+            suite.record("graph", "finly_graph.invoke", {"targets": targets, "llm_latency_ms": int(llm_latency * 1000)},
+                         lambda: finly_graph.invoke(dict(state)), min_repeats=3, budget_s=2.0)
+
+        # Dashboard refresh: same book, nothing to send (the ledger doesn't move), so every
+        # memoized node's fingerprint repeats; "cold" clears the memo before each run
+        from app.core.node_memo import clear_node_memo
+        for n in REFRESH_SIZES[:2] if quick else REFRESH_SIZES:
+            state = finance_state(receivables=n, obligations=max(4, n // 10))
+            risk.llm = FakeChatModel(reply=risk_reply, latency=llm_latency)
+            decision.llm = FakeChatModel(reply=json.dumps({
+                "strategy": "MAINTAIN_STATUS_QUO", "target": "None", "rationale": "benchmark", "amount_goal": 0,
+                "execution_params": {"tone": "NONE", "channel": "NONE"}
+            }), latency=llm_latency)
+            use_ledger(os.path.join(workdir, f"graph_refresh_ledger_{n}.jsonl"))
+            params = {"receivables": n, "llm_latency_ms": int(llm_latency * 1000)}
+            suite.record("graph", "finly_graph.invoke.refresh.cold", params,
+                         lambda: finly_graph.invoke(dict(state)), setup=clear_node_memo, min_repeats=3, budget_s=2.0)
+            suite.record("graph", "finly_graph.invoke.refresh.memoized", params,
+                         lambda: finly_graph.invoke(dict(state)), min_repeats=3, budget_s=2.0)
+        configure_smtp(None)
+
+GROUPS = ["simulation", "ledger", "history", "graph"]
+
+# ---------------------------
+# Reports
+# ---------------------------
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Prints a side-by-side table; returns the case ids that got slower than `threshold` x baseline."""
+    regressions = []
+    base_results = baseline.get("results", {})
+    print(f"\n{'case':<70} {'base ms':>10} {'now ms':>10} {'ratio':>7}")
+    for case_id, now in current["results"].items():
+        base = base_results.get(case_id)
+        if not base:
+            continue
+        ratio = now["median_s"] / base["median_s"] if base["median_s"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  <-- REGRESSION"
+            regressions.append(case_id)
+        print(f"{case_id:<70} {base['median_s'] * 1000:10.3f} {now['median_s'] * 1000:10.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+def over_budget(current: Dict[str, Any]) -> List[str]:
+    """Case ids from BUDGETS whose median is over their ceiling (cases not run are skipped)."""
+    over = []
+    for case_id, ceiling in BUDGETS.items():
+        now = current["results"].get(case_id)
+        if now and now["median_s"] > ceiling:
+            print(f"❌ {case_id}: median {now['median_s'] * 1000:.1f} ms, budget {ceiling * 1000:g} ms")
+            over.append(case_id)
+    return over
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Finly component benchmarks (offline).")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes (ledger up to 10k records)")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, help="run only these groups")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="fake LLM latency per call, seconds")
+    parser.add_argument("--output", help="report path (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="median ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    groups = args.only or GROUPS
+    suite = Suite()
+    with tempfile.TemporaryDirectory(prefix="finly-bench-") as workdir:
+        for group in groups:
+            print(f"▶ {group}")
+            if group == "simulation":
+                bench_simulation(suite, args.quick)
+            elif group == "ledger":
+                bench_ledger(suite, args.quick, workdir)
+            elif group == "history":
+                bench_history(suite, args.quick, workdir)
+            elif group == "graph":
+                bench_graph(suite, args.quick, workdir, args.llm_latency)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "groups": groups,
+            "llm_latency_s": args.llm_latency,
+        },
+        "results": suite.results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Report written to {output}")
+
+    failed = bool(over_budget(report))
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} case(s) slower than {args.threshold}x baseline")
+            return 1
+        print("\n✅ No regressions")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
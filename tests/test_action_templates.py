@@ -0,0 +1,108 @@
+# tests/test_action_templates.py
+
+"""Template drafting (app/agents/action.py): filling placeholders and one draft per template key."""
+
+import asyncio
+import contextlib
+import dataclasses
+import io
+import threading
+import zlib
+
+import pytest
+
+from app.agents import action
+from app.core.config import Settings
+from benchmarks.fakes import FakeChatModel
+
+TEMPLATE = "Dear [[CLIENT_NAME]], ₹[[AMOUNT]] is due in [[DEADLINE_DAYS]] days."
+
+def _job(client: str, amount: int = 1200, deadline_days: int = 5):
+    return {
+        "target": client,
+        "send_kwargs": {"client_name": client, "amount": amount, "deadline_days": deadline_days, "tone": "POLITE"},
+    }
+
+@pytest.fixture
+def drafting(monkeypatch):
+    settings = dataclasses.replace(Settings(), drafting_mode="template", drafting_template_variants=2)
+    monkeypatch.setattr(action, "get_settings", lambda: settings)
+    model = FakeChatModel(reply=TEMPLATE, latency=0.2)
+    monkeypatch.setattr(action, "get_llm", lambda: model)
+    action._TEMPLATES.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield model
+    action._TEMPLATES.clear()
+
+def test_fill_template_replaces_every_placeholder():
+    body = action._fill_template([TEMPLATE], _job("Acme", amount=1200, deadline_days=5))
+    assert body == "Dear Acme, ₹1200 is due in 5 days."
+    assert not action._PLACEHOLDER.search(body)
+
+def test_fill_template_picks_the_same_variant_for_a_client():
+    templates = [f"Variant {i}: " + TEMPLATE for i in range(3)]
+    for client in ["Acme", "Beta", "Gamma", "Delta"]:
+        bodies = {action._fill_template(templates, _job(client)) for _ in range(3)}
+        assert len(bodies) == 1
+        index = zlib.crc32(client.encode("utf-8")) % len(templates)
+        assert bodies.pop().startswith(f"Variant {index}: ")
+
+def test_concurrent_misses_draft_the_template_once(drafting):
+    jobs = [[_job(f"Client {i}")] for i in range(6)]
+    start = threading.Barrier(len(jobs))
+
+    def prepare(batch):
+        start.wait()
+        action._prepare_drafts("COLLECT_RECEIVABLE", batch)
+
+    threads = [threading.Thread(target=prepare, args=(batch,)) for batch in jobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert drafting.calls == 2  # One call per variant
+    assert [batch[0]["draft"] for batch in jobs] == [f"Dear Client {i}, ₹1200 is due in 5 days." for i in range(6)]
+    assert action._DRAFTING == {}
+
+def test_concurrent_async_misses_draft_the_template_once(drafting):
+    jobs = [[_job(f"Client {i}")] for i in range(6)]
+
+    async def prepare_all():
+        await asyncio.gather(*(action._aprepare_drafts("COLLECT_RECEIVABLE", batch) for batch in jobs))
+
+    asyncio.run(prepare_all())
+    assert drafting.calls == 2
+    assert all(batch[0]["draft"].startswith("Dear Client") for batch in jobs)
+
+def test_a_failed_draft_lets_a_waiter_draft_instead(drafting, monkeypatch):
+    failing = threading.Lock()
+
+    class FlakyModel:
+        def invoke(self, prompt):
+            if failing.acquire(blocking=False):  # Only the very first call fails
+                drafting.invoke(prompt)  # Slow, so the other run is waiting by now
+                raise RuntimeError("rate limited")
+            return drafting.invoke(prompt)
+
+    monkeypatch.setattr(action, "get_llm", lambda: FlakyModel())
+    jobs = [[_job("Acme")], [_job("Beta")]]
+    errors = []
+
+    def prepare(batch):
+        try:
+            action._prepare_drafts("COLLECT_RECEIVABLE", batch)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=prepare, args=(batch,)) for batch in jobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 1
+    drafted = [batch[0].get("draft") for batch in jobs]
+    assert drafted.count(None) == 1
+    assert any(d and d.startswith("Dear ") for d in drafted)
+    assert action._DRAFTING == {}
@@ -0,0 +1,65 @@
+# tests/test_circuit_breaker.py
+
+"""MongoDB circuit breaker (app/database.py)."""
+
+import contextlib
+import io
+
+import pytest
+
+from app import database
+from app.database import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.time, "monotonic", lambda: now[0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield now
+
+def _open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+def test_opens_after_threshold_and_probes_after_reset(clock):
+    breaker = _open_breaker()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # One probe at a time
+
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+def test_failed_probe_reopens(clock):
+    breaker = _open_breaker()
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN and not breaker.allow()
+    clock[0] += 30
+    assert breaker.allow()
+
+def test_probe_that_never_reports_back_lapses(clock):
+    breaker = _open_breaker()
+    clock[0] += 30
+    assert breaker.allow()  # Probe starts, then its task is cancelled: no record_* call
+
+    clock[0] += 29
+    assert not breaker.allow()
+    clock[0] += 1
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+def test_startup_probe_refuses_other_calls_until_it_reports(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.begin_probe()
+    assert breaker.state == HALF_OPEN and not breaker.allow()
+
+    breaker.record_failure()  # A failed probe opens at once, below the threshold
+    assert breaker.state == OPEN
@@ -0,0 +1,102 @@
+# tests/test_combined.py
+
+"""Combined risk + decision reply (app/agents/combined.py): validation and the fallback halves."""
+
+import dataclasses
+import json
+
+import pytest
+
+from app.agents import combined, risk_reasoning
+from app.agents.combined import _parse_combined
+from app.core.config import Settings
+from app.core.metrics import LLM_INVALID
+from benchmarks.fakes import FakeChatModel
+
+RISK = {
+    "risk_score": 80,
+    "critical_window": "4 days",
+    "dominant_risk": "Rent exceeds cash",
+    "confidence": "HIGH",
+    "sub_goal": {"intent": "COVER_DEFICIT", "required_amount": 800, "deadline_days": 4, "reason": "Cash is insufficient."},
+}
+DECISION = {
+    "strategy": "COLLECT_RECEIVABLE",
+    "target": ["Acme"],
+    "rationale": "Acme's receivable lands before Rent.",
+    "amount_goal": 900,
+    "execution_params": {"tone": "POLITE", "channel": "EMAIL"},
+}
+
+def _invalid(fallback: str) -> float:
+    return LLM_INVALID._values.get(("combined", fallback), 0)
+
+def test_valid_reply_returns_both_halves():
+    before = _invalid("decision") + _invalid("both")
+    parsed = _parse_combined(json.dumps({"risk_analysis": RISK, "decision": DECISION}))
+
+    assert parsed["risk_analysis"] == RISK
+    assert parsed["decision"] == DECISION
+    assert _invalid("decision") + _invalid("both") == before
+
+def test_invalid_decision_keeps_the_risk_half():
+    before = _invalid("decision")
+    parsed = _parse_combined(json.dumps({"risk_analysis": RISK, "decision": {**DECISION, "strategy": "PANIC"}}))
+
+    assert parsed == {"risk_analysis": RISK, "decision": None}
+    assert _invalid("decision") == before + 1
+
+@pytest.mark.parametrize("content", [
+    "",
+    "Sure! Here is the analysis:",
+    "[1, 2, 3]",
+    json.dumps({"risk_analysis": {**RISK, "risk_score": 250}, "decision": DECISION}),
+])
+def test_unusable_reply_falls_back_for_both(content):
+    before = _invalid("both")
+    assert _parse_combined(content) == {"risk_analysis": None, "decision": None}
+    assert _invalid("both") == before + 1
+
+def _state():
+    return {
+        "cash_balance": 100,
+        "salaries": [],
+        "fixed_bills": [{"type": "Rent", "amount": 900, "due_in_days": 4}],
+        "receivables": [{"client": "Acme", "email": "ap@acme.test", "amount": 900, "due_in_days": 2}],
+        "preferences": {"dont_delay_salaries": True},
+        "financial_metrics": {"total_outflow": 900, "projected_balance": -800, "liquidity_status": "DEFICIT", "net_position": 100},
+        "client_profiles": {"Acme": {"tier": 1, "consecutive_failures": 0}},
+    }
+
+@pytest.fixture
+def combined_mode(monkeypatch):
+    settings = dataclasses.replace(Settings(), engine_mode="combined", mc_paths=200)
+    monkeypatch.setattr(risk_reasoning, "get_settings", lambda: settings)
+
+    def reply_with(content):
+        monkeypatch.setattr(combined, "llm", FakeChatModel(reply=content))
+        monkeypatch.setattr(risk_reasoning, "llm", FakeChatModel(reply=json.dumps({**RISK, "risk_score": 5})))
+
+    return reply_with
+
+def test_node_stores_risk_half_and_leaves_decision_unset(combined_mode):
+    combined_mode(json.dumps({"risk_analysis": RISK, "decision": {"strategy": "PANIC"}}))
+    state = risk_reasoning.risk_reasoning_node(_state())
+
+    assert state["risk_analysis"] == RISK  # From the combined reply, not the risk prompt
+    assert state["sub_goal"] == RISK["sub_goal"]
+    assert "decision" not in state  # decision_agent_node asks its own prompt
+
+def test_node_falls_back_to_the_risk_prompt(combined_mode):
+    combined_mode("not json")
+    state = risk_reasoning.risk_reasoning_node(_state())
+
+    assert state["risk_analysis"]["risk_score"] == 5
+    assert "decision" not in state
+
+def test_node_stores_both_halves(combined_mode):
+    combined_mode(json.dumps({"risk_analysis": RISK, "decision": DECISION}))
+    state = risk_reasoning.risk_reasoning_node(_state())
+
+    assert state["risk_analysis"] == RISK
+    assert state["decision"] == DECISION
@@ -0,0 +1,49 @@
+# tests/test_database_startup.py
+
+"""open_database (app/database.py) with MongoDB unreachable: startup doesn't wait, writes go local."""
+
+import asyncio
+import contextlib
+import dataclasses
+import io
+import time
+
+import pytest
+
+from app import database
+from app.core.config import Settings
+from app.core.history import HistoryStore, configure_history_store
+from app.database import HALF_OPEN, OPEN
+
+@pytest.fixture
+def unreachable_mongo(monkeypatch, tmp_path):
+    settings = dataclasses.replace(Settings(), mongo_timeout_seconds=0.3, mongo_flush_seconds=0.05,
+                                   mongo_replay_seconds=0.05, mongo_breaker_reset_seconds=30)
+    monkeypatch.setattr(database, "get_settings", lambda: settings)
+    monkeypatch.setattr(database, "MONGO_URI", "mongodb://127.0.0.1:9/")  # Nothing listens on the discard port
+    monkeypatch.setattr(database, "_breaker", None)
+    store = HistoryStore(str(tmp_path), segment_bytes=1 << 20)
+    configure_history_store(store)
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield store
+    configure_history_store(None)
+
+def test_startup_returns_before_the_ping_and_writes_go_local(unreachable_mongo):
+    async def scenario():
+        began = time.perf_counter()
+        await database.open_database()
+        startup = time.perf_counter() - began
+        probing = database.get_breaker().state
+
+        await database.save_analysis_result({"decision": {"strategy": "MAINTAIN_STATUS_QUO"}})
+        await asyncio.sleep(0.6)  # Startup probe times out meanwhile
+        after_probe = database.get_breaker().state
+        await database.close_database()
+        return startup, probing, after_probe
+
+    startup, probing, after_probe = asyncio.run(scenario())
+    assert startup < 0.1
+    assert probing == HALF_OPEN
+    assert after_probe == OPEN
+    items = unreachable_mongo.query()["items"]
+    assert [item["decision"]["strategy"] for item in items] == ["MAINTAIN_STATUS_QUO"]
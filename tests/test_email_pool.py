@@ -0,0 +1,98 @@
+# tests/test_email_pool.py
+
+"""SMTPConnectionPool against the local SMTP sink (benchmarks/fakes.py)."""
+
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+
+from app.tools.email_tool import SMTPConfig, SMTPConnectionPool
+from benchmarks.fakes import SMTPSink
+
+def _message(to: str = "client@example.com") -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "finly@example.com"
+    msg["To"] = to
+    msg["Subject"] = "Payment reminder"
+    msg.set_content("Please settle the outstanding invoice.")
+    return msg
+
+def _pool(sink: SMTPSink, **overrides) -> SMTPConnectionPool:
+    config = SMTPConfig(email="finly@example.com", password=None, host="127.0.0.1", port=sink.port,
+                        starttls=False, auth=False, timeout=5, **overrides)
+    return SMTPConnectionPool(config)
+
+@pytest.fixture
+def sink():
+    with SMTPSink(reject={"nobody@example.com"}) as sink:
+        yield sink
+
+def test_send_many_reuses_one_session(sink):
+    pool = _pool(sink)
+    assert pool.send_many([_message() for _ in range(5)]) == [None] * 5
+    assert pool.send_many([_message() for _ in range(3)]) == [None] * 3
+    pool.close()
+
+    assert sink.messages == 8
+    assert sink.sessions == 1
+    assert sink.commands.count("EHLO") == 1
+
+def test_reconnects_after_the_server_drops(sink):
+    pool = _pool(sink)
+    assert pool.send_many([_message()]) == [None]
+    sink.drop_connections()
+
+    assert pool.send_many([_message(), _message()]) == [None, None]
+    pool.close()
+    assert sink.messages == 3
+    assert sink.sessions == 2
+
+def test_idle_session_is_probed_with_noop(sink):
+    pool = _pool(sink, idle_check_seconds=0)
+    assert pool.send_many([_message()]) == [None]
+    assert pool.send_many([_message()]) == [None]
+    pool.close()
+
+    assert sink.commands.count("NOOP") == 1
+    assert sink.sessions == 1
+
+def test_fresh_session_is_not_probed(sink):
+    pool = _pool(sink, idle_check_seconds=60)
+    pool.send_many([_message()])
+    pool.send_many([_message()])
+    pool.close()
+
+    assert "NOOP" not in sink.commands
+
+def test_failed_noop_probe_reconnects(sink):
+    pool = _pool(sink, idle_check_seconds=0)
+    pool.send_many([_message()])
+    sink.drop_connections()
+
+    assert pool.send_many([_message()]) == [None]
+    pool.close()
+    assert sink.sessions == 2
+
+def test_rejected_recipient_keeps_the_session(sink):
+    pool = _pool(sink)
+    errors = pool.send_many([_message(), _message("nobody@example.com"), _message()])
+    pool.close()
+
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], smtplib.SMTPRecipientsRefused)
+    assert sink.messages == 2
+    assert sink.sessions == 1
+
+def test_no_retry_once_data_was_sent(sink):
+    pool = _pool(sink)
+    sink.drop_after_data = 1
+
+    errors = pool.send_many([_message(), _message()])
+    pool.close()
+
+    # The first message was accepted but the reply was lost: reported, not sent again
+    assert isinstance(errors[0], smtplib.SMTPServerDisconnected)
+    assert errors[1] is None
+    assert sink.messages == 2
+    assert sink.sessions == 2
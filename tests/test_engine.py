@@ -0,0 +1,125 @@
+# tests/test_engine.py
+
+"""Deterministic engine (app/agents/engine.py) and the tier rules applied to its decisions."""
+
+from datetime import datetime, timedelta
+
+from app.agents.decision import enforce_tier_rules
+from app.agents.engine import assess_risk, select_strategy
+
+AS_OF = datetime(2026, 1, 15, 12, 0)
+
+def _state(cash=0, bills=(), salaries=(), receivables=(), **extra):
+    return {
+        "cash_balance": cash,
+        "fixed_bills": [{"type": name, "amount": amount, "due_in_days": due} for name, amount, due in bills],
+        "salaries": [{"employee": name, "amount": amount, "due_in_days": due} for name, amount, due in salaries],
+        "receivables": [{"client": name, "email": f"{name.lower()}@example.com", "amount": amount, "due_in_days": due}
+                        for name, amount, due in receivables],
+        "preferences": {"dont_delay_salaries": True, "avoid_vendor_damage": True},
+        "client_profiles_as_of": AS_OF.isoformat(),
+        **extra,
+    }
+
+def _contacted(hours_ago: float):
+    return {"last_contacted_at": (AS_OF - timedelta(hours=hours_ago)).isoformat()}
+
+# ---------------------------
+# Funding waterfall
+# ---------------------------
+def test_pools_receivables_due_on_or_before_each_obligation():
+    state = _state(bills=[("Rent", 1000, 5)],
+                   receivables=[("Acme", 600, 3), ("Beta", 400, 5), ("Late", 900, 6)])
+    decision = select_strategy(state, {})
+
+    # Beta is due the same day as Rent: equal counts as a match; Late is not pooled
+    assert decision["strategy"] == "COLLECT_RECEIVABLE"
+    assert decision["target"] == ["Acme", "Beta"]
+    assert decision["amount_goal"] == 1000
+
+def test_pool_plus_cash_covers_the_running_total():
+    state = _state(cash=800, bills=[("Rent", 1000, 5), ("Power", 300, 8)],
+                   receivables=[("Acme", 600, 4), ("Late", 900, 20)])
+    decision = select_strategy(state, {})
+
+    assert decision["strategy"] == "COLLECT_RECEIVABLE"
+    assert decision["target"] == ["Acme"]
+    assert decision["amount_goal"] == 600
+
+def test_cash_alone_and_nothing_to_collect_is_status_quo():
+    decision = select_strategy(_state(cash=5000, bills=[("Rent", 1000, 5)], receivables=[("Late", 900, 9)]), {})
+    assert decision["strategy"] == "MAINTAIN_STATUS_QUO"
+    assert decision["amount_goal"] == 0
+
+# ---------------------------
+# Grace period
+# ---------------------------
+def test_client_contacted_within_24h_is_not_chased():
+    state = _state(bills=[("Rent", 1000, 5)], receivables=[("Acme", 600, 3), ("Beta", 400, 5)])
+    decision = select_strategy(state, {"Acme": _contacted(hours_ago=2)})
+
+    assert decision["target"] == ["Beta"]
+    assert decision["amount_goal"] == 400
+
+def test_everyone_in_grace_period_means_status_quo():
+    state = _state(bills=[("Rent", 1000, 5)], receivables=[("Acme", 1000, 3)])
+    assert select_strategy(state, {"Acme": _contacted(hours_ago=23)})["strategy"] == "MAINTAIN_STATUS_QUO"
+    # Past the 24h window the client is chased again
+    assert select_strategy(state, {"Acme": _contacted(hours_ago=25)})["strategy"] == "COLLECT_RECEIVABLE"
+
+# ---------------------------
+# Deficits: delay or alert
+# ---------------------------
+def test_deficit_delays_a_bill_due_in_more_than_two_days():
+    decision = select_strategy(_state(cash=200, bills=[("Rent", 1000, 5)]), {})
+    assert decision["strategy"] == "DELAY_VENDOR_PAYMENT"
+    assert decision["target"] == "Rent"
+    assert decision["amount_goal"] == 800
+
+def test_deficit_on_a_bill_due_within_two_days_alerts_the_founder():
+    decision = select_strategy(_state(cash=200, bills=[("Rent", 1000, 2)]), {})
+    assert decision["strategy"] == "ALERT_FOUNDER"
+    assert decision["target"] == "Admin"
+
+def test_salaries_are_never_delayed():
+    state = _state(cash=200, salaries=[("Dana", 1000, 10)])
+    assert select_strategy(state, {})["strategy"] == "ALERT_FOUNDER"
+    # Only when the founder explicitly allows it
+    state["preferences"]["dont_delay_salaries"] = False
+    assert select_strategy(state, {})["strategy"] == "DELAY_VENDOR_PAYMENT"
+
+# ---------------------------
+# Tier enforcement
+# ---------------------------
+def test_tier_three_target_turns_collection_into_founder_alert():
+    state = _state(bills=[("Rent", 1000, 5)], receivables=[("Acme", 600, 3), ("Beta", 400, 5)])
+    profiles = {"Acme": {"tier": 1}, "Beta": {"tier": 3}}
+    decision = enforce_tier_rules(select_strategy(state, profiles), profiles)
+
+    assert decision["strategy"] == "ALERT_FOUNDER"
+    assert decision["execution_params"] == {"tone": "URGENT", "channel": "EMAIL"}
+
+def test_tier_two_target_makes_the_reminder_firm():
+    state = _state(bills=[("Rent", 1000, 5)], receivables=[("Acme", 1000, 3)])
+    profiles = {"Acme": {"tier": 2}}
+    decision = enforce_tier_rules(select_strategy(state, profiles), profiles)
+
+    assert decision["strategy"] == "COLLECT_RECEIVABLE"
+    assert decision["execution_params"]["tone"] == "FIRM"
+
+# ---------------------------
+# Risk
+# ---------------------------
+def test_deficit_risk_uses_the_first_negative_day():
+    state = _state(cash=500, bills=[("Rent", 400, 2), ("Power", 300, 6)], receivables=[("Acme", 100, 9)])
+    risk = assess_risk(state)
+
+    assert risk["sub_goal"]["intent"] == "COVER_DEFICIT"
+    assert risk["sub_goal"]["required_amount"] == 200
+    assert risk["critical_window"] == "6 days"
+    assert "Power" in risk["dominant_risk"]
+
+def test_surplus_risk_maintains_liquidity():
+    risk = assess_risk(_state(cash=5000, bills=[("Rent", 400, 2)], receivables=[("Acme", 100, 1)]))
+    assert risk["sub_goal"]["intent"] == "MAINTAIN_LIQUIDITY"
+    assert risk["risk_score"] == 15
@@ -0,0 +1,117 @@
+# tests/test_history.py
+
+"""Local history store (app/core/history.py): rotation, cursors, legacy import, forward reads."""
+
+import contextlib
+import io
+import json
+import os
+
+import pytest
+
+from app.core.history import HistoryStore, parse_timestamp
+
+def _record(n: int):
+    return {"analysis_id": f"a{n:03d}", "created_at": f"2026-01-01T00:{n // 60:02d}:{n % 60:02d}"}
+
+def _ids(items):
+    return [item["analysis_id"] for item in items]
+
+@pytest.fixture
+def store(tmp_path):
+    # ~4 records per segment
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield HistoryStore(str(tmp_path / "history"), segment_bytes=4 * len(json.dumps(_record(0)) + "\n"))
+
+def _segments(store):
+    return sorted(name for name in os.listdir(store.directory) if name.endswith(".jsonl"))
+
+def _page_all(store, limit):
+    ids, cursor = [], None
+    while True:
+        page = store.query(limit=limit, cursor=cursor)
+        ids += _ids(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+def test_pages_newest_first_across_rotated_segments(store):
+    for n in range(10):
+        store.append(_record(n))
+
+    assert len(_segments(store)) == 3
+    assert _page_all(store, limit=3) == [f"a{n:03d}" for n in reversed(range(10))]
+
+def test_cursor_is_stable_while_new_segments_are_written(store):
+    for n in range(6):
+        store.append(_record(n))
+    page = store.query(limit=3)
+    assert _ids(page["items"]) == ["a005", "a004", "a003"]
+
+    for n in range(6, 14):  # Rotates twice more after the cursor was issued
+        store.append(_record(n))
+    rest = store.query(limit=10, cursor=page["next_cursor"])
+    assert _ids(rest["items"]) == ["a002", "a001", "a000"]
+    assert rest["next_cursor"] is None
+
+def test_cursor_into_a_deleted_segment_continues_with_older_ones(store):
+    for n in range(10):
+        store.append(_record(n))
+    page = store.query(limit=3)  # a009, a008 (segment 3), a007 (segment 2)
+    assert page["next_cursor"].startswith("2:")
+
+    os.remove(os.path.join(store.directory, "history-000002.jsonl"))  # e.g. pruned by hand
+    rest = store.query(limit=10, cursor=page["next_cursor"])
+    assert _ids(rest["items"]) == ["a003", "a002", "a001", "a000"]
+
+def test_invalid_cursor_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.query(cursor="not-a-cursor")
+
+def test_time_bounds_filter_across_segments(store):
+    for n in range(10):
+        store.append(_record(n))
+    page = store.query(start=parse_timestamp("2026-01-01T00:00:02"), end=parse_timestamp("2026-01-01T00:00:05"))
+    assert _ids(page["items"]) == ["a005", "a004", "a003", "a002"]
+
+def test_read_forward_resumes_across_segments_and_new_appends(store):
+    for n in range(6):
+        store.append(_record(n))
+
+    docs, position = store.read_forward(None, limit=4)
+    assert _ids(docs) == ["a000", "a001", "a002", "a003"]
+    docs, position = store.read_forward(position, limit=4)
+    assert _ids(docs) == ["a004", "a005"]
+    assert store.read_forward(position, limit=4) == ([], position)
+
+    for n in range(6, 9):
+        store.append(_record(n))
+    docs, _ = store.read_forward(position, limit=10)
+    assert _ids(docs) == ["a006", "a007", "a008"]
+
+def test_read_forward_skips_a_torn_tail(store):
+    store.append(_record(0))
+    with open(os.path.join(store.directory, _segments(store)[-1]), "ab") as f:
+        f.write(b'{"analysis_id": "torn"')
+    docs, position = store.read_forward(None)
+    assert _ids(docs) == ["a000"]
+
+    store.append(_record(1))  # Terminates the torn line first
+    docs, _ = store.read_forward(position)
+    assert _ids(docs) == ["a001"]
+
+def test_legacy_history_is_imported_once(tmp_path):
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps([_record(0), _record(1), "not a record"]))
+    directory = str(tmp_path / "history")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        store = HistoryStore(directory, segment_bytes=1 << 20, legacy_path=str(legacy))
+        assert _ids(store.query()["items"]) == ["a001", "a000"]
+        assert os.path.exists(os.path.join(directory, ".legacy-imported"))
+        assert legacy.exists()  # Left in place
+
+        # Another worker (or a restart) sees the marker and does not import again
+        again = HistoryStore(directory, segment_bytes=1 << 20, legacy_path=str(legacy))
+        again.append(_record(2))
+        assert _ids(again.query()["items"]) == ["a002", "a001", "a000"]
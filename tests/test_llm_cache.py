@@ -0,0 +1,31 @@
+# tests/test_llm_cache.py
+
+"""LLM response cache keys and the TTL + LRU store (app/core/llm_cache.py)."""
+
+from app.core.llm_cache import LLMResponseCache, TTLLRUStore
+
+LLM = "model=gpt-4o-mini temperature=0.3"
+
+def test_key_is_the_exact_prompt():
+    key = LLMResponseCache.make_key
+    assert key('Receivables: [{"client": "A  B"}]', LLM) == key('Receivables: [{"client": "A  B"}]', LLM)
+    # Whitespace inside data values is part of the data
+    assert key('Receivables: [{"client": "A  B"}]', LLM) != key('Receivables: [{"client": "A B"}]', LLM)
+    assert key("memo:\\nline", LLM) != key("memo: line", LLM)
+    assert key("same prompt", LLM) != key("same prompt", LLM + " temperature=0.2")
+
+def test_store_expires_and_evicts(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.core.llm_cache.time.time", lambda: now[0])
+    store = TTLLRUStore(str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_entries=2)
+
+    store.set("a", "1")
+    store.set("b", "2")
+    now[0] += 1
+    assert store.get("a") == "1"  # "b" is now least recently used
+    store.set("c", "3")
+    assert store.get("b") is None and store.get("c") == "3"
+
+    now[0] += 61
+    assert store.get("a") is None
+    assert store.stats()["evictions"] == 1 and store.stats()["expirations"] == 1
@@ -0,0 +1,29 @@
+# tests/test_metrics.py
+
+"""Run metrics (app/core/metrics.py): the strategy label stays bounded."""
+
+import pytest
+
+from app.core.metrics import RUNS, record_run
+
+def _runs(strategy: str) -> float:
+    return RUNS._values.get(("test", "ok", strategy), 0)
+
+def test_known_strategy_is_its_own_series():
+    before = _runs("COLLECT_RECEIVABLE")
+    record_run("test", 0.1, {"decision": {"strategy": "COLLECT_RECEIVABLE"}})
+    assert _runs("COLLECT_RECEIVABLE") == before + 1
+
+@pytest.mark.parametrize("strategy", ["SELL_THE_OFFICE", "collect_receivable", "", None, {"nested": 1}, ["A"]])
+def test_anything_else_is_counted_as_other(strategy):
+    series = len(RUNS._values)
+    before = _runs("other")
+    record_run("test", 0.1, {"decision": {"strategy": strategy}})
+
+    assert _runs("other") == before + 1
+    assert len(RUNS._values) <= series + 1  # At most the "other" series itself is new
+
+def test_missing_decision_is_counted_as_other():
+    before = _runs("other")
+    record_run("test", 0.1, {})
+    assert _runs("other") == before + 1
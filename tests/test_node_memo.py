@@ -0,0 +1,127 @@
+# tests/test_node_memo.py
+
+"""Per-node memoization (app/core/node_memo.py): what invalidates an entry, eviction, copies."""
+
+import contextlib
+import dataclasses
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core import node_memo
+from app.core.config import Settings
+
+AS_OF = datetime(2026, 1, 15, 12, 0)
+
+@pytest.fixture
+def settings(monkeypatch):
+    current = [dataclasses.replace(Settings(), node_memo=True, node_memo_entries=256, node_memo_ttl_seconds=900)]
+    monkeypatch.setattr(node_memo, "get_settings", lambda: current[0])
+    node_memo.clear_node_memo()
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield current
+    node_memo.clear_node_memo()
+
+@pytest.fixture
+def node(settings):
+    """A memoized decision_agent stand-in that counts how often its body runs."""
+    calls = []
+
+    def decide(state):
+        calls.append(state["receivables"][0]["amount"])
+        state["decision"] = {"strategy": "COLLECT_RECEIVABLE", "target": ["Acme"], "amount_goal": len(calls)}
+        return state
+
+    async def adecide(state):
+        return decide(state)
+
+    wrapper, _ = node_memo.memoized("decision_agent", decide, adecide)
+    return wrapper, calls
+
+def _state(amount=600, tier=1, contacted_hours_ago=None, as_of=AS_OF):
+    profile = {"tier": tier, "consecutive_failures": 0, "attempts": 1, "failures": 0, "last_contacted_at": None}
+    if contacted_hours_ago is not None:
+        profile["last_contacted_at"] = (AS_OF - timedelta(hours=contacted_hours_ago)).isoformat()
+    return {
+        "cash_balance": 1000,
+        "salaries": [],
+        "fixed_bills": [{"type": "Rent", "amount": 1200, "due_in_days": 5}],
+        "receivables": [{"client": "Acme", "email": "ap@acme.test", "amount": amount, "due_in_days": 3}],
+        "preferences": {"dont_delay_salaries": True},
+        "client_profiles": {"Acme": profile},
+        "client_profiles_as_of": as_of.isoformat(),
+        "sub_goal": {"intent": "COVER_DEFICIT"},
+    }
+
+def test_unchanged_inputs_reuse_the_stored_result(node):
+    wrapper, calls = node
+    first = wrapper(_state())
+    second = wrapper(_state(as_of=AS_OF + timedelta(minutes=5)))  # A later refresh of the same book
+
+    assert calls == [600]
+    assert second["decision"] == first["decision"]
+
+def test_changed_book_misses(node):
+    wrapper, calls = node
+    wrapper(_state(amount=600))
+    wrapper(_state(amount=700))
+    assert calls == [600, 700]
+
+def test_changed_client_tier_misses(node):
+    wrapper, calls = node
+    wrapper(_state(tier=1))
+    wrapper(_state(tier=2))
+    assert len(calls) == 2
+
+def test_grace_period_running_out_misses(node):
+    wrapper, calls = node
+    # Same profile; the run 2 hours later sees the 24h grace period over
+    wrapper(_state(contacted_hours_ago=23))
+    wrapper(_state(contacted_hours_ago=23, as_of=AS_OF + timedelta(hours=2)))
+    assert len(calls) == 2
+
+def test_changed_setting_misses(node, settings):
+    wrapper, calls = node
+    wrapper(_state())
+    settings[0] = dataclasses.replace(settings[0], mc_seed=7)
+    wrapper(_state())
+    assert len(calls) == 2
+
+def test_entries_expire_after_ttl(node, settings, monkeypatch):
+    wrapper, calls = node
+    now = [1000.0]
+    monkeypatch.setattr(node_memo.time, "time", lambda: now[0])
+    wrapper(_state())
+    now[0] += 899
+    wrapper(_state())
+    now[0] += 900
+    wrapper(_state())
+    assert len(calls) == 2
+
+def test_least_recently_used_entry_is_evicted(node, settings):
+    wrapper, calls = node
+    settings[0] = dataclasses.replace(settings[0], node_memo_entries=2)
+    wrapper(_state(amount=1))
+    wrapper(_state(amount=2))
+    wrapper(_state(amount=1))  # Hit: 1 is now the most recently used
+    wrapper(_state(amount=3))  # Evicts 2
+    wrapper(_state(amount=1))
+    wrapper(_state(amount=2))
+    assert calls == [1, 2, 3, 2]
+
+def test_restored_entry_is_a_copy(node):
+    wrapper, calls = node
+    first = wrapper(_state())
+    first["decision"]["strategy"] = "ALERT_FOUNDER"  # e.g. enforce_tier_rules downstream
+
+    second = wrapper(_state())
+    second["decision"]["target"].append("Mallory")
+
+    third = wrapper(_state())
+    assert calls == [600]
+    assert third["decision"] == {"strategy": "COLLECT_RECEIVABLE", "target": ["Acme"], "amount_goal": 1}
+
+def test_only_side_effect_free_nodes_can_be_memoized():
+    with pytest.raises(ValueError):
+        node_memo.memoized("action_execution", lambda s: s, lambda s: s)
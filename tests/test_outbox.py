@@ -0,0 +1,155 @@
+# tests/test_outbox.py
+
+"""Email outbox (app/tools/outbox.py): leases, backoff, dead letters and delivery reports."""
+
+import contextlib
+import io
+import json
+
+import pytest
+
+from app.agents import memory
+from app.tools import outbox
+from app.tools.email_tool import SMTPConfig
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(outbox.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def box(tmp_path, clock, monkeypatch):
+    queue = outbox.Outbox(str(tmp_path / "outbox.sqlite3"), max_attempts=3, backoff_seconds=30, backoff_max_seconds=100)
+    monkeypatch.setattr(outbox, "_OUTBOX", queue)
+    return queue
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    path = str(tmp_path / "client_memory.jsonl")
+    monkeypatch.setattr(memory, "LEDGER_FILE", path)
+    monkeypatch.setattr(memory, "MEMORY_FILE", str(tmp_path / "client_memory.json"))
+    monkeypatch.setattr(memory, "_MIGRATION_CHECKED", False)
+    memory._INDEX.reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield path
+    memory._INDEX.reset()
+
+def _reminder(client: str):
+    return {"to_email": f"ap@{client.lower()}.test", "client_name": client, "amount": 100}
+
+def _records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+# ---------------------------
+# Leases
+# ---------------------------
+def test_expired_lease_is_claimed_again(box, clock):
+    row_id = box.enqueue(_reminder("Acme"), ["Acme"])
+    assert [row["id"] for row in box.claim(10)] == [row_id]
+
+    # Leased to the first worker: nobody else gets it
+    clock[0] += outbox.LEASE_SECONDS - 1
+    assert box.claim(10) == []
+
+    # The first worker died without reporting; the lease runs out
+    clock[0] += 1
+    assert [row["id"] for row in box.claim(10)] == [row_id]
+    assert box.stats()[outbox.SENDING] == 1
+
+def test_sent_row_is_not_claimed_again(box, clock):
+    row_id = box.enqueue(_reminder("Acme"), ["Acme"])
+    box.claim(10)
+    box.mark_sent(row_id, {"status": "SENT"})
+
+    clock[0] += outbox.LEASE_SECONDS * 10
+    assert box.claim(10) == []
+
+# ---------------------------
+# Retries
+# ---------------------------
+def test_backoff_doubles_up_to_the_cap(tmp_path, clock):
+    box = outbox.Outbox(str(tmp_path / "outbox.sqlite3"), max_attempts=10, backoff_seconds=30, backoff_max_seconds=100)
+    row_id = box.enqueue(_reminder("Acme"), ["Acme"])
+
+    delays = []
+    for attempts in range(4):
+        (row,) = box.claim(10)
+        assert row["attempts"] == attempts
+        assert not box.mark_failed(row_id, row["attempts"], "timeout")
+
+        # Not due a moment before the delay runs out, due right when it does
+        due = box._conn.execute("SELECT next_attempt_at FROM outbox WHERE id = ?", (row_id,)).fetchone()[0]
+        delays.append(due - clock[0])
+        clock[0] = due - 0.5
+        assert box.claim(10) == []
+        clock[0] = due
+
+    assert delays == [30, 60, 100, 100]
+
+def test_row_is_dead_lettered_after_the_retry_limit(box, clock):
+    row_id = box.enqueue(_reminder("Acme"), ["Acme"])
+
+    for attempts in range(2):
+        (row,) = box.claim(10)
+        assert not box.mark_failed(row_id, row["attempts"], "mailbox unavailable")
+        clock[0] += 1000
+
+    (row,) = box.claim(10)
+    assert box.mark_failed(row_id, row["attempts"], "mailbox unavailable")
+
+    clock[0] += 10_000
+    assert box.claim(10) == []
+    assert box.stats()[outbox.DEAD] == 1
+    (dead,) = box.dead_letters()
+    assert dead["id"] == row_id
+    assert dead["attempts"] == 3
+    assert dead["last_error"] == "mailbox unavailable"
+    assert dead["to"] == "ap@acme.test"
+
+    # Requeued by hand: a fresh attempt budget
+    assert box.requeue(row_id)
+    (row,) = box.claim(10)
+    assert row["attempts"] == 0
+
+# ---------------------------
+# Worker
+# ---------------------------
+def test_a_batch_writes_one_delivery_report(box, clock, ledger, monkeypatch):
+    monkeypatch.setattr(outbox, "get_smtp_config", lambda: SMTPConfig(email=None, password=None, host=None))
+    outcomes = {"Acme": {"status": "SENT"}, "Beta": {"status": "FAILED", "error": "550 no such user"},
+                "Gamma": {"status": "FAILED", "error": "timeout"}}
+    monkeypatch.setattr(outbox, "send_payment_reminders",
+                        lambda reminders, mask_failures: [outcomes[r["client_name"]] for r in reminders])
+
+    ids = {client: box.enqueue(_reminder(client), [client]) for client in outcomes}
+    # Beta is on its last attempt; Gamma fails for the first time and is retried later
+    box._conn.execute("UPDATE outbox SET attempts = 2 WHERE id = ?", (ids["Beta"],))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert outbox.drain_once() == 3
+
+    (record,) = _records(ledger)
+    assert record["action_taken"] == memory.DELIVERY_REPORT
+    assert record["result"] == "BATCH_PROCESSED"
+    assert record["clients"] == ["Acme", "Beta"]
+    targets = {t["target"]: t for t in record["details"]["targets_processed"]}
+    assert targets["Acme"]["result"] == {"status": "SENT"}
+    assert targets["Acme"]["outbox_id"] == ids["Acme"]
+    assert targets["Beta"]["result"] == {"status": "FAILED"}
+    assert targets["Beta"]["attempts"] == 3
+
+    # Each client gets its own outcome; reports are not counted as contact attempts
+    assert memory.get_client_stats("Beta")["failures"] == 1
+    assert memory.get_client_stats("Acme")["consecutive_failures"] == 0
+    assert memory.get_client_stats("Acme")["attempts"] == 0
+
+def test_a_batch_with_only_retries_writes_no_report(box, clock, ledger, monkeypatch):
+    monkeypatch.setattr(outbox, "get_smtp_config", lambda: SMTPConfig(email=None, password=None, host=None))
+    monkeypatch.setattr(outbox, "send_payment_reminders",
+                        lambda reminders, mask_failures: [{"status": "FAILED", "error": "timeout"} for _ in reminders])
+    box.enqueue(_reminder("Acme"), ["Acme"])
+
+    assert outbox.drain_once() == 1
+    assert memory.load_memory() == []
@@ -0,0 +1,86 @@
+# tests/test_prompt_context.py
+
+"""Token-bounded line items (app/core/prompt_context.py) and the client lines that go with them."""
+
+import json
+import random
+import re
+
+from app.agents.decision import client_history
+from app.core.prompt_context import _top_k, budget_sections, count_tokens, summarize_by_due_date
+
+def _book(receivables=2000, obligations=300, clients=150, seed=5):
+    rng = random.Random(seed)
+    return {
+        "receivables": [
+            {"client": f"Client {rng.randrange(clients):03d}", "email": "ap@example.com",
+             "amount": rng.randrange(100, 50_000), "due_in_days": rng.randrange(0, 120)}
+            for _ in range(receivables)
+        ],
+        "obligations": [
+            {"type": f"Vendor {i}", "amount": rng.randrange(100, 20_000), "due_in_days": rng.randrange(0, 120)}
+            for i in range(obligations)
+        ],
+    }
+
+def _tokens(serialized):
+    return sum(count_tokens(s) for s in serialized.values())
+
+def test_small_book_is_verbatim():
+    book = _book(receivables=5, obligations=3)
+    serialized, listed = budget_sections(book, budget_tokens=3000, top_k=40)
+    assert json.loads(serialized["receivables"]) == book["receivables"]
+    assert listed["obligations"] == book["obligations"]
+
+def test_large_book_fits_the_budget():
+    book = _book()
+    for budget in (3000, 1500, 600):
+        serialized, listed = budget_sections(book, budget_tokens=budget, top_k=40)
+        assert _tokens(serialized) <= budget
+
+        compacted = json.loads(serialized["receivables"])
+        rest = compacted["not_listed"]
+        assert compacted["listed"] == listed["receivables"]
+        assert len(listed["receivables"]) + rest["count"] == len(book["receivables"])
+        assert sum(r["amount"] for r in listed["receivables"]) + rest["amount"] == sum(r["amount"] for r in book["receivables"])
+        assert sum(b["count"] for b in rest["by_due_date"]) == rest["count"]
+
+def test_top_k_keeps_the_most_urgent_and_the_largest():
+    items = [{"amount": 10, "due_in_days": 50}, {"amount": 99_999, "due_in_days": 90},
+             {"amount": 20, "due_in_days": 1}, {"amount": 30, "due_in_days": 60}]
+    kept, rest = _top_k(items, 2)
+    assert kept == [items[1], items[2]]  # Original order
+    assert rest == [items[0], items[3]]
+
+def test_due_date_buckets():
+    summary = summarize_by_due_date([{"amount": 5, "due_in_days": 0}, {"amount": 7, "due_in_days": 7},
+                                     {"amount": 1, "due_in_days": 8}, {"amount": 2, "due_in_days": 400}])
+    assert summary == [
+        {"due_in_days": "0-7", "count": 2, "amount": 12},
+        {"due_in_days": "8-14", "count": 1, "amount": 1},
+        {"due_in_days": "91+", "count": 1, "amount": 2},
+    ]
+
+def test_client_lines_match_the_listed_receivables():
+    book = _book()
+    clients = sorted({r["client"] for r in book["receivables"]})
+    state = {
+        "receivables": book["receivables"],
+        "client_profiles": {c: {"tier": 1 + i % 3, "consecutive_failures": i % 3} for i, c in enumerate(clients)},
+    }
+    _, listed = budget_sections(book, budget_tokens=1500, top_k=40)
+    listed_clients = {r["client"] for r in listed["receivables"]}
+    assert 0 < len(listed_clients) < len(clients)
+
+    history, profiles = client_history(state, listed_clients)
+    lines = history.splitlines()
+    named = {m.group(1) for m in (re.match(r"- (Client \d+): Tier", line) for line in lines) if m}
+    assert named == listed_clients
+    # Tier enforcement still sees every client
+    assert set(profiles) == set(clients)
+
+    # Everyone else is counted per tier on one line
+    unlisted = [c for c in clients if c not in listed_clients]
+    expected = {tier: sum(1 for c in unlisted if state["client_profiles"][c]["tier"] == tier) for tier in (1, 2, 3)}
+    per_tier = ", ".join(f"{n} at Tier {t}" for t, n in expected.items() if n)
+    assert lines[-1] == f"- (+{len(unlisted)} clients not listed: {per_tier})"
@@ -0,0 +1,103 @@
+# tests/test_server_disconnect.py
+
+"""Client disconnects on the streaming endpoints (app/server.py): started runs still finish and save."""
+
+import asyncio
+import contextlib
+import io
+
+import pytest
+
+from app import database, server
+
+PAYLOAD = {
+    "cash_balance": 1000,
+    "salaries": [{"employee": "A", "amount": 500, "due_in_days": 5}],
+    "fixed_bills": [],
+    "receivables": [{"client": "Acme", "email": "ap@acme.test", "amount": 800, "due_in_days": 3}],
+}
+
+@pytest.fixture
+def saved(monkeypatch):
+    docs = []
+
+    async def save(doc):
+        docs.append(doc)
+        return True
+
+    monkeypatch.setattr(database, "save_analysis_result", save)
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield docs
+
+def test_batch_disconnect_finishes_started_runs_only(monkeypatch, saved):
+    started, finished = [], []
+
+    async def execute(initial_state, endpoint):
+        started.append(initial_state["cash_balance"])
+        await asyncio.sleep(0.05)
+        finished.append(initial_state["cash_balance"])
+        return {"cash_balance": initial_state["cash_balance"]}
+
+    monkeypatch.setattr(server, "execute_analysis", execute)
+
+    async def scenario():
+        monkeypatch.setattr(server, "_BATCH_SLOTS", asyncio.Semaphore(1))
+        payloads = [{**PAYLOAD, "cash_balance": n} for n in (1, 2, 3)]
+        tasks = [asyncio.create_task(server._run_batch_item(i, p)) for i, p in enumerate(payloads)]
+        await asyncio.sleep(0.01)
+        for task in tasks:  # What the NDJSON generator does when the client goes away
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*server._DETACHED)
+        return server._BATCH_SLOTS
+
+    slots = asyncio.run(scenario())
+    assert started == finished == [1]
+    assert [doc["cash_balance"] for doc in saved] == [1]
+    assert not slots.locked()
+
+class _FakeGraph:
+    """astream stand-in: one update per node, with a pause before each."""
+
+    def __init__(self, ran):
+        self.ran = ran
+
+    async def astream(self, state, stream_mode):
+        for node, update in (("risk_reasoning", {"risk_analysis": {"risk_score": 10}}),
+                             ("decision_agent", {"decision": {"strategy": "COLLECT_RECEIVABLE"}}),
+                             ("action_execution", {"action_log": {"status": "SENT"}}),
+                             ("memory_agent", {"memory_updates": ["Acme"]})):
+            await asyncio.sleep(0.01)
+            self.ran.append(node)
+            yield "updates", {node: update}
+
+def _stream_until(monkeypatch, event: str):
+    """Opens /run-analysis/stream, reads up to `event`, then drops the connection."""
+    ran = []
+
+    async def graph():
+        return _FakeGraph(ran)
+
+    monkeypatch.setattr(server, "_graph", graph)
+
+    async def scenario():
+        response = await server.run_analysis_stream(server.FinanceStateRequest(**PAYLOAD))
+        body = response.body_iterator
+        async for chunk in body:
+            if chunk.startswith(f"event: {event}\n"):
+                break
+        await body.aclose()
+        await asyncio.gather(*server._DETACHED, return_exceptions=True)
+
+    asyncio.run(scenario())
+    return ran
+
+def test_stream_disconnect_after_decision_finishes_the_run(monkeypatch, saved):
+    ran = _stream_until(monkeypatch, "decision")
+    assert ran[-1] == "memory_agent"
+    assert len(saved) == 1 and saved[0]["memory_updates"] == ["Acme"]
+
+def test_stream_disconnect_before_decision_stops_the_run(monkeypatch, saved):
+    ran = _stream_until(monkeypatch, "risk_analysis")
+    assert ran == ["risk_reasoning"]
+    assert saved == []
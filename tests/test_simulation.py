@@ -0,0 +1,70 @@
+# tests/test_simulation.py
+
+"""Monte Carlo cash-flow simulation (app/agents/simulation.py) and simulate_scenarios."""
+
+import dataclasses
+
+from app.agents import risk_reasoning, simulation
+from app.agents.simulation import monte_carlo_cash_flow
+from app.core.config import Settings
+from app.core.timeline import build_cash_timeline, obligations
+
+def _state():
+    return {
+        "cash_balance": 2000,
+        "salaries": [{"employee": "Dana", "amount": 1500, "due_in_days": 10}],
+        "fixed_bills": [{"type": "Rent", "amount": 1800, "due_in_days": 4}, {"type": "Power", "amount": 400, "due_in_days": 20}],
+        "receivables": [
+            {"client": "Acme", "email": "ap@acme.test", "amount": 900, "due_in_days": 3},
+            {"client": "Acme", "email": "ap@acme.test", "amount": 300, "due_in_days": 12},
+            {"client": "Beta", "email": "ap@beta.test", "amount": 1200, "due_in_days": 8},
+        ],
+    }
+
+PROFILES = {"Acme": {"attempts": 4, "failures": 1, "consecutive_failures": 1}, "Beta": {"attempts": 10, "failures": 0}}
+
+def _simulate(state, profiles=PROFILES, paths=4000, seed=3):
+    return monte_carlo_cash_flow(state["cash_balance"], state["receivables"], obligations(state), profiles, paths=paths, seed=seed)
+
+def test_percentiles_are_ordered_and_seeded():
+    result = _simulate(_state())
+
+    for key in ("final_balance_percentiles", "min_balance_percentiles"):
+        values = list(result[key].values())
+        assert values == sorted(values)
+    assert result["min_balance_percentiles"]["p50"] <= result["final_balance_percentiles"]["p50"]
+    assert 0 < result["shortfall_probability"] < 1
+    assert _simulate(_state()) == result
+    assert _simulate(_state(), seed=4) != result
+
+def test_zero_variance_reproduces_the_deterministic_timeline(monkeypatch):
+    # Nobody defaults and everyone pays on the due day
+    monkeypatch.setattr(simulation, "client_behaviour", lambda profile: (0.0, 1e-9))
+    state = _state()
+    result = _simulate(state, paths=50)
+    timeline = build_cash_timeline(state)
+
+    assert set(result["final_balance_percentiles"].values()) == {timeline["daily_balance"][-1]}
+    assert set(result["min_balance_percentiles"].values()) == {min(timeline["min_balance"], state["cash_balance"])}
+    assert result["shortfall_probability"] == (1.0 if timeline["first_negative_day"] is not None else 0.0)
+
+def test_zero_paths_still_runs_one():
+    result = _simulate(_state(), paths=0)
+    assert result["paths"] == 1
+    assert set(result["final_balance_percentiles"]) == {"p5", "p25", "p50", "p75", "p95"}
+
+def test_monte_carlo_sits_next_to_the_deterministic_scenarios(monkeypatch):
+    settings = dataclasses.replace(Settings(), mc_paths=2000, mc_seed=1)
+    monkeypatch.setattr(risk_reasoning, "get_settings", lambda: settings)
+    state = _state()
+    scenarios = {s["name"]: s for s in risk_reasoning.simulate_scenarios(state, PROFILES)}
+
+    assert list(scenarios) == ["best_case", "expected_case", "worst_case", "monte_carlo"]
+    assert scenarios["best_case"]["net_cash"] == 2000 + 2400 - 1500 - 2200
+    assert scenarios["worst_case"]["net_cash"] == 2000 - 1500 - 2200
+    assert scenarios["worst_case"]["net_cash"] <= scenarios["expected_case"]["net_cash"] <= scenarios["best_case"]["net_cash"]
+
+    mc = scenarios["monte_carlo"]
+    assert mc["paths"] == 2000 and mc["seed"] == 1
+    assert mc["net_cash"] == mc["final_balance_percentiles"]["p50"]
+    assert scenarios["worst_case"]["net_cash"] <= mc["net_cash"] <= scenarios["best_case"]["net_cash"]
@@ -0,0 +1,46 @@
+# tests/test_timeline.py
+
+"""Day-by-day cash timeline (app/core/timeline.py)."""
+
+from app.core.timeline import build_cash_timeline, obligations
+
+def _state(cash, bills=(), salaries=(), receivables=()):
+    return {
+        "cash_balance": cash,
+        "fixed_bills": [{"type": name, "amount": amount, "due_in_days": due} for name, amount, due in bills],
+        "salaries": [{"employee": name, "amount": amount, "due_in_days": due} for name, amount, due in salaries],
+        "receivables": [{"client": name, "amount": amount, "due_in_days": due} for name, amount, due in receivables],
+    }
+
+def test_first_negative_day_and_exposed_obligations():
+    state = _state(1000, bills=[("Power", 300, 6), ("Rent", 800, 2)], salaries=[("Dana", 500, 6)],
+                   receivables=[("Acme", 200, 9)])
+    timeline = build_cash_timeline(state)
+
+    assert timeline["horizon_days"] == 9
+    assert timeline["daily_balance"] == [1000, 1000, 200, 200, 200, 200, -600, -600, -600, -400]
+    assert timeline["first_negative_day"] == 6
+    assert (timeline["min_balance"], timeline["min_balance_day"]) == (-600, 6)
+    # Rent (day 2) is covered; both day-6 obligations are exposed, bills before salaries
+    assert [(o["name"], o["kind"], o["balance_after"]) for o in timeline["exposed_obligations"]] == [
+        ("Power", "bill", -600), ("Dana", "salary", -600)
+    ]
+
+def test_same_day_inflow_is_netted_before_the_balance_is_checked():
+    # The receivable lands the day the bill is due: the balance never dips
+    covered = build_cash_timeline(_state(100, bills=[("Rent", 500, 3)], receivables=[("Acme", 400, 3)]))
+    assert covered["first_negative_day"] is None
+    assert covered["exposed_obligations"] == []
+    assert covered["daily_balance"][3] == 0
+
+    # One day later is too late
+    late = build_cash_timeline(_state(100, bills=[("Rent", 500, 3)], receivables=[("Acme", 400, 4)]))
+    assert late["first_negative_day"] == 3
+    assert [o["name"] for o in late["exposed_obligations"]] == ["Rent"]
+
+def test_engine_and_timeline_share_one_obligations_list():
+    from app.agents import engine
+
+    state = _state(0, bills=[("Rent", 800, 5)], salaries=[("Dana", 500, 2)])
+    assert engine._obligations is obligations
+    assert [o["name"] for o in obligations(state)] == ["Dana", "Rent"]